@@ -1,17 +1,30 @@
-import argparse, os, pandas as pd, sys
+import argparse, numpy as np, os, sys
 
-from score.abstract_score import score_picker
+from functools import partial
+
+from score.abstract_score import predict_scores, score_picker
+from score.manifest import spec_version
+from score.parallel import parallel_map, report_failures
+from score.profiling import PROFILER, stage
+from score.shard import merge_shards, parse_shard, shard_files, shard_name, \
+	write_manifest
+from score.sink import ResultSink
 
 
 def parse_arguments(args_to_parse):
 	"""Parse command line arguments"""
-	description = 'Python implementation of ICU scores.'
+	if args_to_parse[:1] == ['merge']:
+		return parse_merge(args_to_parse[1:])
+	description = 'Python implementation of ICU scores. Run `merge` with ' \
+				  'the same score names and --out-dir to merge the ' \
+				  'outputs of --shard runs.'
 	parser = argparse.ArgumentParser(description=description)
 
 	# General options
-	parser.add_argument('score_name', type=str,
-						choices=['oasis', 'saps2'],
-						help='Name of the scoring system to use.')
+	parser.add_argument('score_name', type=str, nargs='+',
+						choices=['oasis', 'saps2', 'apache2'],
+						help='Names of the scoring systems to use, computed '
+							 'from one read of each file.')
 	parser.add_argument('root', type=str,
 						help='Path to root file/directory.')
 	parser.add_argument('-o', '--out-dir', type=str,
@@ -20,16 +33,73 @@ def parse_arguments(args_to_parse):
 	parser.add_argument('-v', '--verbose', type=int,
 						default=1,
 						help='Level of verbosity.')
+	parser.add_argument('-w', '--workers', type=int,
+						default=1,
+						help='Number of worker processes, 0 for all cores.')
+	parser.add_argument('--chunksize', type=int,
+						default=None,
+						help='Files per worker task.')
+	parser.add_argument('--profile', type=str,
+						default=None,
+						help='Path to a JSON report of stage timings and '
+							 'memory peaks.')
+	parser.add_argument('--format', type=str,
+						default='csv', choices=['csv', 'columns'],
+						help='Output format, see score.sink.')
+	parser.add_argument('--shard', type=parse_shard,
+						default=None,
+						help='Score only shard i of N, given as i/N, for a '
+							 'later `merge`.')
 
 	# Score options
 	parser.add_argument('-p', '--predict', type=bool,
 						default=True,
 						help='Whether to predict score per df.')
+	parser.set_defaults(merge=False)
+	args = parser.parse_args(args_to_parse)
+
+	return args
+
+
+def parse_merge(args_to_parse):
+	"""Parse command line arguments of `merge`"""
+	description = 'Merge the shards of a sharded run.'
+	parser = argparse.ArgumentParser(prog='main.py merge',
+									 description=description)
+	parser.add_argument('score_name', type=str, nargs='+',
+						choices=['oasis', 'saps2', 'apache2'],
+						help='Names of the scoring systems, as scored.')
+	parser.add_argument('-o', '--out-dir', type=str,
+						default='results',
+						help='Directory the shards were stored in.')
+	parser.set_defaults(merge=True)
 	args = parser.parse_args(args_to_parse)
 
 	return args
 
 
+def merge(args):
+	"""Write the results of a sharded run once all its shards are done.
+
+	Parameters
+	----------
+	args : argparse.Namespace
+		Arguments of `parse_merge`
+	"""
+	path = os.path.join(args.out_dir, '_'.join(args.score_name) + '_scores')
+	fields, merged = merge_shards(path + '_shards')
+	header = fields['header']
+	spec = [spec_version(name) for name in args.score_name]
+	if header['spec'] != spec:
+		raise ValueError('Shards were scored with tables %s, the current '
+						 'tables are %s.' % (header['spec'], spec))
+
+	with stage('write'):
+		with ResultSink(path + '.csv' if header['format'] == 'csv' else path,
+						fields['schema'], header['format']) as sink:
+			sink.write(merged)
+
+
 def main(args):
 	"""Main scoring function.
 
@@ -39,38 +109,79 @@ def main(args):
 		Arguments
 	"""
 
-	# Initialise score class
-	icu_score = score_picker(args.score_name)
+	# Initialise score classes
+	icu_scores = [score_picker(score_name) for score_name in args.score_name]
+	if len(icu_scores) == 1:
+		predict = icu_scores[0].predict
+		columns = ['Path', 'Score']
+	else:
+		predict = partial(predict_scores, icu_scores)
+		columns = ['Path'] + args.score_name
+	if args.profile is not None:
+		PROFILER.enable()
 
 	# Treat single files and directories the same
 	if os.path.isdir(args.root):
-		files = os.listdir(args.root)
+		cohort = [os.path.join(args.root, f)
+				  for f in sorted(os.listdir(args.root))
+				  if f != 'listfile.csv']
 	else:
-		files = [args.root]
+		cohort = [args.root]
+	files = shard_files(cohort, args.shard)
 
 	# Predict score
 	if args.predict:
-		predictions = []
+		results = parallel_map(predict, files,
+							   workers=args.workers, chunksize=args.chunksize)
+		report_failures(files, results)
+		predictions = [prediction for prediction, _ in results]
 
-		for file in files:
-			prediction = icu_score.predict(file)
-			predictions += [prediction]
-
-			if args.verbose == 2:
+		if args.verbose == 2:
+			for file, prediction in zip(files, predictions):
 				print(file, prediction)
 
 		if args.verbose == 1:
-			for i in range(max(len(root), 5)):
-				print(root[i], predictions[i])
+			for i in range(min(len(files), 5)):
+				print(files[i], predictions[i])
 
 		# Save predictions
 		if not os.path.exists(args.out_dir):
 			os.makedirs(args.out_dir)
-		prediction_df = pd.Dataframe(list(zip(root, predictions)),
-					 				 columns=['Path', 'Score'])
-		prediction_df.to_csv(index=None)
+		with stage('write'):
+			scores = np.array([[np.nan] * len(icu_scores) if prediction is None
+							   else np.ravel(prediction)
+							   for prediction in predictions], dtype=float)
+			scores = scores.reshape(len(files), len(icu_scores))
+			schema = dict.fromkeys(columns, 'int16')
+			schema['Path'] = 'category'
+			path = os.path.join(args.out_dir,
+								'_'.join(args.score_name) + '_scores')
+			if args.shard is not None:
+				shard_dir = path + '_shards'
+				path = os.path.join(shard_dir, shard_name(args.shard))
+				if not os.path.exists(shard_dir):
+					os.makedirs(shard_dir)
+			if args.format == 'csv':
+				path += '.csv'
+			with ResultSink(path, schema, args.format) as sink:
+				sink.write(dict(zip(columns, [files] + list(scores.T))))
+
+			if args.shard is not None:
+				header = {'scores': args.score_name,
+						  'spec': [spec_version(name)
+								   for name in args.score_name],
+						  'format': args.format}
+				write_manifest(shard_dir, args.shard, path, 'Path', schema,
+							   header, cohort, files)
+
+	if args.profile is not None:
+		PROFILER.disable()
+		PROFILER.save(args.profile)
 
 
 if __name__ == '__main__':
 	args = parse_arguments(sys.argv[1:])
-	main(args)
+	if args.merge:
+		merge(args)
+	else:
+		main(args)
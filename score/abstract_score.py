@@ -1,16 +1,30 @@
 """
 Abstract score module
 """
-import pandas as pd
 
-from mapping import *
-from utils import read, variable_map
+from score.batch import score_window
+from score.compiled import SPECS, Extremes
+from score.mapping import apache2_dict, oasis_dict, saps2_dict
+from score.profiling import stage
+from score.score_patients import read_window
+from score.scores.saps2 import SAPS2_ICD9
 
 
 def score_picker(name):
-	score_class = eval(name.capitalize())
+	if name not in SCORES:
+		raise ValueError('ICU score `%s` is not recognized, expected one of '
+						 '%s.' % (name, list(SCORES)))
 
-	return score_class()
+	return SCORES[name]()
+
+
+def predict_scores(icu_scores, file):
+	"""Predict several scores from a single read of the first 24 hours of
+	`file`, as `score.score_patients.score_file` does, without pandas."""
+	score_names = [icu_score.spec.name for icu_score in icu_scores]
+	with stage('file', file):
+		return score_window(read_window(file, score_names, pandas=False),
+							score_names)
 
 
 # class AbstractScore(object):
@@ -32,35 +46,52 @@ class Oasis(object):
 	def __init__(self):
 		super(Oasis, self).__init__()
 		self.dict = oasis_dict
+		self.spec = SPECS['oasis']
 
 	def predict(self, file):
-		var_scores = self.var_score(file)
-
-		return sum(var_scores)
+		return predict_scores([self], file)[0]
 
 	def var_score(self, file):
-		df = read(file)
-		scores = []
-
-		for var in ['temperature']:
-			print(variable_map[var])
-			print(self.dict[var]['bins'])
-			print(self.dict[var]['labels'])
-			# TO DO : fix non-unique mapping issue
-			score = pd.cut(df[variable_map[var]],
-						   bins=self.dict[var]['bins'],
-						   labels=self.dict[var]['labels'])
-			score = score.max()
-			print(score)
-
-		# for var in self.dict:
-		# 	try:
-		# 		score = pd.cut(df[variable_map[var]],
-		# 					   bins=self.dict[var]['bins'],
-		# 					   labels=self.dict[var]['labels'])
-		# 	except:
-		# 		print('Variable: "%s" not in dataframe' % var)
-		# 		continue
-			scores += [score]
-
-		return scores
+		"""Points per score output over the first 24 hours of `file`."""
+		with stage('file', file):
+			return self.frame_var_score(
+				read_window(file, [self.spec.name], pandas=False))
+
+	def frame_var_score(self, df, extremes=None):
+		if extremes is None:
+			extremes = Extremes(df)
+		with stage('score'):
+			scores = self.spec.var_scores(df, extremes)
+
+		return list(scores.values())
+
+
+class Saps2(Oasis):
+	"""docstring for Saps2"""
+	def __init__(self):
+		super(Saps2, self).__init__()
+		self.dict = saps2_dict
+		self.spec = SPECS['saps2']
+
+	def frame_var_score(self, df, extremes=None):
+		"""Points per score output, then the chronic disease points."""
+		scores = super(Saps2, self).frame_var_score(df, extremes)
+		icd9 = SAPS2_ICD9.cell_points(df['icd9']).max(initial=0) \
+			if 'icd9' in df else 0
+
+		return scores + [int(icd9)]
+
+
+class Apache2(Oasis):
+	"""docstring for Apache2"""
+	def __init__(self):
+		super(Apache2, self).__init__()
+		self.dict = apache2_dict
+		self.spec = SPECS['apache2']
+
+
+SCORES = {
+	'oasis': Oasis,
+	'saps2': Saps2,
+	'apache2': Apache2
+}
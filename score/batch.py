@@ -0,0 +1,181 @@
+"""
+Batch scoring module
+
+Scores a whole cohort from one long-format frame (one row per stay and
+time step) with grouped reductions instead of one call per patient.
+Single-stay scoring (`stay_window`, `score_window`) does not use pandas,
+which the cohort functions import on call, so that `main.py` can score
+files without importing it.
+"""
+import numpy as np
+
+from score.compiled import SPECS, Extremes
+from score.profiling import stage
+from score.scores.saps2 import SAPS2_ICD9
+
+
+def time_column(df, time=None):
+    """Time column of a long frame, `Hours` (MIMIC) or `ICULOS` (PhysioNet)."""
+    if time is not None:
+        return time
+    for col in ['Hours', 'ICULOS']:
+        if col in df:
+            return col
+    raise KeyError('No time column, expected `Hours` or `ICULOS`.')
+
+
+def admission_window(df, stay='stay', time=None, hours=24):
+    """Mask of the rows scored for each stay.
+
+    Rows strictly inside (0, `hours`) are used. Stays without such rows fall
+    back to their last pre-admission row (time < 0), and stays with neither
+    have no rows scored.
+
+    Parameters
+    ----------
+    df: pandas.DataFrame
+        Long frame of concatenated patient timeseries, time-ordered within
+        each stay.
+    stay: str
+        Stay identifier column.
+    time: str
+        Time column, detected with `time_column` if None.
+    hours: float
+        Length of the admission window.
+    """
+    import pandas as pd
+
+    t = df[time_column(df, time)].to_numpy(dtype=float)
+    stays = df[stay].to_numpy()
+
+    in_window = (0 < t) & (t < hours)
+    has_window = pd.Series(in_window).groupby(stays).transform('any')
+
+    # Last pre-admission row of each stay, by row order.
+    pre = np.flatnonzero(t < 0)
+    last_pre = pd.Series(pre).groupby(stays[pre]).max().to_numpy()
+    fallback = np.zeros(len(df), dtype=bool)
+    fallback[last_pre] = True
+
+    return in_window | (fallback & ~has_window.to_numpy())
+
+
+def stay_window(t, hours=24):
+    """`admission_window` of a single stay from its time array."""
+    t = np.asarray(t, dtype=float)
+    in_window = (0 < t) & (t < hours)
+    if in_window.any():
+        return in_window
+
+    window = np.zeros(len(t), dtype=bool)
+    pre = np.flatnonzero(t < 0)
+    if pre.size:
+        window[pre[-1]] = True
+    return window
+
+
+def score_window(window, score_names):
+    """Scores of a single stay's window, one per score name.
+
+    The window is binned once per score, but the minimum and maximum of
+    each variable are computed once and shared by every score.
+
+    Parameters
+    ----------
+    window: pandas.DataFrame or dict
+        Scored rows of one stay (see `stay_window`), keyed by score
+        variable name.
+    score_names: list of str
+        Score names, `oasis`, `saps2` or `apache2`.
+    """
+    extremes = Extremes(window)
+    scores = []
+    with stage('score'):
+        for score_name in score_names:
+            spec = SPECS[score_name]
+            score = sum(spec.var_scores(window, extremes).values())
+            if score_name == 'saps2' and 'icd9' in window:
+                icd9 = SAPS2_ICD9.cell_points(np.asarray(window['icd9']))
+                score += int(icd9.max(initial=0))
+            scores.append(score)
+
+    return scores
+
+
+def cohort_var_scores(df, score_name, stay='stay', time=None, hours=24):
+    """Worst points per stay and score variable.
+
+    Parameters
+    ----------
+    df: pandas.DataFrame
+        Long frame of concatenated patient timeseries with score variable
+        columns (see `score.utils.rename_variables`).
+    score_name: str
+        Score name, `oasis`, `saps2` or `apache2`.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Points indexed by sorted stay, one column per score output. Stays
+        without any scored rows have 0 points.
+    """
+    import pandas as pd
+
+    spec = SPECS[score_name]
+    with stage('window'):
+        stays = np.sort(df[stay].unique())
+        window = df.loc[admission_window(df, stay, time, hours)]
+        keys = window[stay].to_numpy()
+
+    with stage('bin'):
+        points = spec.row_points(window)
+        sums = spec.row_totals(window)
+
+    with stage('reduce'):
+        scores = pd.DataFrame(0., index=stays, columns=spec.outputs)
+        if points:
+            worst = pd.DataFrame(points).groupby(keys).max()
+            scores.update(worst.fillna(0.))
+        if sums:
+            totals = pd.DataFrame(sums).groupby(keys).sum(min_count=1)
+            for var in sums:
+                pts = spec.variables[var].points(totals[var].to_numpy())
+                scores.loc[totals.index, var] = np.where(np.isnan(pts), 0.,
+                                                         pts)
+
+    return scores.astype(int)
+
+
+def score_cohort(df, score_name, stay='stay', time=None, hours=24):
+    """Score every stay of a long-format frame.
+
+    Parameters
+    ----------
+    df: pandas.DataFrame
+        Long frame of concatenated patient timeseries.
+    score_name: str
+        Score name, `oasis`, `saps2` or `apache2`.
+    stay: str
+        Stay identifier column.
+    time: str
+        Time column, `Hours` or `ICULOS` if None.
+    hours: float
+        Length of the admission window.
+
+    Returns
+    -------
+    pandas.Series
+        Score indexed by sorted stay.
+    """
+    import pandas as pd
+
+    scores = cohort_var_scores(df, score_name, stay, time, hours).sum(axis=1)
+
+    if score_name == 'saps2' and 'icd9' in df:
+        with stage('icd9'):
+            window = df.loc[admission_window(df, stay, time, hours)]
+            icd9 = SAPS2_ICD9.cell_points(window['icd9'].to_numpy())
+            icd9 = pd.Series(icd9).groupby(window[stay].to_numpy()).max()
+            scores = scores.add(icd9, fill_value=0).astype(int)
+
+    return scores.rename(score_name)
@@ -0,0 +1,137 @@
+"""
+Bedside scoring module
+
+Incremental OASIS and SAPS II for live monitoring: the worst points per
+variable inside the admission window are kept as state, so each new
+observation costs a constant amount of work however long the stay.
+"""
+import numpy as np
+
+from score.compiled import SPECS, to_values
+from score.risk import RISKS
+from score.scores.saps2 import saps2_icd9
+from score.utils import variable_map
+
+
+class BedsideScorer(object):
+    """Stateful admission score updated one row or small batch at a time.
+
+    Parameters
+    ----------
+    score_name: str
+        Score name, `oasis` or `saps2`.
+    time: str
+        Time column, e.g. `ICULOS` (PhysioNet) or `Hours` (MIMIC).
+    hours: float
+        Length of the admission window.
+
+    Notes
+    -----
+    Rows follow the windowing of `score.batch.admission_window`: rows with
+    time strictly inside (0, `hours`) are scored, and until the first such
+    row arrives the last pre-admission row (time < 0) is used instead.
+    Variables are looked up by score variable name, then by their
+    PhysioNet column in `variable_map`.
+    """
+    def __init__(self, score_name, time='ICULOS', hours=24):
+        super(BedsideScorer, self).__init__()
+        self.score_name = score_name
+        self.spec = SPECS[score_name]
+        self.time = time
+        self.hours = hours
+        self.risk_func = RISKS[score_name]
+        self.reset()
+
+    def reset(self):
+        """Forget all observations."""
+        n_vars = len(self.spec.variables)
+        self.worst = np.full(n_vars, np.nan)
+        self.totals = np.full(n_vars, np.nan)
+        self.fallback = self.worst.copy(), self.totals.copy()
+        self.icd9, self.fallback_icd9 = 0, 0
+        self.has_window = False
+        self.n_obs = 0
+        self.score, self.risk = 0, float(self.risk_func(0))
+
+    def update(self, rows):
+        """Add one row or a small batch of rows.
+
+        Parameters
+        ----------
+        rows: dict or pandas.DataFrame
+            One row as a dict of scalars, or several rows as a DataFrame or
+            dict of equal length sequences, in time order.
+
+        Returns
+        -------
+        tuple
+            Current (score, risk).
+        """
+        rows = _columns(rows)
+        t = np.asarray(rows[self.time], dtype=float)
+        in_window = (0 < t) & (t < self.hours)
+        pre = np.flatnonzero(t < 0)
+        self.n_obs += len(t)
+
+        if in_window.any():
+            points, totals = self._observe(rows, in_window)
+            self.worst = np.fmax(self.worst, points)
+            self.totals = np.where(np.isnan(self.totals), totals,
+                np.where(np.isnan(totals), self.totals, self.totals + totals))
+            self.icd9 = max(self.icd9, self._icd9(rows, in_window))
+            self.has_window = True
+        elif pre.size and not self.has_window:
+            last = np.zeros(len(t), dtype=bool)
+            last[pre[-1]] = True
+            self.fallback = self._observe(rows, last)
+            self.fallback_icd9 = self._icd9(rows, last)
+
+        if self.has_window:
+            points = self._finish(self.worst, self.totals)
+            icd9 = self.icd9
+        else:
+            points = self._finish(*self.fallback)
+            icd9 = self.fallback_icd9
+        self.score = int(np.nansum(points)) + icd9
+        self.risk = float(self.risk_func(self.score))
+
+        return self.score, self.risk
+
+    def _observe(self, rows, mask):
+        """Worst points and running totals of the masked rows."""
+        points = np.full(len(self.spec.variables), np.nan)
+        totals = np.full(len(self.spec.variables), np.nan)
+        for i, (var, compiled) in enumerate(self.spec.variables.items()):
+            col = var if var in rows else variable_map.get(var)
+            if col not in rows:
+                continue
+            values = to_values(rows[col])[mask]
+            if compiled.kind == 'sum':
+                if not np.isnan(values).all():
+                    totals[i] = np.nansum(values)
+            elif values.size:
+                points[i] = np.fmax.reduce(compiled.points(values))
+
+        return points, totals
+
+    def _finish(self, worst, totals):
+        """Worst points with running totals binned."""
+        points = worst.copy()
+        for i, compiled in enumerate(self.spec.variables.values()):
+            if compiled.kind == 'sum' and not np.isnan(totals[i]):
+                points[i] = compiled.points(totals[i])
+
+        return points
+
+    def _icd9(self, rows, mask):
+        if self.score_name != 'saps2' or 'icd9' not in rows:
+            return 0
+
+        return saps2_icd9(np.asarray(rows['icd9'], dtype=object)[mask])
+
+
+def _columns(rows):
+    if hasattr(rows, 'columns'):
+        return {col: rows[col].to_numpy() for col in rows.columns}
+
+    return {col: np.atleast_1d(value) for col, value in rows.items()}
@@ -0,0 +1,122 @@
+"""
+Benchmark module
+
+Times each stage of scoring a cohort directory along the production path,
+`score.score_patients.score_file` (read, window, score, and within score
+the bin and reduce steps of `score.compiled.CompiledScore.var_scores`) and
+`write_scores` (write), as recorded by `score.profiling`, next to the
+`score_patients` and `main.py` entry points end to end, and saves the
+timings as JSON so runs of different versions can be compared.
+"""
+import argparse, json, numpy as np, os, pandas as pd, platform, shutil, \
+    sys, tempfile, time
+
+from score.profiling import PROFILER, stage
+from score.score_patients import score_file, score_patients, write_scores
+
+
+# `file` is the total of `read`, `window` and `score` over the files, and
+# `bin` and `reduce` are parts of `score`.
+STAGES = ['file', 'read', 'window', 'score', 'bin', 'reduce', 'write']
+
+
+def time_stages(root, score_name, out_dir):
+    """Seconds spent in each scoring stage over every file in `root`."""
+    files = sorted(f for f in os.listdir(root) if f != 'listfile.csv')
+
+    PROFILER.reset()
+    PROFILER.enable(memory=False)
+    try:
+        scores = np.array([[score_file(score_name, os.path.join(root, file))]
+                           for file in files], dtype=float)
+        with stage('write'):
+            write_scores(out_dir, f'stages_{score_name}', files, scores,
+                         ['score'])
+        stages = PROFILER.stages
+    finally:
+        PROFILER.disable()
+        PROFILER.reset()
+
+    return {name: stages[name]['seconds'] if name in stages else 0.
+            for name in STAGES}
+
+
+def time_entry_points(data, score_name, out_dir, workers=1):
+    """Wall time of `score_patients` and `main.py` on `data`/train."""
+    # main.py lives at the repository root, outside the package.
+    from main import main, parse_arguments
+
+    root = os.path.join(data, 'train')
+    t0 = time.perf_counter()
+    score_patients(score_name, root, 'train', out_dir, workers)
+    t1 = time.perf_counter()
+    main(parse_arguments([score_name, root, '-o', out_dir, '-v', '0',
+                          '-w', str(workers)]))
+    t2 = time.perf_counter()
+
+    return {'score_patients': t1 - t0, 'main': t2 - t1}
+
+
+def run_benchmark(data, scores=('oasis', 'saps2', 'apache2'), workers=1,
+                  label=None):
+    """Benchmark every score on the `train` partition of `data`.
+
+    Parameters
+    ----------
+    data: str
+        Cohort directory with a `train` partition, e.g. from
+        `score.synthetic.generate`.
+    scores: iterable of str
+        Score names to benchmark.
+    workers: int
+        Worker processes for the entry points.
+    label: str, optional
+        Name of this run, e.g. a version, stored with the results.
+    """
+    root = os.path.join(data, 'train')
+    out_dir = tempfile.mkdtemp()
+    results = {
+        'label': label,
+        'data': os.path.abspath(data),
+        'stays': len([f for f in os.listdir(root) if f != 'listfile.csv']),
+        'workers': workers,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'scores': {}
+    }
+    try:
+        for score_name in scores:
+            results['scores'][score_name] = {
+                'stages': time_stages(root, score_name, out_dir),
+                'entry_points': time_entry_points(data, score_name, out_dir,
+                                                  workers)
+            }
+    finally:
+        shutil.rmtree(out_dir)
+
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark ICU scoring.')
+    parser.add_argument('data', type=str,
+                        help='cohort directory with a train partition')
+    parser.add_argument('--scores', type=str, nargs='+',
+                        default=['oasis', 'saps2', 'apache2'],
+                        help='ICU severity score names')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of worker processes, 0 for all cores')
+    parser.add_argument('--label', type=str, default=None,
+                        help='name of this run, e.g. a version')
+    parser.add_argument('--out', type=str, default='benchmark.json',
+                        help='path to JSON results')
+    args = parser.parse_args()
+
+    results = run_benchmark(args.data, args.scores, args.workers, args.label)
+    with open(args.out, 'w') as f:
+        json.dump(results, f, indent=2)
+    json.dump(results['scores'], sys.stdout, indent=2)
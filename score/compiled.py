@@ -0,0 +1,430 @@
+"""
+Compiled score module
+
+Score tables from `score.mapping` compiled once, on first use, to NumPy
+edge and points arrays, so that binning a variable is a single
+`np.searchsorted` gather followed by a NaN-aware max instead of a `pd.cut`
+per call.
+
+Scores also take a single row of scalars (a dict, a structured array
+record or a 1-D array with a column map, see `as_columns`), which is
+scored in pure Python with `bisect` on the same edges, as NumPy calls
+cost more than the arithmetic for one row.
+"""
+import hashlib, numpy as np
+
+from bisect import bisect_left, bisect_right
+from collections.abc import Mapping
+
+from score import mapping
+from score.profiling import stage
+
+
+class CompiledVariable(object):
+    """Single variable of a score table.
+
+    Parameters
+    ----------
+    name: str
+        Variable name, as used in the score dictionary.
+    spec: dict
+        Score dictionary entry with 'bins', 'labels' and optional 'type'
+        (`numeric`/`categorical`/`sum`) and 'right' keys.
+
+    Notes
+    -----
+    Numeric intervals follow `pd.cut`: right-closed, i.e. of the form (a, b],
+    unless 'right' is False, in which case they are of the form [a, b).
+    Values outside the outermost edges score NaN, as `pd.cut` does, and are
+    ignored by `worst`.
+    """
+    def __init__(self, name, spec):
+        super(CompiledVariable, self).__init__()
+        self.name = name
+        self.kind = spec.get('type', 'numeric')
+        self.labels = np.asarray(spec['labels'], dtype=float)
+        self.version = table_hash(spec)
+
+        if self.kind == 'categorical':
+            self.categories = list(spec['bins'])
+            self.category_points = dict(zip(self.categories,
+                                            self.labels.tolist()))
+        else:
+            self.edges = np.asarray(spec['bins'], dtype=float)
+            # Float32 data (e.g. a cohort store) is cut at float32 edges, so
+            # that values parsed equal to an edge stay on the same side.
+            self.edges32 = self.edges.astype(np.float32)
+            self.side = 'left' if spec.get('right', True) else 'right'
+            # Index 0 and len(edges) are out of range (and NaN) values.
+            self.lookup = np.concatenate(([np.nan], self.labels, [np.nan]))
+            self.edge_list = self.edges.tolist()
+            self.edge32_list = list(self.edges32)
+            self.bisect = bisect_left if self.side == 'left' else bisect_right
+            self.label_list = [None] + self.labels.tolist() + [None]
+
+        # Points that fall then rise with the value peak at the extremes, so
+        # the worst points can be read off the minimum and maximum.
+        rising = np.cumsum(np.diff(self.labels) > 0) > 0
+        self.valley = self.kind == 'numeric' \
+            and not np.any(rising & (np.diff(self.labels) < 0))
+
+    def points(self, values):
+        """Points for each value, NaN where the value does not score."""
+        if self.kind == 'categorical':
+            values = np.asarray(values)
+            pts = np.full(values.shape, np.nan)
+            for category, label in zip(self.categories, self.labels):
+                if isinstance(category, str) and values.dtype.kind != 'O' \
+                        and values.dtype.kind != 'U':
+                    continue
+                pts[values == category] = label
+            return pts
+
+        values = np.asarray(values)
+        if values.dtype == np.float32:
+            edges = self.edges32
+        else:
+            values, edges = values.astype(float), self.edges
+        return self.lookup[np.searchsorted(edges, values, side=self.side)]
+
+    def point(self, value):
+        """Points of a single value, None where it does not score."""
+        if self.kind == 'categorical':
+            return self.category_points.get(value)
+        if value is None or value != value:
+            return None
+        edges = self.edge32_list if isinstance(value, np.float32) \
+            else self.edge_list
+        return self.label_list[self.bisect(edges, value)]
+
+    def worst(self, values, axis=None):
+        """Worst (maximum) points over `values`, 0 if nothing scores."""
+        if self.kind == 'sum':
+            values = np.asarray(values, dtype=float)
+            observed = ~np.isnan(values).all(axis=axis)
+            total = self.points(np.nansum(values, axis=axis))
+            return np.where(observed & ~np.isnan(total), total, 0.)
+
+        pts = self.points(values)
+        if axis is None:
+            pts = pts.ravel()
+            axis = 0
+        if pts.shape[axis] == 0:
+            return np.zeros(np.delete(pts.shape, axis))
+        worst = np.fmax.reduce(pts, axis=axis)
+        return np.where(np.isnan(worst), 0., worst)
+
+    def extreme_worst(self, extremes):
+        """Worst points from the (min, max) of a `valley` variable, None if
+        an extreme is out of range and every value has to be binned."""
+        pts = self.points(extremes)
+        if np.isnan(pts).any():
+            return None
+
+        return pts.max()
+
+
+class CompiledScore(object):
+    """Score table compiled variable by variable.
+
+    Parameters
+    ----------
+    name: str
+        Score name, e.g. `oasis`.
+    score_dict: dict
+        Score dictionary from `score.mapping`.
+
+    Attributes
+    ----------
+    inputs: list of str
+        Columns the score reads.
+    outputs: list of str
+        Names of the points the score adds up, see `var_scores`.
+    version: str
+        Hash of `score_dict`, which changes with any of its bins or labels.
+    """
+    def __init__(self, name, score_dict):
+        super(CompiledScore, self).__init__()
+        self.name = name
+        self.version = table_hash(score_dict)
+        self.variables = {var: CompiledVariable(var, spec)
+                          for var, spec in score_dict.items()}
+        self.inputs = list(self.variables)
+        self.outputs = list(self.variables)
+        # Variables whose points depend on other columns of the same row.
+        self.coupled = []
+
+    def row_points(self, data):
+        """Points per row of each variable reduced by its worst value.
+
+        Parameters
+        ----------
+        data: pandas.DataFrame or dict
+            Patient data keyed by variable name.
+
+        Returns
+        -------
+        dict
+            Points array (NaN where unscored) per output present in `data`.
+        """
+        return {var: compiled.points(to_values(data[var]))
+                for var, compiled in self.variables.items()
+                if compiled.kind != 'sum' and var in data}
+
+    def row_totals(self, data):
+        """Values per row of each variable reduced by its total."""
+        return {var: to_values(data[var]).astype(float)
+                for var, compiled in self.variables.items()
+                if compiled.kind == 'sum' and var in data}
+
+    def var_scores(self, data, extremes=None, columns=None):
+        """Worst points per output.
+
+        Parameters
+        ----------
+        data: pandas.DataFrame, dict or numpy.ndarray
+            Window of patient data keyed by variable name, or a single row
+            of scalars, see `as_columns`. Missing variables score 0.
+        extremes: Extremes, optional
+            Minimum and maximum of each column of `data`, shared between
+            scores of the same window. `valley` variables are then scored
+            from their extremes instead of from every value.
+        columns: list or dict, optional
+            Column names of a 2-D (or single row) array `data`.
+        """
+        data = as_columns(data, columns)
+        if is_row(data):
+            return self.row_scores(data)
+
+        scores = dict.fromkeys(self.outputs, 0)
+        if extremes is not None:
+            shared = {}
+            with stage('reduce'):
+                for var, compiled in self.variables.items():
+                    if not compiled.valley or var in self.coupled \
+                            or var not in data:
+                        continue
+                    pair = extremes[var]
+                    worst = 0 if pair is None \
+                        else compiled.extreme_worst(pair)
+                    if worst is not None:
+                        shared[var] = int(worst)
+            scores.update(shared)
+            data = {col: data[col] for col in self.inputs
+                    if col in data and col not in shared}
+
+        with stage('bin'):
+            points = self.row_points(data)
+            totals = self.row_totals(data)
+        with stage('reduce'):
+            for var, pts in points.items():
+                worst = np.fmax.reduce(pts.ravel()) if pts.size else np.nan
+                scores[var] = 0 if np.isnan(worst) else int(worst)
+            for var, values in totals.items():
+                scores[var] = int(self.variables[var].worst(values))
+
+        return scores
+
+    def row_scores(self, row):
+        """`var_scores` of a single row, a dict of scalars."""
+        scores = dict.fromkeys(self.outputs, 0)
+        for var, compiled in self.variables.items():
+            if var in row:
+                points = compiled.point(row[var])
+                if points is not None:
+                    scores[var] = int(points)
+
+        return scores
+
+    def score(self, data, columns=None):
+        """Total score over a window of patient data, see `var_scores`."""
+        return sum(self.var_scores(data, columns=columns).values())
+
+
+class CompiledApache2(CompiledScore):
+    """APACHE II table, with oxygenation scored per row on A-aDO2 where FiO2
+    is at least 0.5 and PaO2 otherwise, and creatinine points doubled in rows
+    with acute kidney injury (`aki` of 1).
+    """
+    def __init__(self, name, score_dict):
+        super(CompiledApache2, self).__init__(name, score_dict)
+        self.inputs = self.inputs + ['fio2', 'aki']
+        self.outputs = [var for var in self.outputs
+                        if var not in ['aado2', 'pao2']] + ['oxygenation']
+        self.coupled = ['aado2', 'pao2', 'creatinine']
+
+    def row_points(self, data):
+        points = super(CompiledApache2, self).row_points(data)
+
+        aado2, pao2 = points.pop('aado2', None), points.pop('pao2', None)
+        if aado2 is not None or pao2 is not None:
+            shape = (aado2 if aado2 is not None else pao2).shape
+            fio2 = to_values(data['fio2']).astype(float) if 'fio2' in data \
+                else np.full(shape, np.nan)
+            points['oxygenation'] = np.where(
+                fio2 >= 0.5,
+                aado2 if aado2 is not None else np.nan,
+                pao2 if pao2 is not None else np.nan)
+
+        if 'creatinine' in points and 'aki' in data:
+            aki = to_values(data['aki']).astype(float)
+            points['creatinine'] = points['creatinine'] \
+                * np.where(aki == 1, 2, 1)
+
+        return points
+
+    def row_scores(self, row):
+        scores = super(CompiledApache2, self).row_scores(row)
+
+        aado2, pao2 = scores.pop('aado2', 0), scores.pop('pao2', 0)
+        fio2 = row.get('fio2')
+        high_fio2 = fio2 is not None and fio2 >= 0.5
+        scores['oxygenation'] = aado2 if high_fio2 else pao2
+        if row.get('aki') == 1:
+            scores['creatinine'] *= 2
+
+        return scores
+
+
+class Extremes(object):
+    """Minimum and maximum of each column of a window, computed once on
+    first use and shared by every score of the window.
+
+    Parameters
+    ----------
+    data: pandas.DataFrame or dict
+        Window of patient data keyed by variable name.
+    """
+    def __init__(self, data):
+        super(Extremes, self).__init__()
+        self.data = data
+        self.cache = {}
+
+    def __getitem__(self, var):
+        """(min, max) array in the column's dtype, None if unobserved."""
+        if var not in self.cache:
+            values = to_values(self.data[var])
+            observed = values[~np.isnan(values)]
+            self.cache[var] = np.array([observed.min(), observed.max()],
+                                       dtype=values.dtype) \
+                if observed.size else None
+
+        return self.cache[var]
+
+
+# Types of a single value, as opposed to a column of values.
+SCALARS = (str, int, float, np.generic, type(None))
+
+
+def as_columns(data, columns=None):
+    """Patient data keyed by column name, without building a DataFrame.
+
+    Parameters
+    ----------
+    data: pandas.DataFrame, pandas.Series, dict or numpy.ndarray
+        Frame, row, dict of scalars (one row) or sequences, structured array
+        or record, or 2-D (rows x columns) or 1-D (one row) array.
+    columns: list or dict, optional
+        Column names of an unstructured array, in order or by column index.
+
+    Returns
+    -------
+    pandas.DataFrame, pandas.Series or dict
+        `data` unchanged unless it is an array or record, which becomes a
+        dict of column arrays, or of scalars if it holds a single row.
+
+    Raises
+    ------
+    TypeError
+        If `data` is none of the above.
+    """
+    if isinstance(data, np.void) and data.dtype.names is not None:
+        # A single record, e.g. `records[0]`.
+        return {name: data[name] for name in data.dtype.names}
+    if not isinstance(data, np.ndarray):
+        if isinstance(data, Mapping) \
+                or type(data).__module__.split('.')[0] == 'pandas':
+            return data
+        raise TypeError('Cannot score patient data of type %s, expected a '
+                        'DataFrame, dict or array.' % type(data).__name__)
+
+    if data.dtype.names is not None:
+        if data.size == 1:
+            record = data.reshape(-1)[0]
+            return {name: record[name] for name in data.dtype.names}
+        return {name: data[name] for name in data.dtype.names}
+
+    if columns is None:
+        raise ValueError('Column names are required to score an unstructured '
+                         'array.')
+    if not isinstance(columns, dict):
+        columns = {name: i for i, name in enumerate(columns)}
+    if data.ndim == 1:
+        row = list(data)
+        return {name: row[i] for name, i in columns.items()}
+    return {name: data[:, i] for name, i in columns.items()}
+
+
+def is_row(data):
+    """Whether `data` is a dict of scalars, i.e. a single row."""
+    return isinstance(data, dict) \
+        and all(isinstance(value, SCALARS) for value in data.values())
+
+
+def table_hash(table):
+    """Short hash of a `score.mapping` table, stable across runs."""
+    return hashlib.sha1(repr(table).encode()).hexdigest()[:12]
+
+
+def to_values(column):
+    """Column as a NumPy array, object columns cast to float if possible."""
+    if hasattr(column, 'to_numpy'):
+        column = column.to_numpy()
+    column = np.asarray(column)
+    if column.dtype.kind == 'O':
+        try:
+            column = column.astype(float)
+        except (TypeError, ValueError):
+            pass
+
+    return column
+
+
+class ScoreRegistry(Mapping):
+    """Compiled scores by name, each compiled on first access.
+
+    Parameters
+    ----------
+    factories: dict
+        (class, `score.mapping` table name) per score name.
+    """
+    def __init__(self, factories):
+        super(ScoreRegistry, self).__init__()
+        self.factories = factories
+        self.compiled = {}
+
+    def __getitem__(self, name):
+        if name not in self.compiled:
+            cls, table = self.factories[name]
+            self.compiled[name] = cls(name, getattr(mapping, table))
+        return self.compiled[name]
+
+    def __iter__(self):
+        return iter(self.factories)
+
+    def __len__(self):
+        return len(self.factories)
+
+
+SPECS = ScoreRegistry({
+    'oasis': (CompiledScore, 'oasis_dict'),
+    'saps2': (CompiledScore, 'saps2_dict'),
+    'apache2': (CompiledApache2, 'apache2_dict')
+})
+
+
+def __getattr__(name):
+    # `OASIS`, `SAPS2` and `APACHE2` are compiled when first imported.
+    if name.lower() in SPECS and name.isupper():
+        return SPECS[name.lower()]
+    raise AttributeError('module %r has no attribute %r' % (__name__, name))
@@ -0,0 +1,488 @@
+"""
+Cutoff search module
+
+Rescores a cohort under many alternative tables of a score, e.g. moved
+thresholds or relabelled bins of `score.mapping.oasis_dict`, without reading
+the patient files again, and reports the discrimination and calibration of
+each candidate table.
+
+`collect` reads every admission window once and keeps, per variable, the
+distinct values of each stay (the total for `sum` variables) as int32 codes
+into the sorted distinct values of the whole cohort. A candidate table is
+then binned over the cohort's distinct values only, and the worst points of
+each stay are gathered through its codes: from its first and last code for
+tables whose points fall then rise (see `CompiledVariable.valley`), from a
+segment max over all its codes otherwise. Variables a candidate leaves
+unchanged keep their points under the current table.
+
+Layout of a cutoff cohort directory, memory-mapped by every worker process
+so that they share one copy in the page cache:
+    {variable}.values.npy   sorted distinct values of numeric variables
+    {variable}.codes.npy    int32 codes of each stay's distinct values
+    {variable}.offsets.npy  (stays + 1,) int64, codes of stay i are
+                            offsets[i]:offsets[i+1]
+    fixed.npy               (stays,) points no table changes, the SAPS II
+                            chronic disease points
+    meta.json               score name, stay ids, categories of
+                            categorical variables and the version of the
+                            fixed points
+"""
+import argparse, json, numpy as np, os, pandas as pd
+
+from functools import partial
+from itertools import product
+
+from score import mapping
+from score.compiled import SPECS, CompiledVariable, table_hash, to_values
+from score.evaluate import auroc_counts, cell_metrics
+from score.parallel import parallel_map, report_failures
+from score.profiling import stage
+from score.risk import PUBLISHED, RISK_TABLES
+from score.score_patients import read_window
+from score.scores.saps2 import SAPS2_ICD9
+from score.tune_scores import fit_logistic, risk_features
+
+
+def score_dict(score_name):
+    """Current `score.mapping` table of `score_name`."""
+    return getattr(mapping, SPECS.factories[score_name][1])
+
+
+def fixed_version(score_name):
+    return table_hash(mapping.saps2_icd9_dict) if score_name == 'saps2' \
+        else ''
+
+
+def collect_file(score_name, path):
+    """Distinct window values of one patient file per score variable, and
+    its fixed points."""
+    with stage('file', path):
+        window = read_window(path, [score_name])
+
+        distinct = {}
+        for var, compiled in SPECS[score_name].variables.items():
+            if var not in window:
+                continue
+            values = to_values(window[var])
+            if compiled.kind == 'categorical':
+                distinct[var] = list(dict.fromkeys(
+                    v for v in values.tolist() if v is not None and v == v))
+            elif compiled.kind == 'sum':
+                # Totalled in float64, as `CompiledVariable.worst` does.
+                values = values.astype(float)
+                distinct[var] = np.nansum(values, keepdims=True) \
+                    if (~np.isnan(values)).any() else np.zeros(0)
+            else:
+                values = values.astype(np.float32)
+                distinct[var] = np.unique(values[~np.isnan(values)])
+
+        fixed = 0
+        if score_name == 'saps2' and 'icd9' in window:
+            fixed = SAPS2_ICD9.cell_points(np.asarray(window['icd9'])) \
+                .max(initial=0)
+
+    return distinct, int(fixed)
+
+
+def collect(root, out_dir, score_name, workers=1, chunksize=None):
+    """Write the cutoff cohort of a directory of patient files.
+
+    Files that fail to read are reported and left out of the cohort.
+    """
+    spec = SPECS[score_name]
+    if spec.coupled:
+        raise ValueError('Cutoff search does not support `%s`, whose '
+                         'points of %s depend on other columns.'
+                         % (score_name, spec.coupled))
+    stays = sorted(f for f in os.listdir(root) if f != 'listfile.csv')
+    paths = [os.path.join(root, f) for f in stays]
+
+    results = parallel_map(partial(collect_file, score_name), paths,
+                           workers=workers, chunksize=chunksize)
+    report_failures(paths, results)
+    kept = [(stay, result) for stay, (result, error) in zip(stays, results)
+            if error is None]
+
+    if not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+    categories = {}
+    for var, compiled in spec.variables.items():
+        distinct = [result[0].get(var, ()) for _, result in kept]
+        lengths = np.array([len(d) for d in distinct], dtype=np.int64)
+        offsets = np.concatenate(([0], np.cumsum(lengths)))
+        if compiled.kind == 'categorical':
+            categories[var] = list(dict.fromkeys(v for d in distinct
+                                                 for v in d))
+            index = {v: i for i, v in enumerate(categories[var])}
+            codes = np.array([index[v] for d in distinct for v in d],
+                             dtype=np.int32)
+        else:
+            dtype = float if compiled.kind == 'sum' else np.float32
+            flat = np.concatenate([np.zeros(0, dtype=dtype)]
+                                  + [np.asarray(d, dtype=dtype)
+                                     for d in distinct])
+            values, codes = np.unique(flat, return_inverse=True)
+            np.save(os.path.join(out_dir, var + '.values.npy'), values)
+        np.save(os.path.join(out_dir, var + '.codes.npy'),
+                codes.astype(np.int32))
+        np.save(os.path.join(out_dir, var + '.offsets.npy'), offsets)
+
+    np.save(os.path.join(out_dir, 'fixed.npy'),
+            np.array([result[1] for _, result in kept], dtype=np.int64))
+    with open(os.path.join(out_dir, 'meta.json'), 'w') as f:
+        json.dump({'score': score_name,
+                   'stays': [stay for stay, _ in kept],
+                   'categories': categories,
+                   'fixed_version': fixed_version(score_name)}, f)
+
+
+def compile_candidate(score_name, candidate):
+    """Compiled tables of the variables a candidate changes.
+
+    Parameters
+    ----------
+    candidate: dict
+        Entries of the score dictionary to replace per variable, e.g.
+        `{'heart_rate': {'bins': [-1, 32, 90, 106, 125, 300]}}`. Keys not
+        given (`labels`, `right`) are those of the current table.
+
+    Raises
+    ------
+    ValueError
+        If a table is malformed, gives negative points or changes the
+        variable's type.
+    """
+    tables = score_dict(score_name)
+    compiled = {}
+    for var, entry in candidate.items():
+        if var not in tables:
+            raise KeyError('`%s` is not a %s variable.' % (var, score_name))
+        spec = dict(tables[var], **entry)
+        kind = tables[var].get('type', 'numeric')
+        if spec.get('type', 'numeric') != kind:
+            raise ValueError('`%s` has to stay %s.' % (var, kind))
+        n_bins = len(spec['bins']) - (kind != 'categorical')
+        if len(spec['labels']) != n_bins:
+            raise ValueError('`%s` has %d labels for %d bins.'
+                             % (var, len(spec['labels']), n_bins))
+        if kind != 'categorical' and \
+                not np.all(np.diff(np.asarray(spec['bins'], float)) > 0):
+            raise ValueError('Bins of `%s` are not increasing.' % var)
+        if np.any(np.asarray(spec['labels'], float) < 0):
+            raise ValueError('Labels of `%s` are negative.' % var)
+        compiled[var] = CompiledVariable(var, spec)
+
+    return compiled
+
+
+class CutoffCohort(object):
+    """Cutoff cohort written by `collect`.
+
+    Parameters
+    ----------
+    path: str
+        Cutoff cohort directory.
+
+    Attributes
+    ----------
+    base: dict
+        Worst points per stay of each variable under the current table.
+    total: numpy.ndarray
+        Score per stay under the current tables.
+    """
+    def __init__(self, path):
+        super(CutoffCohort, self).__init__()
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        self.score_name = meta['score']
+        self.stays = meta['stays']
+        if meta['fixed_version'] != fixed_version(self.score_name):
+            raise ValueError('The SAPS II chronic disease table has changed '
+                             'since the cohort was collected, collect it '
+                             'again.')
+
+        spec = SPECS[self.score_name]
+        self.values, self.codes, self.offsets = {}, {}, {}
+        for var, compiled in spec.variables.items():
+            if compiled.kind == 'categorical':
+                self.values[var] = meta['categories'][var]
+            else:
+                self.values[var] = np.load(
+                    os.path.join(path, var + '.values.npy'), mmap_mode='r')
+            self.codes[var] = np.load(os.path.join(path, var + '.codes.npy'),
+                                      mmap_mode='r')
+            self.offsets[var] = np.load(
+                os.path.join(path, var + '.offsets.npy'))
+        self.fixed = np.load(os.path.join(path, 'fixed.npy'))
+
+        # Stays with codes, and their first and last (lowest and highest)
+        # codes, shared by every candidate.
+        self.segments = {}
+        for var, offsets in self.offsets.items():
+            rows = np.flatnonzero(offsets[1:] > offsets[:-1])
+            start, stop = offsets[rows], offsets[rows + 1]
+            self.segments[var] = (rows, start, stop,
+                                  np.asarray(self.codes[var][start]),
+                                  np.asarray(self.codes[var][stop - 1]))
+
+        self.base = {var: self.worst(var, compiled)
+                     for var, compiled in spec.variables.items()}
+        self.total = sum(self.base.values()) + self.fixed
+
+    def __len__(self):
+        return len(self.stays)
+
+    def worst(self, var, compiled):
+        """Worst points per stay of `var` under the table `compiled`, 0
+        where nothing scores."""
+        if compiled.kind == 'categorical':
+            points = np.array([compiled.category_points.get(v, np.nan)
+                               for v in self.values[var]], dtype=float)
+        else:
+            points = compiled.points(np.asarray(self.values[var]))
+        codes = self.codes[var]
+        rows, start, stop, first, last = self.segments[var]
+
+        worst = np.zeros(len(self))
+        if not compiled.valley:
+            if len(codes) == len(rows):
+                # One value per stay, e.g. age or a total.
+                worst[rows] = points[first]
+            elif rows.size:
+                worst[rows] = np.fmax.reduceat(points[codes], start)
+        else:
+            low, high = points[first], points[last]
+            worst[rows] = np.fmax(low, high)
+            # An out of range extreme hides the worst in range value.
+            hidden = np.isnan(low) | np.isnan(high)
+            if hidden.any():
+                worst[rows[hidden]] = _segment_fmax(
+                    points, codes, start[hidden], stop[hidden])
+
+        return np.nan_to_num(worst).astype(np.int64)
+
+    def score(self, candidate=None):
+        """Score per stay under the current tables with the variables of
+        `candidate` replaced, see `compile_candidate`."""
+        score = self.total.copy()
+        for var, compiled in compile_candidate(self.score_name,
+                                               candidate or {}).items():
+            score += self.worst(var, compiled) - self.base[var]
+
+        return score
+
+
+def score_metrics(score_name, score, y, coefficients=None):
+    """AUROC of a score and its calibration under `coefficients` (the
+    published ones if None) and under a logistic refit of them.
+
+    Returns
+    -------
+    dict
+        `auroc`, `brier`, `citl` (see `score.evaluate`), the refitted
+        coefficients `b0`, `b1` (and `b2` for SAPS II), their
+        `brier_refit` and whether the refit `converged`.
+    """
+    score, y = np.asarray(score, dtype=np.int64), np.asarray(y, dtype=int)
+    counts = np.bincount(2 * score + y, minlength=2 * (score.max() + 1)) \
+        .reshape(-1, 2)
+    cells = np.arange(len(counts))
+    if coefficients is None:
+        coefficients = PUBLISHED[score_name]
+
+    brier, citl = cell_metrics(
+        RISK_TABLES.risks(score_name, cells, [coefficients]), counts)
+    X = risk_features(score_name, cells)
+    # Started from the outcome rate, as candidate scores can be far from
+    # the scale of the published coefficients.
+    beta0 = np.zeros(X.shape[1])
+    rate = np.clip(y.mean(), 1e-6, 1 - 1e-6)
+    beta0[0] = np.log(rate / (1 - rate))
+    refit, converged = fit_logistic(X, counts[None, :, 1],
+                                    counts.sum(axis=1)[None], beta0)
+    brier_refit, _ = cell_metrics(1 / (1 + np.exp(-(refit @ X.T))), counts)
+
+    metrics = {'auroc': auroc_counts(counts), 'brier': brier[0],
+               'citl': citl[0]}
+    metrics.update(('b%d' % i, b) for i, b in enumerate(refit[0]))
+    metrics['brier_refit'] = brier_refit[0]
+    metrics['converged'] = converged[0]
+
+    return metrics
+
+
+# Cutoff cohorts loaded by this process, by path.
+COHORTS = {}
+
+
+def load_cohort(path):
+    if path not in COHORTS:
+        COHORTS[path] = CutoffCohort(path)
+
+    return COHORTS[path]
+
+
+def evaluate_candidate(path, y, coefficients, candidate):
+    """`score_metrics` of a candidate table on the cutoff cohort at
+    `path`."""
+    cohort = load_cohort(path)
+    with stage('score'):
+        score = cohort.score(candidate)
+
+    return score_metrics(cohort.score_name, score, y, coefficients)
+
+
+def search(path, y, candidates, coefficients=None, workers=1,
+           chunksize=None):
+    """Discrimination and calibration of every candidate table.
+
+    Parameters
+    ----------
+    path: str
+        Cutoff cohort directory, see `collect`.
+    y: numpy.ndarray
+        Outcome per stay of the cohort (`0`/`1`), in the order of `stays`.
+    candidates: list of dict
+        Candidate tables, see `compile_candidate`. `{}` is the current
+        table.
+    coefficients: array-like, optional
+        Risk model coefficients, the published ones if None.
+    workers: int
+        Number of worker processes, 0 for all cores. Each loads the cohort
+        once.
+
+    Returns
+    -------
+    pandas.DataFrame
+        One row of `score_metrics` per candidate, NaN where the candidate
+        failed, with the candidate as JSON.
+    """
+    candidates = list(candidates)
+    results = parallel_map(partial(evaluate_candidate, path,
+                                   np.asarray(y, dtype=np.int8),
+                                   coefficients),
+                           candidates, workers=workers, chunksize=chunksize)
+    report_failures(['candidate %d' % i for i in range(len(candidates))],
+                    results)
+
+    score_name = load_cohort(path).score_name
+    columns = ['auroc', 'brier', 'citl'] \
+        + ['b%d' % i for i in range(len(PUBLISHED[score_name]))] \
+        + ['brier_refit', 'converged']
+    metrics = pd.DataFrame([result or {} for result, _ in results],
+                           columns=columns)
+    metrics['candidate'] = [json.dumps(c) for c in candidates]
+
+    return metrics
+
+
+def edge_grid(score_name, sweeps):
+    """Candidates for every combination of moved bin edges.
+
+    Parameters
+    ----------
+    sweeps: list of tuple
+        (variable, edge index, values) per edge to move, e.g.
+        `[('heart_rate', 2, range(80, 100))]`.
+
+    Returns
+    -------
+    list of dict
+        Candidate tables, see `compile_candidate`, skipping combinations
+        whose edges are not increasing.
+    """
+    tables = score_dict(score_name)
+    candidates = []
+    for combination in product(*(values for _, _, values in sweeps)):
+        candidate = {}
+        for (var, edge, _), value in zip(sweeps, combination):
+            bins = list(candidate.get(var, tables[var])['bins'])
+            bins[edge] = float(value)
+            candidate[var] = {'bins': bins}
+        if all(np.all(np.diff(entry['bins']) > 0)
+               for entry in candidate.values()):
+            candidates.append(candidate)
+
+    return candidates
+
+
+def _segment_fmax(points, codes, start, stop):
+    """Max over `points[codes[start[i]:stop[i]]]` per non-empty segment."""
+    lengths = stop - start
+    first = np.cumsum(lengths) - lengths
+    index = np.arange(lengths.sum()) - np.repeat(first - start, lengths)
+
+    return np.fmax.reduceat(points[codes[index]], first)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Search alternative ICU score tables.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    collect_parser = commands.add_parser(
+        'collect', help='collect the window values of a cohort once')
+    collect_parser.add_argument('score_name', type=str,
+                                choices=['oasis', 'saps2'],
+                                help='ICU severity score')
+    collect_parser.add_argument('data', type=str,
+                                help='path to patient directory')
+    collect_parser.add_argument('out', type=str,
+                                help='cutoff cohort directory')
+    collect_parser.add_argument('--workers', type=int, default=1,
+                                help='number of worker processes, 0 for all '
+                                     'cores')
+    collect_parser.add_argument('--chunksize', type=int, default=None,
+                                help='files per worker task')
+
+    search_parser = commands.add_parser(
+        'search', help='evaluate candidate tables on a collected cohort')
+    search_parser.add_argument('cohort', type=str,
+                               help='cutoff cohort directory')
+    search_parser.add_argument('listfile', type=str,
+                               help='path to listfile')
+    search_parser.add_argument('--candidates', type=str, default=None,
+                               help='JSON list of candidate tables')
+    search_parser.add_argument('--sweep', type=str, nargs=5, action='append',
+                               default=[],
+                               metavar=('VAR', 'EDGE', 'START', 'STOP',
+                                        'STEP'),
+                               help='move edge EDGE of VAR over '
+                                    'arange(START, STOP, STEP), combined '
+                                    'with every other --sweep')
+    search_parser.add_argument('--workers', type=int, default=1,
+                               help='number of worker processes, 0 for all '
+                                    'cores')
+    search_parser.add_argument('--chunksize', type=int, default=None,
+                               help='candidates per worker task')
+    search_parser.add_argument('--out', type=str, default=None,
+                               help='CSV to write the metrics to')
+    args = parser.parse_args()
+
+    if args.command == 'collect':
+        collect(args.data, args.out, args.score_name, args.workers,
+                args.chunksize)
+    else:
+        cohort = load_cohort(args.cohort)
+        labels = pd.read_csv(args.listfile).set_index('stay')['y_true']
+        missing = [stay for stay in cohort.stays if stay not in labels.index]
+        if missing:
+            raise ValueError('%d stays, e.g. %s, are not in %s.'
+                             % (len(missing), missing[0], args.listfile))
+        y = labels.loc[cohort.stays].values
+
+        candidates = [{}]
+        if args.candidates is not None:
+            with open(args.candidates) as f:
+                candidates += json.load(f)
+        if args.sweep:
+            candidates += edge_grid(cohort.score_name, [
+                (var, int(edge), np.arange(float(start), float(stop),
+                                           float(step)))
+                for var, edge, start, stop, step in args.sweep])
+
+        metrics = search(args.cohort, y, candidates, workers=args.workers,
+                         chunksize=args.chunksize)
+        if args.out is not None:
+            metrics.to_csv(args.out, index=None)
+        print(metrics.sort_values('auroc', ascending=False).head(10))
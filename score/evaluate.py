@@ -0,0 +1,238 @@
+"""
+Evaluation module
+
+Discrimination and calibration of many risk models at once. Stays are
+collapsed to counts per (score, outcome) cell, as in
+`score.tune_scores.recalibrate`, and each coefficient set to its risk per
+distinct score (`score.risk.RiskTables`), so every metric of every set is a
+matrix product over at most a few hundred cells:
+
+    auroc   Mann-Whitney statistic from the cumulative outcome counts of
+            the cells in score order, shared by every set whose risk rises
+            with the score
+    brier   mean squared difference between risk and outcome
+    citl    calibration-in-the-large, observed rate minus mean risk, so
+            positive when risk is underestimated
+"""
+import argparse, numpy as np, os, pandas as pd
+
+from score.risk import PUBLISHED, RISK_TABLES
+from score.tune_scores import resample_cells
+
+
+METRICS = ['auroc', 'brier', 'citl']
+
+
+def cell_counts(score, y):
+    """Distinct scores, sorted, and (scores x 2) stays per score and
+    outcome (`0`/`1`)."""
+    scores, cell = np.unique(np.asarray(score, dtype=float),
+                             return_inverse=True)
+    counts = np.zeros((len(scores), 2), dtype=np.int64)
+    np.add.at(counts, (cell, np.asarray(y, dtype=int)), 1)
+
+    return scores, counts
+
+
+def auroc_counts(counts):
+    """AUROC of cells in increasing risk order, ties within a cell counted
+    as half.
+
+    Parameters
+    ----------
+    counts: numpy.ndarray
+        (..., cells x 2) stays per cell and outcome.
+    """
+    neg, pos = counts[..., 0], counts[..., 1]
+    below = np.cumsum(neg, axis=-1) - neg
+    pairs = pos.sum(axis=-1) * neg.sum(axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (pos * (below + neg / 2)).sum(axis=-1) / pairs
+
+
+def set_aurocs(risks, counts):
+    """AUROC of each coefficient set from its (sets x cells) risks, (sets,)
+    or (resamples x sets) as for `cell_metrics`.
+
+    Sets whose risk strictly rises (falls) with the score share the AUROC
+    of the score ranking (its complement). Others, e.g. a flat risk or one
+    saturating at 0 or 1, are ranked on their own, with cells of equal risk
+    merged so that their stays count as ties.
+    """
+    shared = auroc_counts(counts)[..., None]
+    step = np.diff(risks, axis=-1)
+    rising, falling = (step > 0).all(axis=-1), (step < 0).all(axis=-1)
+    aurocs = np.where(rising, shared, 1 - shared)
+    for k in np.flatnonzero(~rising & ~falling):
+        levels, level = np.unique(risks[k], return_inverse=True)
+        merge = np.zeros((len(levels), len(level)), dtype=np.int64)
+        merge[level, np.arange(len(level))] = 1
+        aurocs[..., k] = auroc_counts(merge @ counts)
+
+    return aurocs
+
+
+def cell_metrics(risks, counts):
+    """Brier score and calibration-in-the-large of each coefficient set.
+
+    Parameters
+    ----------
+    risks: numpy.ndarray
+        (sets x cells) risk of each cell's score under each set.
+    counts: numpy.ndarray
+        (cells x 2) or (resamples x cells x 2) stays per cell and outcome.
+
+    Returns
+    -------
+    tuple of numpy.ndarray
+        Brier and calibration-in-the-large, (sets,) or (resamples x sets).
+    """
+    neg, pos = counts[..., 0], counts[..., 1]
+    n = (neg + pos).sum(axis=-1)[..., None]
+    brier = (pos @ ((1 - risks) ** 2).T + neg @ (risks ** 2).T) / n
+    citl = pos.sum(axis=-1)[..., None] / n - ((pos + neg) @ risks.T) / n
+
+    return brier, citl
+
+
+def evaluate(score_name, score, y, coefficients=None):
+    """AUROC, Brier score and calibration-in-the-large of coefficient sets.
+
+    Parameters
+    ----------
+    score_name: str
+        Score name, `oasis` or `saps2`.
+    score: numpy.ndarray
+        Score per stay.
+    y: numpy.ndarray
+        Outcome per stay (`0`/`1`).
+    coefficients: numpy.ndarray, optional
+        (sets x coefficients) rows, e.g. `B` of `score.tune_scores`. The
+        published coefficients if None.
+
+    Returns
+    -------
+    pandas.DataFrame
+        One row per coefficient set, columns `METRICS`.
+    """
+    coefficients = _coefficients(score_name, coefficients)
+    scores, counts = cell_counts(score, y)
+    risks = RISK_TABLES.risks(score_name, scores, coefficients)
+    brier, citl = cell_metrics(risks, counts)
+
+    return pd.DataFrame({'auroc': set_aurocs(risks, counts),
+                         'brier': brier, 'citl': citl})
+
+
+def calibration_curve(score_name, score, y, coefficients=None, bins=10):
+    """Mean risk and observed rate per quantile of risk.
+
+    Bins are cut on the score once for all sets, which for risks monotone
+    in the score are also risk quantiles. Stays with the same score share
+    a bin.
+
+    Returns
+    -------
+    tuple of numpy.ndarray
+        (sets x bins) mean risk, (bins,) observed rate and (bins,) stays
+        per bin. Bins left empty by ties are NaN.
+    """
+    coefficients = _coefficients(score_name, coefficients)
+    scores, counts = cell_counts(score, y)
+    risks = RISK_TABLES.risks(score_name, scores, coefficients)
+
+    tot = counts.sum(axis=1)
+    middle = np.cumsum(tot) - tot / 2
+    onehot = np.zeros((len(scores), bins))
+    onehot[np.arange(len(scores)),
+           np.minimum((middle * bins / tot.sum()).astype(int), bins - 1)] = 1
+
+    stays = tot @ onehot
+    with np.errstate(invalid='ignore', divide='ignore'):
+        predicted = ((risks * tot) @ onehot) / stays
+        observed = (counts[:, 1] @ onehot) / stays
+
+    return predicted, observed, stays
+
+
+def bootstrap(score_name, score, y, coefficients=None, n_resamples=1000,
+              alpha=0.05, random_state=0):
+    """Percentile bootstrap confidence intervals of `evaluate`.
+
+    Resamples are drawn directly as cell counts (see
+    `score.tune_scores.resample_cells`), so the cost does not grow with
+    the number of stays.
+
+    Returns
+    -------
+    pandas.DataFrame
+        One row per coefficient set, with the point estimate, `_low` and
+        `_high` columns of each metric.
+    """
+    coefficients = _coefficients(score_name, coefficients)
+    scores, counts = cell_counts(score, y)
+    risks = RISK_TABLES.risks(score_name, scores, coefficients)
+
+    rng = np.random.default_rng(random_state)
+    cells = resample_cells(counts, n_resamples, 'bootstrap', None, rng)
+    brier, citl = cell_metrics(risks, cells)
+    samples = {'auroc': set_aurocs(risks, cells), 'brier': brier,
+               'citl': citl}
+
+    result = evaluate(score_name, score, y, coefficients)
+    for metric in METRICS:
+        low, high = np.nanpercentile(samples[metric],
+                                     [100 * alpha / 2, 100 * (1 - alpha / 2)],
+                                     axis=0)
+        result[metric + '_low'] = low
+        result[metric + '_high'] = high
+
+    return result
+
+
+def _coefficients(score_name, coefficients):
+    if score_name not in PUBLISHED:
+        raise Exception('ICU score is not recognized.')
+    if coefficients is None:
+        coefficients = PUBLISHED[score_name]
+    if isinstance(coefficients, pd.DataFrame):
+        coefficients = coefficients.filter(regex=r'^b\d+$')
+
+    return np.atleast_2d(np.asarray(coefficients, dtype=float))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Evaluate ICU score risks.')
+    parser.add_argument('score_name', type=str,
+                        help='ICU severity score')
+    parser.add_argument('data', type=str,
+                        help='path to data directory')
+    parser.add_argument('listfile', type=str,
+                        help='path to listfile')
+    parser.add_argument('--coefs', type=str, default=None,
+                        help='CSV of coefficient sets from tune_scores, '
+                             'published coefficients if not given')
+    parser.add_argument('--partition', type=str, default='test',
+                        help='partition of the scores to evaluate')
+    parser.add_argument('--resamples', type=int, default=1000,
+                        help='bootstrap resamples, 0 for point estimates')
+    parser.add_argument('--out', type=str, default=None,
+                        help='CSV to write the metrics to')
+    args = parser.parse_args()
+
+    scores = pd.read_csv(os.path.join(
+        args.data, f'{args.partition}_{args.score_name}_scores.csv'))
+    stays = scores.merge(pd.read_csv(args.listfile), on='stay') \
+        .dropna(subset=['score'])
+    coefficients = None if args.coefs is None else pd.read_csv(args.coefs)
+
+    if args.resamples > 0:
+        metrics = bootstrap(args.score_name, stays['score'].values,
+                            stays['y_true'].values, coefficients,
+                            args.resamples)
+    else:
+        metrics = evaluate(args.score_name, stays['score'].values,
+                           stays['y_true'].values, coefficients)
+    if args.out is not None:
+        metrics.to_csv(args.out, index=None)
+    print(metrics)
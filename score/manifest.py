@@ -0,0 +1,108 @@
+"""
+Manifest module
+
+Per partition and score record of the files already scored, so reruns of
+`score_patients` only score new or modified files. A manifest is discarded
+when anything the scores are computed from changes: the score's tables in
+`score.mapping`, the source column of each variable in
+`score.utils.variable_map` or the length of the admission window.
+"""
+import hashlib, json, os
+
+from score.compiled import SPECS, table_hash
+from score.mapping import saps2_icd9_dict
+from score.utils import variable_map
+
+
+MANIFEST_VERSION = 3
+
+
+def spec_version(score_name, hours=24):
+    """Version of everything `score_name` is computed from over an
+    admission window of `hours`."""
+    version = SPECS[score_name].version
+    if score_name == 'saps2':
+        version += '-' + table_hash(saps2_icd9_dict)
+    version += '-%s-%gh' % (table_hash(variable_map), hours)
+
+    return version
+
+
+def file_key(path, check='mtime'):
+    """Identity of a file's contents, from its size and either its
+    modification time (`mtime`) or a hash of its bytes (`hash`)."""
+    stat = os.stat(path)
+    if check == 'mtime':
+        return [stat.st_size, stat.st_mtime_ns]
+    if check == 'hash':
+        digest = hashlib.blake2b(digest_size=16)
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        return [stat.st_size, digest.hexdigest()]
+    raise ValueError(f'Unknown check `{check}`, expected `mtime` or `hash`.')
+
+
+class Manifest(object):
+    """Scores of previously scored files.
+
+    Parameters
+    ----------
+    path: str
+        JSON manifest, created on `save` if missing.
+    score_names: str or list of str
+        Score names, `oasis`, `saps2` or `apache2`.
+    check: str
+        How files are compared, see `file_key`.
+    hours: float
+        Length of the admission window the files are scored over.
+    """
+    def __init__(self, path, score_names, check='mtime', hours=24):
+        super(Manifest, self).__init__()
+        if isinstance(score_names, str):
+            score_names = [score_names]
+        self.path = path
+        self.header = {'manifest': MANIFEST_VERSION,
+                       'scores': list(score_names),
+                       'spec': [spec_version(name, hours)
+                                for name in score_names],
+                       'check': check}
+        self.check = check
+        self.files = {}
+
+        if os.path.exists(path):
+            with open(path) as f:
+                manifest = json.load(f)
+            if all(manifest.get(k) == v for k, v in self.header.items()):
+                self.files = manifest['files']
+
+    def key(self, path):
+        return file_key(path, self.check)
+
+    def lookup(self, path, key):
+        """Cached scores of `path` if its key is unchanged, else None."""
+        entry = self.files.get(os.path.abspath(path))
+        if entry is None or entry['key'] != key:
+            return None
+
+        return entry['scores']
+
+    def update(self, paths, keys, scores):
+        """Replace the entries with `paths`, dropping every other file.
+
+        `scores` holds a list of scores per file. Files with a missing (None
+        or NaN) score are not recorded, so that they are scored again on
+        the next run.
+        """
+        self.files = {
+            os.path.abspath(path): {'key': key, 'scores': score}
+            for path, key, score in zip(paths, keys, scores)
+            if score is not None and all(s == s for s in score)
+        }
+
+    def save(self):
+        """Write the manifest, replacing any previous one atomically."""
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(dict(self.header, files=self.files), f)
+        os.replace(tmp, self.path)
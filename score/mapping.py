@@ -4,140 +4,252 @@ import numpy as np
 oasis_dict = {
 	'admission_type': {
 		'bins': ['ELECTIVE', 'EMERGENCY', 'URGENT'],
-		'labels': [0, 6, 6]
-		# 'type': 
+		'labels': [0, 6, 6],
+		'type': 'categorical'
 	},
 	'age': {
 		'bins': [-1, 24, 53, 77, 89, 200],
-		'labels': [0, 3, 6, 9, 7]
-		# 'type':
+		'labels': [0, 3, 6, 9, 7],
+		'type': 'numeric'
 	},
 	'glasgow_coma_scale_total': {
 		'bins': [-1, 7, 13, 14, 15],
-		'labels': [10, 4, 3, 0]
-		# 'type':
+		'labels': [10, 4, 3, 0],
+		'type': 'numeric'
 	},
 	'heart_rate': {
 		'bins': [-1, 32, 88, 106, 125, 300],
-		'labels': [4, 0, 1, 3, 6]
-		# 'type':
+		'labels': [4, 0, 1, 3, 6],
+		'type': 'numeric'
 	},
 	'mean_blood_pressure': {
 		'bins': [-1, 20.65, 51.0, 61.33, 143.44, 350],
-		'labels': [4, 3, 2, 0, 3]
-		# 'type':
+		'labels': [4, 3, 2, 0, 3],
+		'type': 'numeric'
 	},
 	'prelos': {
 		'bins': [-0.01, 0.17, 4.95, 24.0, 311.8, 3650.0],
-		'labels': [5, 3, 0, 2, 1]
-		# 'type':
+		'labels': [5, 3, 0, 2, 1],
+		'type': 'numeric'
 	},
 	'respiratory_rate': {
 		'bins': [-1, 5, 12, 22, 29, 43, 200],
-		'labels': [10, 1, 0, 1, 6, 9]
-		# 'type':
+		'labels': [10, 1, 0, 1, 6, 9],
+		'type': 'numeric'
 	},
 	'temperature': {
 		'bins': [-1, 33.22, 35.93, 36.39, 36.89, 39.88, 80.0],
 		'labels': [3, 4, 2, 0, 2, 6],
-		# 'type':
+		'type': 'numeric'
 	},
 	'urine_output': {
 		'bins': [-1, 671.09, 1427, 2544.14, 6896.8, 20000],
-		'labels': [10, 5, 1, 0, 8]
-		# 'type':
+		'labels': [10, 5, 1, 0, 8],
+		'type': 'numeric'
 	},
 	'ventilated': {
 		'bins': [1],
-		'labels': [9]
-		# 'type':
+		'labels': [9],
+		'type': 'categorical'
 	}
 }
 
 
-# saps2_dict = {
-# 	'admission_type': {
-# 		'bins': ['ELECTIVE', 'EMERGENCY', 'URGENT'],
-# 		'labels': [0, 6, 6],
-# 		'type':
-# 	},
-# 	'age': {
-# 		'bins': [-1, 40.0, 60.0, 70.0, 75.0, 80.0, 200],
-# 		'labels': [0, 7, 12, 15, 16, 18],
-# 		'type':
-# 	},
-# 	'bicarbonate': {
-# 		'bins': [-1, 24, 53, 77, 89, 200],
-# 		'labels': [0, 3, 6, 9, 7],
-# 		'type':
-# 	},
-# 	'bilirubin': {
-# 		'bins': [-1, 4.0, 6.0, 40.0],
-# 		'labels': [0, 4, 9],
-# 		'type':
-# 	},
-# 	'blood_urea_nitrogen': {
-# 		'bins': [-1, 28.0, 84.0, 200.0],
-# 		'labels': [0, 6, 10],
-# 		'type':
-# 	},
-# 	'glasgow_coma_scale_total': {
-# 		'bins': [-1, 5, 8, 10, 13, 15],
-# 		'labels': [26, 13, 7, 5, 0],
-# 		'type':
-# 	},
-# 	'heart_rate': {
-# 		'bins': [-1, 40.0, 70.0, 120.0, 160.0, 300.0],
-# 		'labels': [11, 2, 0, 4, 7],
-# 		'type':
-# 	},
-# 	'icd9': {
-# 		'bins': ,
-# 		'labels': ,
-# 		'type':
-# 	},
-# 	'potassium': {
-# 		'bins': [-1, 3.0, 5.0, 50.0],
-# 		'labels': [3, 0, 3],
-# 		'type':
-# 	},
-# 	'sodium': {
-# 		'bins': [-1, 125.0, 145.0, 300.0],
-# 		'labels': [5, 0, 1],
-# 		'type':
-# 	},
-# 	'systolic_blood_pressure': {
-# 		'bins': [-1, 70.0, 100.0, 200.0, 500.0],
-# 		'labels': [13, 5, 0, 2],
-# 		'type':
-# 	},
-# 	'temperature': {
-# 		'bins': [-1, 39.0, np.inf],
-# 		'labels': [0, 3],
-# 		'type':
-# 	},
-# 	'urine_output': {
-# 		'bins': [-1, 500, 1000, np.inf],
-# 		'labels': [11, 4, 0],
-# 		'type':
-# 	},
-# 	'ventilated': {
-# 		'bins': [-1, 100, 200, np.inf],
-# 		'labels': [11, 9, 6],
-# 		'type':
-# 	},
-# 	'white_blood_cell_count': {
-# 		'bins': [-1, 1.0, 20.0, 200.0],
-# 		'labels': [12, 0, 3],
-# 		'type':
-# 	}
-# }
+saps2_dict = {
+	'admission_type': {
+		'bins': ['ELECTIVE', 'EMERGENCY', 'URGENT'],
+		'labels': [0, 6, 6],
+		'type': 'categorical'
+	},
+	'age': {
+		'bins': [-1, 40.0, 60.0, 70.0, 75.0, 80.0, 200],
+		'labels': [0, 7, 12, 15, 16, 18],
+		'type': 'numeric'
+	},
+	'bicarbonate': {
+		'bins': [-1, 15.0, 20.0, 200.0],
+		'labels': [5, 3, 0],
+		'type': 'numeric'
+	},
+	'bilirubin': {
+		'bins': [-1, 4.0, 6.0, 40.0],
+		'labels': [0, 4, 9],
+		'type': 'numeric'
+	},
+	'blood_urea_nitrogen': {
+		'bins': [-1, 28.0, 84.0, 200.0],
+		'labels': [0, 6, 10],
+		'type': 'numeric'
+	},
+	'glasgow_coma_scale_total': {
+		'bins': [-1, 5, 8, 10, 13, 15],
+		'labels': [26, 13, 7, 5, 0],
+		'type': 'numeric'
+	},
+	'heart_rate': {
+		'bins': [-1, 40.0, 70.0, 120.0, 160.0, 300.0],
+		'labels': [11, 2, 0, 4, 7],
+		'type': 'numeric'
+	},
+	'potassium': {
+		'bins': [-1, 3.0, 5.0, 50.0],
+		'labels': [3, 0, 3],
+		'type': 'numeric'
+	},
+	'sodium': {
+		'bins': [-1, 125.0, 145.0, 300.0],
+		'labels': [5, 0, 1],
+		'type': 'numeric'
+	},
+	'systolic_blood_pressure': {
+		'bins': [-1, 70.0, 100.0, 200.0, 500.0],
+		'labels': [13, 5, 0, 2],
+		'type': 'numeric'
+	},
+	'temperature': {
+		'bins': [-1, 39.0, np.inf],
+		'labels': [0, 3],
+		'type': 'numeric'
+	},
+	'urine_output': {
+		# Total over 24 hours, left-closed i.e. of the form [a, b).
+		'bins': [0, 500, 1000, np.inf],
+		'labels': [11, 4, 0],
+		'type': 'sum',
+		'right': False
+	},
+	'pao2_fio2': {
+		# PaO2/FiO2 (mmHg/%), only recorded while ventilated. Not named
+		# `ventilated`, which is the 0/1 flag of OASIS, so that both scores
+		# can be computed from one window.
+		'bins': [-1, 100, 200, np.inf],
+		'labels': [11, 9, 6],
+		'type': 'numeric'
+	},
+	'white_blood_cell_count': {
+		'bins': [-1, 1.0, 20.0, 200.0],
+		'labels': [12, 0, 3],
+		'type': 'numeric'
+	}
+}
+
+
+# SAPS II chronic diseases, inclusive ICD-9 code string ranges.
+saps2_icd9_dict = {
+	'aids': {
+		'ranges': [('042', '0449')],
+		'points': 17
+	},
+	'hematologic_malignancy': {
+		'ranges': [('20000', '20238'), ('20240', '20248'), ('20250', '20382'),
+				   ('20400', '20522'), ('20580', '20702'), ('20720', '20892'),
+				   ('2386', '2386'), ('2733', '2733')],
+		'points': 10
+	},
+	'metastatic_cancer': {
+		'ranges': [('1960', '1991'), ('20970', '20975'), ('20979', '20979'),
+				   ('78951', '78951')],
+		'points': 9
+	}
+}
 
 
-# apache2_dict = {
-# 	'label1': {
-# 		'bins': [],
-# 		'labels': [],
-# 		'type':
-# 	}
-# }
+# APACHE II, intervals are left-closed, i.e. of the form [a, b).
+apache2_dict = {
+	'age': {
+		'bins': [-np.inf, 45, 55, 65, 75, np.inf],
+		'labels': [0, 2, 3, 5, 6],
+		'type': 'numeric',
+		'right': False
+	},
+	'aado2': {
+		# A-aDO2 (mmHg), used when FiO2 >= 0.5.
+		'bins': [-np.inf, 200, 350, 500, np.inf],
+		'labels': [0, 2, 3, 4],
+		'type': 'numeric',
+		'right': False
+	},
+	'chronic_health': {
+		# Elective (RO), emergency (EO) or no (NO) operation, with or
+		# without severe chronic disease (SCD/NSCD).
+		'bins': ['RO NSCD', 'RO SCD', 'EO NSCD', 'EO SCD',
+				 'NO NSCD', 'NO SCD'],
+		'labels': [0, 2, 0, 5, 0, 5],
+		'type': 'categorical'
+	},
+	'creatinine': {
+		# mg/dL, points doubled for acute kidney injury.
+		'bins': [-np.inf, 0.6, 1.5, 2.0, 3.5, np.inf],
+		'labels': [2, 0, 2, 3, 4],
+		'type': 'numeric',
+		'right': False
+	},
+	'glasgow_coma_scale_total': {
+		# 15 - GCS
+		'bins': [3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16],
+		'labels': [12, 11, 10, 9, 8, 7, 6, 5, 4, 3, 2, 1, 0],
+		'type': 'numeric',
+		'right': False
+	},
+	'heart_rate': {
+		'bins': [-np.inf, 40, 55, 70, 110, 140, 180, np.inf],
+		'labels': [4, 3, 2, 0, 2, 3, 4],
+		'type': 'numeric',
+		'right': False
+	},
+	'hematocrit': {
+		'bins': [-np.inf, 20, 30, 46, 50, 60, np.inf],
+		'labels': [4, 2, 0, 1, 2, 4],
+		'type': 'numeric',
+		'right': False
+	},
+	'mean_blood_pressure': {
+		'bins': [-np.inf, 50, 70, 110, 130, 160, np.inf],
+		'labels': [4, 2, 0, 2, 3, 4],
+		'type': 'numeric',
+		'right': False
+	},
+	'pao2': {
+		# PaO2 (mmHg), used when FiO2 < 0.5.
+		'bins': [-np.inf, 55, 61, 71, np.inf],
+		'labels': [4, 3, 1, 0],
+		'type': 'numeric',
+		'right': False
+	},
+	'ph': {
+		'bins': [-np.inf, 7.15, 7.25, 7.33, 7.5, 7.6, 7.7, np.inf],
+		'labels': [4, 3, 2, 0, 1, 3, 4],
+		'type': 'numeric',
+		'right': False
+	},
+	'potassium': {
+		'bins': [-np.inf, 2.5, 3.0, 3.5, 5.5, 6.0, 7.0, np.inf],
+		'labels': [4, 2, 1, 0, 1, 3, 4],
+		'type': 'numeric',
+		'right': False
+	},
+	'respiratory_rate': {
+		'bins': [-np.inf, 6, 10, 12, 25, 35, 50, np.inf],
+		'labels': [4, 2, 1, 0, 1, 3, 4],
+		'type': 'numeric',
+		'right': False
+	},
+	'sodium': {
+		'bins': [-np.inf, 111, 120, 130, 150, 155, 160, 180, np.inf],
+		'labels': [4, 3, 2, 0, 1, 2, 3, 4],
+		'type': 'numeric',
+		'right': False
+	},
+	'temperature': {
+		'bins': [-np.inf, 30, 32, 34, 36, 38.5, 39, 41, np.inf],
+		'labels': [4, 3, 2, 1, 0, 1, 3, 4],
+		'type': 'numeric',
+		'right': False
+	},
+	'white_blood_cell_count': {
+		'bins': [-np.inf, 1, 3, 15, 20, 40, np.inf],
+		'labels': [4, 2, 0, 1, 2, 4],
+		'type': 'numeric',
+		'right': False
+	}
+}
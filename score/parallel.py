@@ -0,0 +1,190 @@
+"""
+Parallel module
+
+Process-pool map over patient files in chunks, keeping input order and
+recording per-item failures instead of aborting the run. Within a chunk,
+files can be prefetched on a thread pool so that reading the next files
+overlaps with scoring the current one.
+"""
+import os, sys
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import repeat
+
+from score.profiling import PROFILER
+
+
+def chunk(items, chunksize):
+    """Split `items` into consecutive lists of at most `chunksize`."""
+    return [items[i:i + chunksize] for i in range(0, len(items), chunksize)]
+
+
+def error_message(e):
+    return '%s: %s' % (type(e).__name__, e)
+
+
+def apply_chunk(func, items, load=None, prefetch=0, max_bytes=None):
+    """Apply `func` to each item, or to `load(item)` if `load` is given,
+    returning (result, error) pairs. See `prefetch_map` for `prefetch` and
+    `max_bytes`."""
+    if load is not None and prefetch > 0:
+        return prefetch_map(load, func, items, prefetch, max_bytes)
+
+    results = []
+    for item in items:
+        try:
+            data = item if load is None else load(item)
+            results.append((func(data), None))
+        except Exception as e:
+            results.append((None, error_message(e)))
+
+    return results
+
+
+def profile_chunk(func, items, load=None, prefetch=0, max_bytes=None,
+                  memory=True):
+    """`apply_chunk` with profiling, also returning the profiler records."""
+    PROFILER.reset()
+    PROFILER.enable(memory)
+    try:
+        return apply_chunk(func, items, load, prefetch, max_bytes), \
+            PROFILER.records()
+    finally:
+        PROFILER.disable()
+
+
+def prefetch_map(load, func, items, depth=4, max_bytes=None,
+                 size=os.path.getsize):
+    """Apply `func` to `load(item)` for each item, loading up to `depth`
+    items ahead on a thread pool.
+
+    Loading (reading and parsing files) runs on `depth` threads while this
+    thread applies `func`, so throughput approaches the slower of the two
+    instead of their sum.
+
+    Parameters
+    ----------
+    load: callable
+        Function of one item, e.g. reading a file. Runs on a worker thread.
+    func: callable
+        Function of a loaded item, e.g. scoring it. Runs on this thread.
+    items: list
+        Items to map over, e.g. file paths.
+    depth: int
+        Maximum number of items loading or loaded ahead of `func`.
+    max_bytes: int, optional
+        Cap on the summed `size` of the items loading or loaded ahead. One
+        item is always loaded, however large.
+    size: callable
+        Size of an item in bytes, by default of the file at the path.
+
+    Returns
+    -------
+    list
+        (result, error) pairs in the order of `items`.
+    """
+    items = iter(items)
+    pending = deque()
+    in_flight, held = 0, None
+    results = []
+
+    with ThreadPoolExecutor(max_workers=depth) as pool:
+        while True:
+            while len(pending) < depth:
+                if held is None:
+                    item = next(items, pending)
+                    if item is pending:
+                        break
+                    try:
+                        held = item, size(item)
+                    except OSError:
+                        held = item, 0
+                item, nbytes = held
+                if max_bytes is not None and pending \
+                        and in_flight + nbytes > max_bytes:
+                    break
+                pending.append((pool.submit(load, item), nbytes))
+                in_flight += nbytes
+                held = None
+
+            if not pending:
+                return results
+
+            future, nbytes = pending.popleft()
+            try:
+                results.append((func(future.result()), None))
+            except Exception as e:
+                results.append((None, error_message(e)))
+            in_flight -= nbytes
+
+
+def parallel_map(func, items, workers=1, chunksize=None, load=None,
+                 prefetch=0, max_bytes=None):
+    """Map `func` over `items` on a process pool.
+
+    Parameters
+    ----------
+    func: callable
+        Picklable function of one item, or of a loaded item if `load` is
+        given.
+    items: list
+        Items to map over, e.g. sorted file paths.
+    workers: int
+        Number of worker processes, 1 runs serially in this process.
+    chunksize: int
+        Items per task, by default four tasks per worker.
+    load: callable, optional
+        Picklable function loading an item, e.g. reading a file.
+    prefetch: int
+        Items each process loads ahead on a thread pool while `func` runs,
+        0 to load and apply `func` in turn. See `prefetch_map`.
+    max_bytes: int, optional
+        Cap on the file bytes each process prefetches.
+
+    Returns
+    -------
+    list
+        (result, error) pairs in the order of `items`, where `error` is None
+        on success and the exception message otherwise.
+
+    Notes
+    -----
+    When `score.profiling.PROFILER` is enabled, stages profiled in worker
+    processes are added to it.
+    """
+    items = list(items)
+    if workers is None or workers < 1:
+        workers = os.cpu_count()
+    if chunksize is None:
+        chunksize = max(1, -(-len(items) // (4 * workers)))
+    args = repeat(load), repeat(prefetch), repeat(max_bytes)
+
+    if workers == 1:
+        # One chunk, so that prefetching does not stall between chunks.
+        return apply_chunk(func, items, load, prefetch, max_bytes)
+
+    chunks = chunk(items, chunksize)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        if not PROFILER.enabled:
+            results = pool.map(apply_chunk, repeat(func), chunks, *args)
+            return [pair for pairs in results for pair in pairs]
+
+        # Worker profiles are merged into this process' profiler.
+        results = []
+        for pairs, records in pool.map(profile_chunk, repeat(func), chunks,
+                                       *args, repeat(PROFILER.memory)):
+            PROFILER.merge(records)
+            results.extend(pairs)
+        return results
+
+
+def report_failures(items, results, file=sys.stderr):
+    """Print each failed item with its error, returning the failure count."""
+    failures = 0
+    for item, (_, error) in zip(items, results):
+        if error is not None:
+            print('Failed to score %s: %s' % (item, error), file=file)
+            failures += 1
+
+    return failures
@@ -0,0 +1,150 @@
+"""
+Profiling module
+
+Wall time and peak allocated memory (`tracemalloc`) per scoring stage and
+per patient file. Profiling is off by default, in which case `stage` hands
+back a shared no-op context manager and costs a single function call.
+"""
+import contextlib, heapq, json, threading, time, tracemalloc
+
+
+_NULL = contextlib.nullcontext()
+
+
+class Profiler(object):
+    """Accumulates stage timings and memory peaks.
+
+    Stages nest: the file being scored is given to the outermost stage and
+    inherited by the stages inside it, and a stage's memory peak includes
+    the peaks of the stages it contains. Stages nest per thread, but
+    `tracemalloc` peaks are process wide, so peaks of stages running on
+    several threads at once include each other's allocations.
+    """
+    def __init__(self):
+        super(Profiler, self).__init__()
+        self.enabled = False
+        self.memory = False
+        self.reset()
+
+    def reset(self):
+        """Forget all records."""
+        self.stages = {}
+        self.files = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    @property
+    def _stack(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def enable(self, memory=True):
+        """Start recording, with `tracemalloc` memory peaks if `memory`."""
+        self.enabled = True
+        self.memory = memory
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def disable(self):
+        """Stop recording, keeping the records."""
+        self.enabled = False
+        if self.memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    @contextlib.contextmanager
+    def stage(self, name, item=None):
+        """Record the time and memory peak of the enclosed block."""
+        if self._stack:
+            parent = self._stack[-1]
+            item = parent['item'] if item is None else item
+            if self.memory:
+                parent['peak'] = max(parent['peak'],
+                                     tracemalloc.get_traced_memory()[1])
+        frame = {'item': item, 'owner': item is not None and not any(
+            f['item'] == item for f in self._stack), 'peak': 0, 'start': 0}
+        if self.memory:
+            tracemalloc.reset_peak()
+            frame['start'] = tracemalloc.get_traced_memory()[0]
+        self._stack.append(frame)
+
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - t0
+            self._stack.pop()
+            if self.memory:
+                frame['peak'] = max(frame['peak'],
+                                    tracemalloc.get_traced_memory()[1])
+                if self._stack:
+                    self._stack[-1]['peak'] = max(self._stack[-1]['peak'],
+                                                  frame['peak'])
+            peak = max(frame['peak'] - frame['start'], 0)
+            self._add(name, item, frame['owner'], seconds, peak)
+
+    def _add(self, name, item, owner, seconds, peak):
+        with self._lock:
+            self._record(name, item, owner, seconds, peak)
+
+    def _record(self, name, item, owner, seconds, peak):
+        record = self.stages.setdefault(
+            name, {'calls': 0, 'seconds': 0., 'peak_bytes': 0})
+        record['calls'] += 1
+        record['seconds'] += seconds
+        record['peak_bytes'] = max(record['peak_bytes'], peak)
+
+        if item is not None:
+            record = self.files.setdefault(
+                item, {'seconds': 0., 'peak_bytes': 0, 'stages': {}})
+            if owner:
+                record['seconds'] += seconds
+            record['peak_bytes'] = max(record['peak_bytes'], peak)
+            record['stages'][name] = record['stages'].get(name, 0.) + seconds
+
+    def records(self):
+        """Picklable records, e.g. to send back from a worker process."""
+        return {'stages': self.stages, 'files': self.files}
+
+    def merge(self, records):
+        """Add records from another profiler, e.g. a worker process."""
+        for name, other in records['stages'].items():
+            record = self.stages.setdefault(
+                name, {'calls': 0, 'seconds': 0., 'peak_bytes': 0})
+            record['calls'] += other['calls']
+            record['seconds'] += other['seconds']
+            record['peak_bytes'] = max(record['peak_bytes'],
+                                       other['peak_bytes'])
+        self.files.update(records['files'])
+
+    def report(self, top_k=10):
+        """Stage totals, per file records and the `top_k` slowest files."""
+        slowest = heapq.nlargest(top_k, self.files.items(),
+                                 key=lambda kv: kv[1]['seconds'])
+        return {
+            'stages': self.stages,
+            'slowest': [dict(file=file, **record) for file, record in slowest],
+            'files': self.files
+        }
+
+    def save(self, path, top_k=10):
+        """Write `report` as JSON."""
+        with open(path, 'w') as f:
+            json.dump(self.report(top_k), f, indent=2)
+
+
+PROFILER = Profiler()
+
+
+def stage(name, item=None):
+    """Profile the enclosed block as stage `name` of file `item`, if enabled.
+
+    Examples
+    --------
+    >>> with stage('read', path):
+    ...     df = pd.read_csv(path)
+    """
+    if not PROFILER.enabled:
+        return _NULL
+
+    return PROFILER.stage(name, item)
@@ -0,0 +1,114 @@
+"""
+Risk table module
+
+Scores are small integers, so the risk of every possible score is computed
+once per coefficient set and looked up afterwards. Tables of recently used
+coefficient sets are kept in an LRU cache, and the risks of a cohort under
+many coefficient sets (e.g. the bootstrap rows of
+`score.tune_scores.recalibrate`) are one fancy index into a
+(sets x scores) matrix.
+"""
+import numpy as np
+
+from collections import OrderedDict
+
+from score.compiled import SPECS
+from score.scores.oasis import oasis_risk
+from score.scores.saps2 import SAPS2_ICD9, saps2_risk
+
+
+# Risk function of each score with a published risk model.
+RISKS = {
+    'oasis': oasis_risk,
+    'saps2': saps2_risk
+}
+
+# Published coefficients, (b0, b1) for OASIS and (b0, b1, b2) for SAPS II.
+PUBLISHED = {
+    'oasis': (-6.1746, 0.12750),
+    'saps2': (-7.7631, 0.0737, 0.9971)
+}
+
+
+def max_score(score_name):
+    """Highest score the tables of `score_name` can give."""
+    top = sum(compiled.labels.max()
+              for compiled in SPECS[score_name].variables.values())
+    if score_name == 'saps2':
+        top += SAPS2_ICD9.points.max()
+
+    return int(top)
+
+
+class RiskTables(object):
+    """Risk of every score from 0 to `max_score`, per coefficient set.
+
+    Parameters
+    ----------
+    maxsize: int
+        Coefficient sets kept, least recently used first evicted.
+
+    Notes
+    -----
+    Scores that are not integers in the table (NaN, fractions, out of
+    range) fall back to the risk function of `RISKS`.
+    """
+    def __init__(self, maxsize=1024):
+        super(RiskTables, self).__init__()
+        self.maxsize = maxsize
+        self.cache = OrderedDict()
+
+    def tables(self, score_name, coefficients):
+        """(sets x scores) risks of each row of `coefficients`, computing
+        the rows not cached in one call."""
+        coefficients = np.atleast_2d(np.asarray(coefficients, dtype=float))
+        keys = [(score_name, tuple(row)) for row in coefficients.tolist()]
+        new = [i for i, key in enumerate(keys) if key not in self.cache]
+        if new:
+            scores = np.arange(max_score(score_name) + 1)
+            b = coefficients[new].T[:, :, None]
+            risks = RISKS[score_name](scores, *b)
+            for i, table in zip(new, risks):
+                self.cache[keys[i]] = table
+
+        for key in keys:
+            self.cache.move_to_end(key)
+        tables = np.stack([self.cache[key] for key in keys])
+        while len(self.cache) > self.maxsize:
+            self.cache.popitem(last=False)
+
+        return tables
+
+    def table(self, score_name, *coefficients):
+        """Risks of one coefficient set, the published one if none given."""
+        if not coefficients:
+            coefficients = PUBLISHED[score_name]
+
+        return self.tables(score_name, [coefficients])[0]
+
+    def risk(self, score_name, score, *coefficients):
+        """Risk of each score, like `RISKS[score_name]`."""
+        if not coefficients:
+            coefficients = PUBLISHED[score_name]
+
+        return self.risks(score_name, score, [coefficients])[0]
+
+    def risks(self, score_name, score, coefficients):
+        """(sets x patients) risks of each score under each row of
+        `coefficients`, e.g. the `b` columns of a bootstrap."""
+        tables = self.tables(score_name, coefficients)
+        score = np.asarray(score)
+        flat = score.reshape(-1)
+        exact = (flat >= 0) & (flat < tables.shape[1])
+        if flat.dtype.kind == 'f':
+            exact &= flat == np.floor(flat)
+        risks = tables[:, np.where(exact, flat, 0).astype(np.intp)]
+        if not exact.all():
+            b = np.atleast_2d(np.asarray(coefficients, dtype=float)).T
+            risks[:, ~exact] = RISKS[score_name](
+                flat[~exact].astype(float), *b[:, :, None])
+
+        return risks.reshape(tables.shape[:1] + score.shape)
+
+
+RISK_TABLES = RiskTables()
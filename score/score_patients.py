@@ -1,50 +1,310 @@
-import argparse, numpy as np, os, pandas as pd
+import argparse, numpy as np, os, sys
 
-from oasis import *
-from saps2 import *
+from functools import partial
 
+from score.batch import score_window, stay_window, time_column
+from score.manifest import Manifest, spec_version
+from score.parallel import parallel_map, report_failures
+from score.profiling import PROFILER, stage
+from score.risk import RISKS, RISK_TABLES
+from score.shard import merge_shards, parse_shard, shard_files, shard_name, \
+    write_manifest
+from score.sink import PartitionedSink, ResultSink
+from score.utils import read, read_columns, rename_variables, \
+    score_columns
 
-def score_patients(score_name, root, partition, out_dir='scores'):
-    """Score a directory of patient timeseries."""
-    score_dict = eval(score_name+'_score')
 
-    ts_files = sorted([f for f in root if f != 'listfile.csv'])
-    scores = np.zeros(len(ts_files))
+def read_window(path, score_names, hours=24, pandas=True):
+    """Scored rows of one patient timeseries, keyed by score variable.
 
-    for i, ts_file in enumerate(ts_files):
-        ts = pd.read_csv(os.path.join(root, ts_file), dtype={'icd9': str})
+    Only the columns the scores use are parsed, as float32, and parsing
+    stops at the first row past the `hours` window. The file is parsed by
+    `score.utils.read`, or by `read_columns` if not `pandas`, which scores
+    without importing pandas (see `main.py`).
 
-        if ts['Hours'].min() > 24:
-            # No info before 24 hours
-            score, risk = 0, 0
+    Returns
+    -------
+    dict
+        Column arrays of the window rows, empty if the file has no rows
+        before `hours`.
+    """
+    columns = set().union(*(score_columns(name) for name in score_names))
+    if pandas:
+        ts = read(path, columns=columns, hours=hours, dtype=np.float32)
+        ts = {col: ts[col].to_numpy() for col in ts.columns}
+    else:
+        ts = read_columns(path, columns=columns, hours=hours)
+    if not len(ts[time_column(ts)]):
+        # No info before 24 hours
+        return {}
+    ts = rename_variables(ts)
+    with stage('window'):
+        window = stay_window(ts[time_column(ts)], hours)
+
+        return {col: values[window] for col, values in ts.items()}
+
+
+def score_file(score_name, path):
+    """Score one patient timeseries over its first 24 hours.
+
+    `score_name` may be a list of score names, which are computed from one
+    read and one window (see `read_window`) and returned as a list.
+    """
+    score_names = [score_name] if isinstance(score_name, str) else score_name
+
+    with stage('file', path):
+        scores = score_window(read_window(path, score_names), score_names)
+
+    return scores[0] if isinstance(score_name, str) else scores
+
+
+def load_file(score_names, path):
+    """`read_window` of one file, profiled as that file, with its path."""
+    with stage('file', path):
+        return path, read_window(path, score_names)
+
+
+def score_loaded(score_names, loaded):
+    """`score_window` of a file from `load_file`, profiled as that file."""
+    path, window = loaded
+    with stage('file', path):
+        return score_window(window, score_names)
+
+
+def write_scores(out_dir, prefix, stays, scores, score_names,
+                 format='csv', batch_rows=65536):
+    """Write a `{prefix}_scores` table, a `stay` column and an int16 column
+    per score name, `batch_rows` rows at a time (see `score.sink`).
+
+    Returns
+    -------
+    tuple
+        Path and schema of the table.
+    """
+    path = os.path.join(out_dir, f'{prefix}_scores')
+    if format == 'csv':
+        path += '.csv'
+    schema = dict(stay='category', **dict.fromkeys(score_names, 'int16'))
+    with ResultSink(path, schema, format) as sink:
+        for start in range(0, len(stays), batch_rows):
+            rows = slice(start, start + batch_rows)
+            batch = dict(zip(score_names, scores[rows].T))
+            sink.write(dict(batch, stay=stays[rows]))
+
+    return path, schema
+
+
+def write_partitioned(out_dir, partition, stays, scores, score_names,
+                      format='csv', batch_rows=65536):
+    """Write one `stay`, `score` (int16) and `risk` (float32) table per
+    score under `{out_dir}/results/score={name}/partition={partition}`."""
+    schema = {'stay': 'category', 'score': 'int16', 'risk': 'float32'}
+    with PartitionedSink(os.path.join(out_dir, 'results'), schema,
+                         format) as sink:
+        for j, name in enumerate(score_names):
+            for start in range(0, len(stays), batch_rows):
+                rows = slice(start, start + batch_rows)
+                score = scores[rows, j]
+                risk = RISK_TABLES.risk(name, score) if name in RISKS \
+                    else np.full(len(score), np.nan)
+                sink.write({'stay': stays[rows], 'score': score,
+                            'risk': risk}, score=name, partition=partition)
+
+
+def score_patients(score_name, root, partition, out_dir='scores', workers=1,
+                   chunksize=None, incremental=False, check='mtime',
+                   prefetch=0, max_bytes=None, format='csv',
+                   partitioned=False, shard=None):
+    """Score a directory of patient timeseries.
+
+    Files are scored in sorted order, on a pool of `workers` processes if
+    more than one. Files that fail to score are reported and given a NaN
+    score.
+
+    A list of score names is scored in a single pass over the files (see
+    `score_file`) into one `{partition}_{name}_{name}..._scores.csv` table
+    with a column per score.
+
+    If `incremental`, only files that are new or changed since the last run
+    (see `score.manifest.file_key` for `check`) are scored, and the others
+    keep the scores recorded in the partition's manifest.
+
+    If `prefetch` is positive, each process reads up to `prefetch` files
+    (and at most `max_bytes` of them) ahead on a thread pool while it scores,
+    see `score.parallel.prefetch_map`. Reading and scoring a file are then
+    profiled in two `file` stages, on different threads, which add up to
+    the same per-file record as without prefetching.
+
+    Scores are written as `format`, `csv` or `columns` (see
+    `score.sink.ResultSink`), with an empty cell or `MISSING` where a file
+    failed. If `partitioned`, they are written by `write_partitioned`
+    instead, with the risk of each score.
+
+    If `shard`, `(i, N)`, only the files of shard `i` of `N` are scored
+    (see `score.shard.shard_of`), into a shard table and manifest under
+    `{out_dir}/{partition}_{name}..._shards`. The output above is written
+    by `merge_scores` once all `N` shards are done.
+    """
+    score_names = [score_name] if isinstance(score_name, str) else score_name
+    prefix = '_'.join([partition] + list(score_names))
+    cohort = sorted([f for f in os.listdir(root) if f != 'listfile.csv'])
+    ts_files = shard_files(cohort, shard)
+    paths = [os.path.join(root, f) for f in ts_files]
+    manifest_path = os.path.join(out_dir, f'{prefix}_manifest.json')
+    if shard is not None:
+        shard_dir = os.path.join(out_dir, f'{prefix}_shards')
+        if not os.path.exists(shard_dir):
+            os.makedirs(shard_dir)
+        manifest_path = os.path.join(shard_dir,
+                                     f'{shard_name(shard)}_manifest.json')
+
+    if incremental:
+        manifest = Manifest(manifest_path, score_names, check)
+        keys = [manifest.key(path) for path in paths]
+        cached = [manifest.lookup(path, key)
+                  for path, key in zip(paths, keys)]
+    else:
+        cached = [None] * len(paths)
+    todo = [i for i, scores in enumerate(cached) if scores is None]
+
+    if prefetch > 0:
+        results = parallel_map(partial(score_loaded, score_names),
+                               [paths[i] for i in todo], workers=workers,
+                               chunksize=chunksize,
+                               load=partial(load_file, score_names),
+                               prefetch=prefetch, max_bytes=max_bytes)
+    else:
+        results = parallel_map(partial(score_file, score_names),
+                               [paths[i] for i in todo],
+                               workers=workers, chunksize=chunksize)
+    report_failures([paths[i] for i in todo], results)
+    for i, (scores, _) in zip(todo, results):
+        cached[i] = [np.nan] * len(score_names) if scores is None \
+            else [np.asarray(score).item() for score in scores]
+    scores = np.array(cached).reshape(len(paths), len(score_names))
+
+    columns = ['score'] if isinstance(score_name, str) else score_names
+    with stage('write'):
+        if shard is not None:
+            path, schema = write_scores(shard_dir, shard_name(shard),
+                                        ts_files, scores, columns, format)
+            header = {'scores': list(score_names),
+                      'spec': [spec_version(name) for name in score_names],
+                      'format': format, 'partitioned': partitioned}
+            write_manifest(shard_dir, shard, path, 'stay', schema, header,
+                           cohort, ts_files)
+        elif partitioned:
+            write_partitioned(out_dir, partition, ts_files, scores,
+                              score_names, format)
         else:
-            if ts.loc[(0 < ts['Hours']) & (ts['Hours'] < 24)].shape[0] == 0:
-                # No info after admission
-                ts = ts.loc[ts['Hours'] < 0].iloc[-1, :]
-            else:
-                ts = ts.loc[(0 < ts['Hours']) & (ts['Hours'] < 24)]
+            write_scores(out_dir, prefix, ts_files, scores, columns, format)
 
-            scores[i] = score_func(ts)
+    if incremental:
+        manifest.update(paths, keys, cached)
+        manifest.save()
 
-    score_arr = np.stack((np.array(ts_files), scores), axis=1)
-    score_df = pd.DataFrame(score_arr, columns=['stay', 'score'])
-    score_df.to_csv(
-        os.path.join(out_dir, f'{partition}_{score_name}_scores.csv'),
-        index=None)
 
+def merge_scores(score_name, partition, out_dir='scores'):
+    """Write the output of a sharded `score_patients` run from its shards,
+    in the format its shards were asked for, after checking that they are
+    complete and do not overlap (see `score.shard.merge_shards`)."""
+    score_names = [score_name] if isinstance(score_name, str) else score_name
+    prefix = '_'.join([partition] + list(score_names))
+    fields, merged = merge_shards(os.path.join(out_dir, f'{prefix}_shards'))
+    header = fields['header']
+    spec = [spec_version(name) for name in score_names]
+    if header['spec'] != spec:
+        raise ValueError(f'Shards were scored with tables {header["spec"]}, '
+                         f'the current tables are {spec}.')
 
-if __name__ == '__main__':
-    parser = argparse.ArgumentParser(description='Score ICU patients.')
-    parser.add_argument('score_name', type=str,
-                        help='ICU severity score name')
+    columns = [col for col in fields['schema'] if col != 'stay']
+    stays = merged['stay']
+    scores = np.column_stack([merged[col] for col in columns]) \
+        if columns else np.zeros((len(stays), 0))
+    with stage('write'):
+        if header['partitioned']:
+            write_partitioned(out_dir, partition, stays, scores, score_names,
+                              header['format'])
+        else:
+            write_scores(out_dir, prefix, stays, scores, columns,
+                         header['format'])
+
+
+def parse_merge(args_to_parse):
+    parser = argparse.ArgumentParser(
+        prog='score_patients merge',
+        description='Merge the shards of a sharded score_patients run.')
+    parser.add_argument('score_name', type=str, nargs='+',
+                        help='ICU severity score names, as scored')
+    parser.add_argument('--out', type=str, default='scores',
+                        help='output directory of the shards')
+    parser.add_argument('--partitions', type=str, nargs='+',
+                        default=['test', 'train'],
+                        help='partitions to merge')
+
+    return parser.parse_args(args_to_parse)
+
+
+if __name__ == '__main__' and sys.argv[1:2] == ['merge']:
+    args = parse_merge(sys.argv[2:])
+    score_name = args.score_name[0] if len(args.score_name) == 1 \
+        else args.score_name
+    for partition in args.partitions:
+        merge_scores(score_name, partition, args.out)
+
+elif __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Score ICU patients. Run `merge` with the same score '
+                    'names and --out to merge the outputs of --shard runs.')
+    parser.add_argument('score_name', type=str, nargs='+',
+                        help='ICU severity score names, scored in one pass')
     parser.add_argument('data', type=str,
                         help='path to patient directory')
     parser.add_argument('--out', type=str, default='scores',
                         help='output directory')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of worker processes, 0 for all cores')
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help='files per worker task')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only score files changed since the last run')
+    parser.add_argument('--check', type=str, default='mtime',
+                        choices=['mtime', 'hash'],
+                        help='how --incremental detects changed files')
+    parser.add_argument('--prefetch', type=int, default=0,
+                        help='files read ahead per process while scoring')
+    parser.add_argument('--max-prefetch-mb', type=float, default=None,
+                        help='cap on the file megabytes read ahead per '
+                             'process')
+    parser.add_argument('--profile', type=str, default=None,
+                        help='path to a JSON report of stage timings and '
+                             'memory peaks')
+    parser.add_argument('--format', type=str, default='csv',
+                        choices=['csv', 'columns'],
+                        help='output format, see score.sink')
+    parser.add_argument('--partitioned', action='store_true',
+                        help='write a stay, score and risk table per score '
+                             'and partition')
+    parser.add_argument('--shard', type=parse_shard, default=None,
+                        help='score only shard i of N, given as i/N, for '
+                             'a later `merge`')
     args = parser.parse_args()
 
     if not os.path.exists(args.out):
         os.makedirs(args.out)
+    if args.profile is not None:
+        PROFILER.enable()
+
+    score_name = args.score_name[0] if len(args.score_name) == 1 \
+        else args.score_name
+    max_bytes = None if args.max_prefetch_mb is None \
+        else int(args.max_prefetch_mb * 2 ** 20)
+    for partition in ['test', 'train']:
+        score_patients(score_name, os.path.join(args.data, partition),
+                       partition, args.out, args.workers, args.chunksize,
+                       args.incremental, args.check, args.prefetch,
+                       max_bytes, args.format, args.partitioned, args.shard)
 
-    score_patients(args.score_name, args.data, 'test')
-    score_patients(args.score_name, args.data, 'train')
+    if args.profile is not None:
+        PROFILER.disable()
+        PROFILER.save(args.profile)
@@ -0,0 +1,298 @@
+"""
+Scoring service module
+
+Resident HTTP scoring service, on localhost or a Unix socket, that keeps the
+compiled score tables loaded between patients. Requests arriving within a
+few milliseconds of each other are scored together in one grouped call.
+
+    python -m score.service --port 8000
+    curl -H 'Content-Type: text/psv' --data-binary @tests/example-a.psv
+        'localhost:8000/score?scores=oasis,saps2'
+    curl localhost:8000/stats
+
+Endpoints:
+    POST /score  one patient's timeseries as CSV/PSV (`Content-Type` text/csv
+                 or text/psv) or JSON (a list of rows, or {"rows": [...]} or
+                 {"columns": {...}}), scores from `?scores=` or a JSON
+                 "scores" key. Returns {"scores": {...}, "risks": {...}}.
+    GET /stats   request count, requests per second and p50/p99 latency.
+"""
+import argparse, io, json, numpy as np, os, pandas as pd, queue, socket, \
+    socketserver, threading, time
+
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from score.batch import score_cohort
+from score.compiled import SPECS
+from score.risk import RISKS
+from score.utils import rename_variables, score_columns
+
+
+class Request(object):
+    """One patient waiting to be scored by a `MicroBatcher`."""
+    def __init__(self, frame, score_names):
+        super(Request, self).__init__()
+        self.frame = frame
+        self.score_names = score_names
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher(object):
+    """Collects concurrent requests and scores them as one cohort.
+
+    Parameters
+    ----------
+    max_wait: float
+        Seconds to wait for more requests after the first of a batch.
+    max_batch: int
+        Maximum patients per batch.
+    hours: float
+        Length of the admission window.
+    """
+    def __init__(self, max_wait=0.002, max_batch=256, hours=24):
+        super(MicroBatcher, self).__init__()
+        self.max_wait = max_wait
+        self.max_batch = max_batch
+        self.hours = hours
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, frame, score_names):
+        """Score one patient's timeseries, blocking until its batch is done.
+
+        Returns
+        -------
+        dict
+            Score per score name.
+        """
+        request = Request(frame, score_names)
+        self.queue.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise ValueError(request.error)
+
+        return request.result
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.perf_counter()
+                try:
+                    batch.append(self.queue.get(timeout=max(timeout, 0)))
+                except queue.Empty:
+                    break
+            self._score(batch)
+
+    def _score(self, batch):
+        try:
+            results = self._score_cohort(batch)
+        except Exception:
+            # Score one by one so a bad payload only fails its own request.
+            results = []
+            for request in batch:
+                try:
+                    results.append(self._score_cohort([request])[0])
+                except Exception as e:
+                    request.error = '%s: %s' % (type(e).__name__, e)
+                    results.append(None)
+        for request, result in zip(batch, results):
+            request.result = result
+            request.done.set()
+
+    def _score_cohort(self, batch):
+        df = pd.concat([request.frame.assign(stay=i)
+                        for i, request in enumerate(batch)],
+                       ignore_index=True)
+        names = sorted(set().union(*(request.score_names
+                                     for request in batch)))
+        scores = {name: score_cohort(df, name, 'stay', 'Hours', self.hours)
+                  for name in names}
+
+        return [{name: int(scores[name].get(i, 0))
+                 for name in request.score_names}
+                for i, request in enumerate(batch)]
+
+
+class LatencyStats(object):
+    """Request count, rate and latency percentiles of the last `window`
+    requests."""
+    def __init__(self, window=10000):
+        super(LatencyStats, self).__init__()
+        self.latencies = deque(maxlen=window)
+        self.count = 0
+        self.start = time.perf_counter()
+        self.lock = threading.Lock()
+
+    def record(self, seconds):
+        with self.lock:
+            self.latencies.append(seconds)
+            self.count += 1
+
+    def summary(self):
+        with self.lock:
+            latencies = np.array(self.latencies)
+            count = self.count
+        uptime = time.perf_counter() - self.start
+        p50, p99 = np.percentile(latencies, [50, 99]) * 1e3 \
+            if latencies.size else (np.nan, np.nan)
+
+        return {'requests': count, 'uptime_s': uptime,
+                'requests_per_s': count / uptime,
+                'p50_ms': float(p50), 'p99_ms': float(p99)}
+
+
+def parse_payload(body, content_type, query, hours=24):
+    """Patient frame and score names of a request.
+
+    Only the columns of the scores and the rows before `hours` are kept,
+    time is renamed to `Hours` and PhysioNet columns to score variables.
+    """
+    score_names = query.get('scores', [''])[0].split(',') \
+        if 'scores' in query else None
+
+    if 'json' in content_type or body[:1] in (b'{', b'['):
+        payload = json.loads(body)
+        if isinstance(payload, dict):
+            score_names = payload.get('scores', score_names)
+            frame = pd.DataFrame(payload['columns']) if 'columns' in payload \
+                else pd.DataFrame(payload['rows'])
+        else:
+            frame = pd.DataFrame(payload)
+    else:
+        frame = None
+
+    if score_names is None:
+        score_names = ['oasis']
+    unknown = [name for name in score_names if name not in SPECS]
+    if unknown:
+        raise ValueError('Unknown scores %s, expected %s.'
+                         % (unknown, list(SPECS)))
+    columns = set().union(*(score_columns(name) for name in score_names))
+    columns |= {'Hours', 'ICULOS'}
+
+    if frame is None:
+        sep = '|' if 'psv' in content_type else \
+            '\t' if 'tsv' in content_type else ','
+        frame = pd.read_csv(io.BytesIO(body), sep=sep,
+                            usecols=lambda col: col in columns,
+                            dtype={'admission_type': str, 'icd9': str})
+    if 'Hours' not in frame:
+        if 'ICULOS' not in frame:
+            raise ValueError('No time column, expected `Hours` or `ICULOS`.')
+        frame = frame.rename(columns={'ICULOS': 'Hours'})
+    frame = frame.loc[frame['Hours'].to_numpy(dtype=float) < hours,
+                      [col for col in frame.columns if col in columns]]
+
+    return rename_variables(frame), score_names
+
+
+class ScoreHandler(BaseHTTPRequestHandler):
+    """HTTP handler of `/score` and `/stats`, see the module docstring."""
+
+    def do_POST(self):
+        t0 = time.perf_counter()
+        url = urlparse(self.path)
+        if url.path != '/score':
+            return self._send(404, {'error': 'Unknown path %s.' % url.path})
+        try:
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            frame, score_names = parse_payload(
+                body, self.headers.get('Content-Type', ''),
+                parse_qs(url.query), self.server.batcher.hours)
+            scores = self.server.batcher.submit(frame, score_names)
+        except Exception as e:
+            return self._send(400, {'error': '%s: %s' % (type(e).__name__,
+                                                         e)})
+
+        risks = {name: float(RISKS[name](score))
+                 for name, score in scores.items() if name in RISKS}
+        self._send(200, {'scores': scores, 'risks': risks})
+        self.server.stats.record(time.perf_counter() - t0)
+
+    def do_GET(self):
+        if urlparse(self.path).path != '/stats':
+            return self._send(404, {'error': 'Unknown path %s.' % self.path})
+        self._send(200, self.server.stats.summary())
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # Unix socket clients have no address.
+        return str(self.client_address[0]) if self.client_address else '-'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super(ScoreHandler, self).log_message(format, *args)
+
+
+class ScoreServer(ThreadingHTTPServer):
+    """Threaded HTTP server sharing one `MicroBatcher` and `LatencyStats`."""
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address, batcher, verbose=False):
+        self.batcher = batcher
+        self.stats = LatencyStats()
+        self.verbose = verbose
+        super(ScoreServer, self).__init__(address, ScoreHandler)
+
+
+class UnixScoreServer(ScoreServer):
+    """`ScoreServer` listening on a Unix socket path."""
+    address_family = socket.AF_UNIX
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+        socketserver.TCPServer.server_bind(self)
+        self.server_name, self.server_port = 'localhost', 0
+
+
+def serve(port=8000, unix_socket=None, max_wait=0.002, max_batch=256,
+          verbose=False):
+    """Serve scores until interrupted, on `unix_socket` if given and on
+    localhost:`port` otherwise."""
+    batcher = MicroBatcher(max_wait, max_batch)
+    if unix_socket is not None:
+        server = UnixScoreServer(unix_socket, batcher, verbose)
+    else:
+        server = ScoreServer(('127.0.0.1', port), batcher, verbose)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if unix_socket is not None and os.path.exists(unix_socket):
+            os.remove(unix_socket)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve ICU scores.')
+    parser.add_argument('--port', type=int, default=8000,
+                        help='localhost port')
+    parser.add_argument('--socket', type=str, default=None,
+                        help='Unix socket path, instead of a port')
+    parser.add_argument('--max-wait-ms', type=float, default=2.,
+                        help='milliseconds to wait for a batch to fill')
+    parser.add_argument('--max-batch', type=int, default=256,
+                        help='maximum patients per batch')
+    parser.add_argument('--verbose', action='store_true',
+                        help='log every request')
+    args = parser.parse_args()
+
+    serve(args.port, args.socket, args.max_wait_ms / 1e3, args.max_batch,
+          args.verbose)
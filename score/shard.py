@@ -0,0 +1,212 @@
+"""
+Shard module
+
+Splits the scoring of a cohort across processes or machines. Each stay is
+assigned to one of `N` shards by a stable hash of its file name, so the
+assignment does not depend on the machine, the directory listing order or
+the other shards. Shard `i/N` writes its scores to a table (see
+`score.sink.ResultSink`) and a manifest `{i}-of-{N}.json` in a shared shard
+directory:
+
+    shard, shards   `i` and `N`
+    table, schema   file name and schema of the shard's table
+    key             column of stay names, e.g. `stay`
+    header          what the shard scored (scores, table versions, output),
+                    equal across the shards of one run
+    cohort          number and digest of all stay names the shard listed
+    rows, digest    number and digest of the shard's own stay names
+
+`merge_shards` checks that every shard of a run is present, that the shards
+list the same cohort, score exactly their own stays and together cover it,
+and concatenates them in sorted stay order, the order of an unsharded run.
+"""
+import csv, hashlib, json, numpy as np, os, re
+
+from score.sink import MISSING, ResultTable
+
+
+MANIFEST = re.compile(r'^(\d+)-of-(\d+)\.json$')
+
+
+def parse_shard(text):
+    """`(i, N)` from an `i/N` shard argument, with 0 <= i < N."""
+    match = re.match(r'^(\d+)/(\d+)$', text.strip())
+    if match is None:
+        raise ValueError(f'Shard `{text}` is not of the form `i/N`.')
+    index, count = int(match.group(1)), int(match.group(2))
+    if not 0 <= index < count:
+        raise ValueError(f'Shard `{text}` is out of range, expected '
+                         f'0 <= i < N.')
+
+    return index, count
+
+
+def shard_name(shard):
+    return '%d-of-%d' % shard
+
+
+def shard_of(name, count):
+    """Shard of the stay `name` (a file name or path) out of `count`."""
+    digest = hashlib.blake2b(os.path.basename(name).encode(),
+                             digest_size=8).digest()
+
+    return int.from_bytes(digest, 'little') % count
+
+
+def shard_files(names, shard):
+    """Names of `names` assigned to `shard`, `(i, N)`, in their order.
+    All names if `shard` is None."""
+    if shard is None:
+        return list(names)
+    index, count = shard
+
+    return [name for name in names if shard_of(name, count) == index]
+
+
+def names_digest(names):
+    digest = hashlib.blake2b(digest_size=16)
+    for name in names:
+        digest.update(name.encode() + b'\n')
+
+    return digest.hexdigest()
+
+
+def write_manifest(shard_dir, shard, table, key, schema, header, cohort,
+                   names):
+    """Record the table of shard `(i, N)` once it is complete.
+
+    Parameters
+    ----------
+    table: str
+        Path of the shard's table, in `shard_dir`.
+    key: str
+        Column of `table` holding `names`.
+    header: dict
+        What the shard scored, checked to be equal across shards.
+    cohort: list of str
+        All stay names listed, before sharding.
+    names: list of str
+        Stay names of the shard, in table order.
+    """
+    manifest = {'shard': shard[0], 'shards': shard[1],
+                'table': os.path.basename(table), 'key': key,
+                'schema': dict(schema), 'header': header,
+                'cohort': {'rows': len(cohort),
+                           'digest': names_digest(sorted(cohort))},
+                'rows': len(names), 'digest': names_digest(names)}
+    path = os.path.join(shard_dir, shard_name(shard) + '.json')
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f)
+    os.replace(path + '.tmp', path)
+
+
+def read_table(path, schema):
+    """Columns of a shard table, `category` columns as object arrays and
+    numeric columns as float with NaN where missing."""
+    if os.path.isdir(path):
+        table = ResultTable(path)
+        columns = {}
+        for col, dtype in schema.items():
+            values = table[col]
+            if dtype != 'category':
+                values = np.asarray(values, dtype=float)
+                if np.dtype(dtype).kind in 'iu':
+                    values[values == MISSING] = np.nan
+            columns[col] = values
+        return columns
+
+    with open(path, newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        rows = list(reader)
+    if header != list(schema):
+        raise ValueError(f'{path} has columns {header}, expected '
+                         f'{list(schema)}.')
+    columns = {}
+    for j, (col, dtype) in enumerate(schema.items()):
+        cells = [row[j] for row in rows]
+        columns[col] = np.array(cells, dtype=object) if dtype == 'category' \
+            else np.array([float(c) if c else np.nan for c in cells])
+
+    return columns
+
+
+def read_manifests(shard_dir):
+    """Manifests in `shard_dir` by shard index, checking they are all the
+    shards of one run."""
+    files = sorted(os.listdir(shard_dir)) if os.path.isdir(shard_dir) else []
+    manifests = {}
+    for name in filter(MANIFEST.match, files):
+        with open(os.path.join(shard_dir, name)) as f:
+            manifest = json.load(f)
+        manifests[(manifest['shard'], manifest['shards'])] = manifest
+    if not manifests:
+        raise ValueError(f'No shard manifests in {shard_dir}.')
+
+    counts = sorted({count for _, count in manifests})
+    if len(counts) > 1:
+        raise ValueError(f'{shard_dir} has shards of runs split {counts} '
+                         f'ways, remove the stale ones.')
+    count = counts[0]
+    missing = [i for i in range(count) if (i, count) not in manifests]
+    if missing:
+        raise ValueError(f'Shards {missing} of {count} are missing from '
+                         f'{shard_dir}.')
+
+    first = manifests[(0, count)]
+    for (index, _), manifest in sorted(manifests.items()):
+        for field in ['key', 'schema', 'header', 'cohort']:
+            if manifest[field] != first[field]:
+                raise ValueError(
+                    f'Shard {index}/{count} has {field} {manifest[field]}, '
+                    f'shard 0/{count} has {first[field]}.')
+
+    return [manifests[(i, count)] for i in range(count)]
+
+
+def merge_shards(shard_dir):
+    """Validate the shards in `shard_dir` and concatenate their tables.
+
+    Returns
+    -------
+    tuple
+        The shards' common manifest fields (`key`, `schema`, `header`,
+        `cohort`) and a dict of columns (see `read_table`) sorted by stay
+        name.
+    """
+    manifests = read_manifests(shard_dir)
+    count = len(manifests)
+    first = manifests[0]
+    key, schema = first['key'], first['schema']
+
+    tables = []
+    for index, manifest in enumerate(manifests):
+        columns = read_table(os.path.join(shard_dir, manifest['table']),
+                             schema)
+        names = columns[key].tolist()
+        if len(names) != manifest['rows'] or \
+                names_digest(names) != manifest['digest']:
+            raise ValueError(f'Table of shard {index}/{count} does not '
+                             f'match its manifest, score the shard again.')
+        foreign = [name for name in names if shard_of(name, count) != index]
+        if foreign:
+            raise ValueError(f'Shard {index}/{count} has stays of other '
+                             f'shards, e.g. {foreign[0]}.')
+        tables.append(columns)
+
+    merged = {col: np.concatenate([table[col] for table in tables])
+              for col in schema}
+    order = np.argsort(merged[key], kind='stable')
+    merged = {col: values[order] for col, values in merged.items()}
+
+    names = merged[key].tolist()
+    if len(set(names)) != len(names):
+        raise ValueError('Shards overlap, some stays are scored twice.')
+    cohort = first['cohort']
+    if len(names) != cohort['rows'] or \
+            names_digest(names) != cohort['digest']:
+        raise ValueError(f'Shards have {len(names)} of {cohort["rows"]} '
+                         f'stays of the cohort.')
+
+    return {field: first[field] for field in
+            ['key', 'schema', 'header', 'cohort']}, merged
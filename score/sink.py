@@ -0,0 +1,262 @@
+"""
+Result sink module
+
+Typed result tables written batch by batch, so that memory stays flat
+however many rows are written and runs can append to earlier output.
+
+Layout of a `columns` table directory:
+    {column}.bin         raw values of each column in its schema dtype
+    {column}.categories  one category per line, for `category` columns,
+                         whose .bin holds int32 codes into it
+    meta.json            schema and row count, rewritten after every batch
+
+`csv` tables are a single CSV file with a header row. Both formats can be
+partitioned by key, e.g. score and partition, with `PartitionedSink`.
+"""
+import csv, json, numpy as np, os
+
+
+# Stored in integer columns where a batch has NaN, written as an empty cell.
+MISSING = -1
+
+FORMATS = ['columns', 'csv']
+
+
+class ResultSink(object):
+    """Append-only typed table.
+
+    Parameters
+    ----------
+    path: str
+        Table directory for the `columns` format, CSV file for `csv`.
+    schema: dict
+        Column name to NumPy dtype name (e.g. `int16`, `float32`) or
+        `category` for strings.
+    format: str
+        `columns` or `csv`.
+    append: bool
+        Add rows to an existing table with the same schema instead of
+        replacing it.
+    """
+    def __init__(self, path, schema, format='columns', append=False):
+        super(ResultSink, self).__init__()
+        if format not in FORMATS:
+            raise ValueError('Unknown format `%s`, expected one of %s.'
+                             % (format, FORMATS))
+        self.path = path
+        self.schema = dict(schema)
+        self.format = format
+        self.rows = 0
+        self.categories = {col: {} for col, dtype in self.schema.items()
+                           if dtype == 'category'}
+
+        if format == 'csv':
+            exists = append and os.path.exists(path)
+            if exists:
+                with open(path, newline='') as f:
+                    header = next(csv.reader(f), [])
+                if header != list(self.schema):
+                    raise ValueError('%s has columns %s, expected %s.'
+                                     % (path, header, list(self.schema)))
+            _makedirs(os.path.dirname(path))
+            self.file = open(path, 'a' if exists else 'w', newline='')
+            self.writer = csv.writer(self.file, lineterminator='\n')
+            if not exists:
+                self.writer.writerow(list(self.schema))
+            return
+
+        _makedirs(path)
+        meta = os.path.join(path, 'meta.json')
+        if append and os.path.exists(meta):
+            with open(meta) as f:
+                meta = json.load(f)
+            if meta['schema'] != self.schema:
+                raise ValueError('%s has schema %s, expected %s.'
+                                 % (path, meta['schema'], self.schema))
+            self.rows = meta['rows']
+            for col in self.categories:
+                with open(self._file(col, 'categories')) as f:
+                    self.categories[col] = {
+                        line.rstrip('\n'): i for i, line in enumerate(f)}
+        self.files = {}
+        for col in self.schema:
+            # Bytes past the recorded rows are from an interrupted batch.
+            self.files[col] = open(self._file(col, 'bin'),
+                                   'r+b' if self.rows else 'wb')
+            self.files[col].truncate(self.rows * self._dtype(col).itemsize)
+            self.files[col].seek(0, os.SEEK_END)
+        self.category_files = {
+            col: open(self._file(col, 'categories'),
+                      'a' if self.rows else 'w')
+            for col in self.categories}
+        self._save_meta()
+
+    def write(self, batch):
+        """Append a batch of rows.
+
+        Parameters
+        ----------
+        batch: dict
+            Equal length sequence per schema column.
+        """
+        missing = [col for col in self.schema if col not in batch]
+        if missing:
+            raise KeyError('Batch is missing columns %s.' % missing)
+        columns = {col: self._typed(col, batch[col]) for col in self.schema}
+        lengths = {len(values) for values in columns.values()}
+        if len(lengths) > 1:
+            raise ValueError('Batch columns have different lengths.')
+
+        if self.format == 'csv':
+            self.writer.writerows(zip(*(self._cells(col, values)
+                                        for col, values in columns.items())))
+        else:
+            for col, values in columns.items():
+                if col in self.categories:
+                    values = self._codes(col, values)
+                self.files[col].write(values.tobytes())
+                self.files[col].flush()
+            self.rows += lengths.pop() if lengths else 0
+            self._save_meta()
+
+    def close(self):
+        if self.format == 'csv':
+            self.file.close()
+            return
+        for f in list(self.files.values()) + \
+                list(self.category_files.values()):
+            f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _dtype(self, col):
+        dtype = self.schema[col]
+        return np.dtype(np.int32 if dtype == 'category' else dtype)
+
+    def _file(self, col, extension):
+        return os.path.join(self.path, '%s.%s' % (col, extension))
+
+    def _typed(self, col, values):
+        if self.schema[col] == 'category':
+            return np.asarray(values, dtype=object)
+        dtype = self._dtype(col)
+        values = np.asarray(values)
+        if dtype.kind in 'iu' and values.dtype.kind == 'f':
+            values = np.where(np.isnan(values), MISSING, values)
+        return values.astype(dtype)
+
+    def _cells(self, col, values):
+        if self.schema[col] == 'category':
+            return values.tolist()
+        dtype = self._dtype(col)
+        if dtype.kind == 'f':
+            # NumPy scalars print the shortest digits of their own dtype.
+            return ['' if v != v else str(v) for v in values]
+        return ['' if v == MISSING else v for v in values.tolist()]
+
+    def _codes(self, col, values):
+        categories = self.categories[col]
+        codes = np.empty(len(values), dtype=np.int32)
+        for i, value in enumerate(values):
+            code = categories.get(value)
+            if code is None:
+                code = categories[value] = len(categories)
+                self.category_files[col].write('%s\n' % value)
+            codes[i] = code
+        self.category_files[col].flush()
+        return codes
+
+    def _save_meta(self):
+        meta = os.path.join(self.path, 'meta.json')
+        with open(meta + '.tmp', 'w') as f:
+            json.dump({'schema': self.schema, 'rows': self.rows}, f)
+        os.replace(meta + '.tmp', meta)
+
+
+class PartitionedSink(object):
+    """`ResultSink` per combination of partition keys.
+
+    Tables are written under `root` in `key=value` directories, e.g.
+    `root/score=oasis/partition=train` (with a `.csv` suffix for `csv`).
+    Other parameters are those of `ResultSink`.
+    """
+    def __init__(self, root, schema, format='columns', append=False):
+        super(PartitionedSink, self).__init__()
+        self.root = root
+        self.schema = schema
+        self.format = format
+        self.append = append
+        self.sinks = {}
+
+    def table(self, **keys):
+        """Sink of the partition with `keys`, opened on first use."""
+        key = tuple(keys.items())
+        if key not in self.sinks:
+            path = os.path.join(self.root, *('%s=%s' % kv for kv in key))
+            if self.format == 'csv':
+                path += '.csv'
+            self.sinks[key] = ResultSink(path, self.schema, self.format,
+                                         self.append)
+        return self.sinks[key]
+
+    def write(self, batch, **keys):
+        self.table(**keys).write(batch)
+
+    def close(self):
+        for sink in self.sinks.values():
+            sink.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ResultTable(object):
+    """`columns` table written by a `ResultSink`, memory-mapped.
+
+    Parameters
+    ----------
+    path: str
+        Table directory.
+    """
+    def __init__(self, path):
+        super(ResultTable, self).__init__()
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        self.path = path
+        self.schema = meta['schema']
+        self.rows = meta['rows']
+
+    def __len__(self):
+        return self.rows
+
+    def codes(self, col):
+        """Stored values of `col`, int32 codes for `category` columns."""
+        dtype = np.dtype(np.int32 if self.schema[col] == 'category'
+                         else self.schema[col])
+        if self.rows == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(os.path.join(self.path, col + '.bin'), dtype=dtype,
+                         mode='r', shape=(self.rows,))
+
+    def categories(self, col):
+        """Categories of a `category` column, in code order."""
+        with open(os.path.join(self.path, col + '.categories')) as f:
+            return np.array([line.rstrip('\n') for line in f], dtype=object)
+
+    def __getitem__(self, col):
+        """Values of `col`, with `category` codes decoded."""
+        if self.schema[col] == 'category':
+            return self.categories(col)[self.codes(col)]
+        return self.codes(col)
+
+
+def _makedirs(path):
+    if path and not os.path.exists(path):
+        os.makedirs(path)
@@ -0,0 +1,224 @@
+"""
+Cohort store module
+
+Converts a directory of PhysioNet patient files into one float32 tensor of
+hourly rows (memory-mapped on load), an offsets index per stay, and a
+table of static columns stored once per stay.
+
+Layout of a store directory:
+    values.npy  (total rows x timeseries columns) float32
+    offsets.npy (stays + 1,) int64, rows of stay i are offsets[i]:offsets[i+1]
+    static.npy  (stays x static columns) float32
+    meta.json   column names and stay ids
+"""
+import argparse, json, numpy as np, os
+
+from score.compiled import SPECS
+from score.utils import read, read_columns, variable_map
+
+
+STATIC_COLUMNS = ['Age', 'Gender', 'Unit1', 'Unit2', 'HospAdmTime']
+
+
+def ingest(root, out_dir, time='ICULOS', static=STATIC_COLUMNS):
+    """Convert a directory of patient files into a cohort store.
+
+    Parameters
+    ----------
+    root: str
+        Directory of time-ordered `.psv`/`.csv` patient files.
+    out_dir: str
+        Directory to write the store to.
+    time: str
+        Time column, kept with the timeseries columns.
+    static: list of str
+        Columns constant within a stay, stored once per stay.
+    """
+    stays = sorted(f for f in os.listdir(root)
+                   if f.endswith(('.psv', '.csv', '.tsv'))
+                   and f != 'listfile.csv')
+    paths = [os.path.join(root, f) for f in stays]
+
+    # First pass counts rows so the tensor can be allocated on disk, parsing
+    # only the time column so that blank lines are skipped as `read` does.
+    lengths = np.zeros(len(paths), dtype=np.int64)
+    for i, path in enumerate(paths):
+        lengths[i] = len(read_columns(path, columns=[time])[time])
+    offsets = np.concatenate(([0], np.cumsum(lengths)))
+
+    header = list(read(paths[0]).columns)
+    static = [col for col in static if col in header]
+    columns = [col for col in header if col not in static]
+    if time not in columns:
+        raise KeyError('Time column `%s` not in %s.' % (time, paths[0]))
+
+    if not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+    values = np.lib.format.open_memmap(
+        os.path.join(out_dir, 'values.npy'), mode='w+', dtype=np.float32,
+        shape=(int(offsets[-1]), len(columns)))
+    static_values = np.full((len(paths), len(static)), np.nan,
+                            dtype=np.float32)
+
+    for i, path in enumerate(paths):
+        df = read(path).reindex(columns=header)
+        values[offsets[i]:offsets[i + 1]] = df[columns].to_numpy(np.float32)
+        if len(df):
+            static_values[i] = df[static].iloc[0].to_numpy(np.float32)
+    values.flush()
+
+    np.save(os.path.join(out_dir, 'offsets.npy'), offsets)
+    np.save(os.path.join(out_dir, 'static.npy'), static_values)
+    with open(os.path.join(out_dir, 'meta.json'), 'w') as f:
+        json.dump({'columns': columns, 'static': static, 'time': time,
+                   'stays': stays}, f)
+
+
+class CohortStore(object):
+    """Memory-mapped cohort written by `ingest`.
+
+    Parameters
+    ----------
+    path: str
+        Store directory.
+    """
+    def __init__(self, path):
+        super(CohortStore, self).__init__()
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        self.columns = meta['columns']
+        self.static_columns = meta['static']
+        self.stays = meta['stays']
+        self.time = meta['time']
+
+        self.values = np.load(os.path.join(path, 'values.npy'), mmap_mode='r')
+        self.offsets = np.load(os.path.join(path, 'offsets.npy'))
+        self.static = np.load(os.path.join(path, 'static.npy'))
+
+    def __len__(self):
+        return len(self.stays)
+
+    def stay(self, i):
+        """Timeseries rows of stay `i`, a view into the tensor."""
+        return self.values[self.offsets[i]:self.offsets[i + 1]]
+
+    def windows(self, hours=24):
+        """Row ranges scored for every stay.
+
+        Follows `score.batch.admission_window`: rows with time strictly
+        inside (0, `hours`), otherwise the last pre-admission row, otherwise
+        an empty range.
+
+        Returns
+        -------
+        tuple of numpy.ndarray
+            Start and stop row of each stay's window.
+        """
+        t = self.values[:, self.columns.index(self.time)]
+        first = self.offsets[:-1]
+        n_pre = _segment_sum(t < 0, self.offsets).astype(np.int64)
+        start = first + _segment_sum(t <= 0, self.offsets).astype(np.int64)
+        stop = first + _segment_sum(t < hours, self.offsets).astype(np.int64)
+
+        fallback = (start >= stop) & (n_pre > 0)
+        start = np.where(fallback, first + n_pre - 1, start)
+        stop = np.where(fallback, first + n_pre, np.maximum(start, stop))
+
+        return start, stop
+
+    def window(self, i, hours=24):
+        """Scored rows of stay `i`, a view into the tensor."""
+        rows = self.stay(i)
+        t = rows[:, self.columns.index(self.time)]
+        start = np.searchsorted(t, 0, side='right')
+        stop = np.searchsorted(t, hours, side='left')
+        if stop > start:
+            return rows[start:stop]
+
+        n_pre = np.searchsorted(t, 0, side='left')
+        return rows[max(n_pre - 1, 0):n_pre]
+
+    def var_scores(self, score_name, hours=24):
+        """Worst points per stay and score variable.
+
+        Returns
+        -------
+        numpy.ndarray
+            (stays x score outputs) points, in the order of
+            `SPECS[score_name].outputs`.
+        """
+        spec = SPECS[score_name]
+        start, stop = self.windows(hours)
+        series, static = {}, {}
+        for var in spec.inputs:
+            col = variable_map.get(var, var)
+            if col in self.static_columns:
+                static[var] = self.static[:, self.static_columns.index(col)]
+            elif col in self.columns:
+                series[var] = self.values[:, self.columns.index(col)]
+
+        points = np.full((len(self), len(spec.outputs)), np.nan)
+        for var, pts in spec.row_points(series).items():
+            points[:, spec.outputs.index(var)] = _segment_max(pts,
+                                                              (start, stop))
+        for var, values in spec.row_totals(series).items():
+            observed = _segment_sum(~np.isnan(values), (start, stop))
+            totals = _segment_sum(np.nan_to_num(values), (start, stop))
+            pts = spec.variables[var].points(totals)
+            points[:, spec.outputs.index(var)] = np.where(observed > 0, pts,
+                                                          np.nan)
+        for var, pts in spec.row_points(static).items():
+            points[:, spec.outputs.index(var)] = np.where(stop > start, pts,
+                                                          np.nan)
+
+        return np.where(np.isnan(points), 0, points).astype(int)
+
+    def score(self, score_name, hours=24):
+        """Score of every stay, in the order of `stays`."""
+        return self.var_scores(score_name, hours).sum(axis=1)
+
+
+def _segments(bounds):
+    if isinstance(bounds, tuple):
+        return bounds
+    return bounds[:-1], bounds[1:]
+
+
+def _segment_reduce(ufunc, values, bounds, empty):
+    start, stop = _segments(bounds)
+    out = np.full(len(start), empty, dtype=float)
+    full = stop > start
+    if full.any() and len(values):
+        # reduceat over interleaved (start, stop) pairs, keeping every other.
+        idx = np.stack((start[full], stop[full]), axis=1).ravel()
+        idx = np.minimum(idx, len(values) - 1)
+        reduced = ufunc.reduceat(np.asarray(values, dtype=float), idx)[::2]
+        # The last segment may run to the end of the array.
+        last = stop[full] >= len(values)
+        reduced[last] = [ufunc.reduce(np.asarray(values[a:], dtype=float))
+                         for a in start[full][last]]
+        out[full] = reduced
+
+    return out
+
+
+def _segment_sum(values, bounds):
+    return _segment_reduce(np.add, values, bounds, 0.)
+
+
+def _segment_max(values, bounds):
+    return _segment_reduce(np.fmax, values, bounds, np.nan)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Convert a PhysioNet directory to a cohort store.')
+    parser.add_argument('data', type=str,
+                        help='path to patient directory')
+    parser.add_argument('out', type=str,
+                        help='store directory')
+    parser.add_argument('--time', type=str, default='ICULOS',
+                        help='time column')
+    args = parser.parse_args()
+
+    ingest(args.data, args.out, args.time)
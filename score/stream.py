@@ -0,0 +1,315 @@
+"""
+Streaming module
+
+Scores MIMIC-III style long event tables (CHARTEVENTS, LABEVENTS,
+OUTPUTEVENTS) sorted by stay, without pivoting them into per-stay files.
+Tables are read in fixed-size chunks, itemids are mapped to score variables
+through a direct-address table, and only the scored events of stays that
+may continue in a later chunk are carried over, so memory is bounded by the
+chunk size and the open stays rather than by the size of the tables.
+"""
+import argparse, numpy as np, pandas as pd
+
+from score.batch import score_cohort
+from score.compiled import SPECS
+from score.sink import ResultSink
+
+
+# MetaVision charts the GCS as its eye, verbal and motor components, which
+# `gcs_totals` sums into `glasgow_coma_scale_total`.
+GCS_COMPONENTS = {
+    'glasgow_coma_scale_eye': [220739],
+    'glasgow_coma_scale_verbal': [223900],
+    'glasgow_coma_scale_motor': [223901]
+}
+
+# MIMIC-III itemids of each score variable, CareVue and MetaVision, and of
+# the MetaVision GCS components.
+ITEMIDS = {
+    'bicarbonate': [50882],
+    'bilirubin': [50885],
+    'blood_urea_nitrogen': [51006],
+    'glasgow_coma_scale_total': [198],
+    'heart_rate': [211, 220045],
+    'mean_blood_pressure': [52, 443, 456, 6702, 220052, 220181, 225312],
+    'potassium': [50822, 50971],
+    'respiratory_rate': [615, 618, 220210, 224690],
+    'sodium': [50824, 50983],
+    'systolic_blood_pressure': [51, 442, 455, 6701, 220050, 220179],
+    'temperature': [676, 678, 223761, 223762],
+    'urine_output': [40055, 40056, 40057, 40069, 40085, 40086, 40094, 40096,
+                     40405, 40428, 40473, 40651, 40715, 43175, 226557, 226558,
+                     226559, 226560, 226561, 226563, 226564, 226565, 226567,
+                     226584],
+    'white_blood_cell_count': [51300, 51301],
+    **GCS_COMPONENTS
+}
+
+# Itemids charted in Fahrenheit.
+FAHRENHEIT = [678, 223761]
+
+# Per stay columns of the stays table, e.g. ICUSTAYS joined with ADMISSIONS.
+# `ventilated` is the 0/1 flag of OASIS. SAPS II scores oxygenation on the
+# PaO2/FiO2 ratio while ventilated, which is not streamed from the event
+# tables, so it is read from a `pao2_fio2` column of the stays table (e.g.
+# the worst ratio of the first day) and scores no points without one.
+STATIC_COLUMNS = ['admission_type', 'age', 'icd9', 'pao2_fio2', 'prelos',
+                  'ventilated']
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def item_table(itemids=ITEMIDS):
+    """Variables and a lookup array from itemid to variable code (-1 if
+    the itemid is not scored)."""
+    variables = list(itemids)
+    codes = np.full(max(max(ids) for ids in itemids.values()) + 1, -1,
+                    dtype=np.int16)
+    for code, var in enumerate(variables):
+        codes[itemids[var]] = code
+
+    return variables, codes
+
+
+def load_stays(stays, stay='icustay_id'):
+    """Stays table indexed by stay, with `intime` and any `STATIC_COLUMNS`.
+
+    Parameters
+    ----------
+    stays: str or pandas.DataFrame
+        CSV path or frame with (case-insensitive) `stay` and `intime`
+        columns.
+    """
+    if isinstance(stays, str):
+        # Codes are read as strings whatever their case, keeping leading
+        # zeros, e.g. ICD9 `042`.
+        header = pd.read_csv(stays, nrows=0).columns
+        stays = pd.read_csv(stays, dtype={
+            col: str for col in header
+            if col.lower() in ['admission_type', 'icd9']})
+    stays = stays.rename(columns=str.lower)
+    stays['intime'] = pd.to_datetime(stays['intime'])
+    columns = ['intime'] + [col for col in STATIC_COLUMNS if col in stays]
+
+    return stays.set_index(stay)[columns]
+
+
+def read_events(path, stays, itemids=ITEMIDS, stay='icustay_id',
+                chunksize=1000000, hours=24, time_format=TIME_FORMAT):
+    """Scored events of an event table, chunk by chunk.
+
+    Parameters
+    ----------
+    path: str
+        Event CSV with (case-insensitive) `stay`, `itemid`, `charttime` and
+        `valuenum` (or `value`, as in OUTPUTEVENTS) columns, sorted by stay.
+    stays: pandas.DataFrame
+        Stays table from `load_stays`. Events of other stays are dropped.
+
+    Yields
+    ------
+    pandas.DataFrame
+        `stay`, variable code `var`, `Hours` since ICU admission and
+        `value` of the events before `hours`.
+    """
+    _, codes = item_table(itemids)
+    header = [col.lower() for col in pd.read_csv(path, nrows=0).columns]
+    value = 'valuenum' if 'valuenum' in header else 'value'
+    usecols = [stay, 'itemid', 'charttime', value]
+    fahrenheit = np.zeros(len(codes), dtype=bool)
+    fahrenheit[[item for item in FAHRENHEIT if item < len(codes)]] = True
+
+    last = None
+    for chunk in pd.read_csv(path, usecols=lambda col: col.lower() in usecols,
+                             chunksize=chunksize):
+        chunk = chunk.rename(columns=str.lower).dropna(subset=[stay, value])
+        ids = chunk[stay].to_numpy()
+        if np.any(np.diff(ids) < 0) or (len(ids) and last is not None
+                                        and ids[0] < last):
+            raise ValueError(f'{path} is not sorted by `{stay}`.')
+        if len(ids):
+            last = ids[-1]
+
+        items = chunk['itemid'].to_numpy()
+        known = (items >= 0) & (items < len(codes))
+        var = np.where(known, codes[np.where(known, items, 0)], -1)
+        intime = stays['intime'].reindex(ids).to_numpy()
+        keep = (var >= 0) & ~pd.isna(intime)
+
+        t = pd.to_datetime(chunk['charttime'].to_numpy()[keep],
+                           format=time_format) - intime[keep]
+        t = np.asarray(t / np.timedelta64(1, 'h'), dtype=float)
+        values = pd.to_numeric(chunk[value].to_numpy()[keep],
+                               errors='coerce').astype(float)
+        values = np.where(fahrenheit[items[keep]], (values - 32) / 1.8,
+                          values)
+        events = pd.DataFrame({'stay': ids[keep], 'var': var[keep],
+                               'Hours': t, 'value': values})
+
+        yield events.loc[(events['Hours'] < hours) & events['value'].notna()]
+
+
+def complete_stays(sources):
+    """Events of completed stays across several stay-sorted sources.
+
+    A stay is complete once every source has moved past it, so each yielded
+    frame holds every event of its stays. Only the events of the last stays
+    read from each source are carried over.
+
+    Parameters
+    ----------
+    sources: list of iterators
+        Event chunks from `read_events`, one iterator per table.
+    """
+    sources = [iter(source) for source in sources]
+    buffers = [None] * len(sources)
+    live = [True] * len(sources)
+
+    while True:
+        for i, source in enumerate(sources):
+            # Read until the buffer holds at least one complete stay.
+            while live[i] and (buffers[i] is None or len(buffers[i]) == 0 or
+                               buffers[i]['stay'].iloc[0]
+                               == buffers[i]['stay'].iloc[-1]):
+                events = next(source, None)
+                if events is None:
+                    live[i] = False
+                else:
+                    buffers[i] = pd.concat([buffers[i], events])
+        read = [buffer for buffer in buffers if buffer is not None]
+
+        if not any(live):
+            if read:
+                yield pd.concat(read)
+            return
+
+        frontier = min(buffer['stay'].iloc[-1]
+                       for buffer, alive in zip(buffers, live) if alive)
+        done = [buffer['stay'].to_numpy() < frontier for buffer in read]
+        yield pd.concat([buffer.loc[d] for buffer, d in zip(read, done)])
+        buffers = [None if buffer is None
+                   else buffer.loc[buffer['stay'].to_numpy() >= frontier]
+                   for buffer in buffers]
+
+
+def gcs_totals(events, variables):
+    """Events with the GCS components of each stay and chart time replaced
+    by their total, where all three components were charted at that time.
+    Components charted on their own are dropped."""
+    if not all(var in variables for var in GCS_COMPONENTS) or \
+            'glasgow_coma_scale_total' not in variables:
+        return events
+    codes = [variables.index(var) for var in GCS_COMPONENTS]
+
+    component = events['var'].isin(codes)
+    parts = events.loc[component].drop_duplicates(['stay', 'Hours', 'var'],
+                                                  keep='last')
+    totals = parts.groupby(['stay', 'Hours'], as_index=False) \
+        .agg(parts=('var', 'size'), value=('value', 'sum'))
+    totals = totals.loc[totals['parts'] == len(codes)].drop(columns='parts')
+    totals['var'] = variables.index('glasgow_coma_scale_total')
+
+    return pd.concat([events.loc[~component], totals])
+
+
+def score_events(events, stays, scores=('oasis', 'saps2'),
+                 itemids=ITEMIDS, hours=24):
+    """Score every stay of a frame of complete stays.
+
+    Events at the same time are scored as one row, so the admission window
+    (see `score.batch.admission_window`) is cut on chart times. MetaVision
+    GCS components are summed per chart time first (see `gcs_totals`).
+    Variables totalled by any of `scores` (e.g. urine output) are totalled
+    over the window first, so that every score sees the 24 hour total.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Scores indexed by stay, one column per score.
+    """
+    variables = list(itemids)
+    events = gcs_totals(events, variables)
+    summed = [code for code, var in enumerate(variables)
+              if any(var in SPECS[name].variables and
+                     SPECS[name].variables[var].kind == 'sum'
+                     for name in scores)]
+
+    in_window = (0 < events['Hours']) & (events['Hours'] < hours)
+    total = in_window & events['var'].isin(summed)
+    totals = events.loc[total].groupby(['stay', 'var'], as_index=False) \
+        .agg(Hours=('Hours', 'max'), value=('value', 'sum'))
+    events = pd.concat([events.loc[~total], totals])
+
+    # One row per stay and chart time, repeated for duplicate events.
+    events = events.sort_values(['stay', 'Hours'], kind='mergesort')
+    repeat = events.groupby(['stay', 'Hours', 'var']).cumcount()
+    wide = events.assign(repeat=repeat.to_numpy()) \
+        .set_index(['stay', 'Hours', 'repeat', 'var'])['value'] \
+        .unstack('var')
+    wide.columns = [variables[code] for code in wide.columns]
+    wide = wide.reset_index().join(stays.drop(columns='intime'), on='stay')
+
+    return pd.concat([score_cohort(wide, name, time='Hours', hours=hours)
+                      for name in scores], axis=1)
+
+
+def stream_scores(events, stays, scores=('oasis', 'saps2'), stay='icustay_id',
+                  itemids=ITEMIDS, chunksize=1000000, hours=24,
+                  time_format=TIME_FORMAT):
+    """Scores of MIMIC-style event tables, yielded as stays complete.
+
+    Parameters
+    ----------
+    events: list of str
+        Event CSVs, each sorted by `stay`, e.g. CHARTEVENTS, OUTPUTEVENTS and
+        LABEVENTS with ICU stay ids.
+    stays: str or pandas.DataFrame
+        Stays table, see `load_stays`. Stays without events are not scored.
+    scores: iterable of str
+        Score names, `oasis` or `saps2`.
+    chunksize: int
+        Rows read from each table at a time.
+
+    Yields
+    ------
+    pandas.DataFrame
+        Scores indexed by stay, one column per score.
+    """
+    stays = load_stays(stays, stay)
+    sources = [read_events(path, stays, itemids, stay, chunksize, hours,
+                           time_format) for path in events]
+    for complete in complete_stays(sources):
+        if len(complete):
+            yield score_events(complete, stays, scores, itemids, hours)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Score ICU stays from MIMIC-style event tables.')
+    parser.add_argument('stays', type=str,
+                        help='stays CSV with stay id, intime and static '
+                             'columns')
+    parser.add_argument('events', type=str, nargs='+',
+                        help='event CSVs sorted by stay id')
+    parser.add_argument('--out', type=str, default='stream_scores.csv',
+                        help='output CSV, or directory for --format columns')
+    parser.add_argument('--format', type=str, default='csv',
+                        choices=['csv', 'columns'],
+                        help='output format, see score.sink')
+    parser.add_argument('--append', action='store_true',
+                        help='add to the scores of an earlier run')
+    parser.add_argument('--scores', type=str, nargs='+',
+                        default=['oasis', 'saps2'],
+                        help='ICU severity score names')
+    parser.add_argument('--stay', type=str, default='icustay_id',
+                        help='stay id column')
+    parser.add_argument('--chunksize', type=int, default=1000000,
+                        help='rows read from each table at a time')
+    args = parser.parse_args()
+
+    schema = dict({args.stay: 'int64'}, **dict.fromkeys(args.scores, 'int16'))
+    with ResultSink(args.out, schema, args.format, args.append) as sink:
+        for scores in stream_scores(args.events, args.stays, args.scores,
+                                    args.stay, chunksize=args.chunksize):
+            batch = {name: scores[name].to_numpy() for name in args.scores}
+            sink.write(dict(batch, **{args.stay: scores.index.to_numpy()}))
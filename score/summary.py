@@ -0,0 +1,251 @@
+"""
+Summary table module
+
+Reduces each stay's admission window to a few float32 statistics per
+variable (min, max, observation count and, for totalled variables, the
+sum) plus the worst points of every score output, so that scores and risks
+of a whole cohort can be recomputed without touching the raw timeseries.
+
+Layout of a summary directory:
+    summary.npy (columns x stays) float32, one contiguous row per column
+    meta.json   column names, stay ids and the table version of each
+                stored worst points column
+"""
+import argparse, json, numpy as np, os
+
+from functools import partial
+
+from score.compiled import SPECS, table_hash, to_values
+from score.mapping import saps2_icd9_dict
+from score.parallel import parallel_map, report_failures
+from score.profiling import stage
+from score.risk import RISK_TABLES
+from score.score_patients import read_window
+from score.scores.saps2 import SAPS2_ICD9
+
+
+SCORES = ['oasis', 'saps2', 'apache2']
+
+
+def summary_columns(score_names=SCORES):
+    """Statistics columns and worst points columns of a summary table.
+
+    Returns
+    -------
+    tuple of list
+        (variable, statistic) and (score, output) pairs, where the
+        statistic is `min`, `max`, `count` or `sum`.
+    """
+    stats = {}
+    for name in score_names:
+        for var, compiled in SPECS[name].variables.items():
+            if compiled.kind == 'categorical':
+                continue
+            kinds = stats.setdefault(var, ['min', 'max', 'count'])
+            if compiled.kind == 'sum' and 'sum' not in kinds:
+                kinds.append('sum')
+    stats = [(var, stat) for var in sorted(stats) for stat in stats[var]]
+
+    worst = [(name, output) for name in score_names
+             for output in SPECS[name].outputs]
+    if 'saps2' in score_names:
+        worst.append(('saps2', 'icd9'))
+
+    return stats, worst
+
+
+def output_version(score_name, output):
+    """Version of the tables the worst points of `output` depend on."""
+    spec = SPECS[score_name]
+    if output == 'icd9':
+        return table_hash(saps2_icd9_dict)
+    if output in spec.variables and output not in spec.coupled:
+        return spec.variables[output].version
+
+    return spec.version
+
+
+def summarize_file(score_names, path):
+    """Summary row of one patient file, see `summary_columns`."""
+    stats, worst = summary_columns(score_names)
+    with stage('file', path):
+        window = read_window(path, score_names)
+
+        row = np.full(len(stats) + len(worst), np.nan, dtype=np.float32)
+        for i, (var, stat) in enumerate(stats):
+            if var not in window:
+                row[i] = 0 if stat == 'count' else np.nan
+                continue
+            values = to_values(window[var]).astype(np.float32)
+            observed = values[~np.isnan(values)]
+            if stat == 'count':
+                row[i] = observed.size
+            elif observed.size:
+                row[i] = getattr(observed, stat)()
+
+        with stage('score'):
+            points = {name: SPECS[name].var_scores(window)
+                      for name in score_names}
+            if 'icd9' in window and 'saps2' in points:
+                icd9 = SAPS2_ICD9.cell_points(np.asarray(window['icd9']))
+                points['saps2']['icd9'] = icd9.max(initial=0)
+            for j, (name, output) in enumerate(worst):
+                row[len(stats) + j] = points[name].get(output, 0)
+
+    return row
+
+
+def summarize(root, out_dir, score_names=SCORES, workers=1, chunksize=None):
+    """Write the summary table of a directory of patient files.
+
+    Files that fail to read are reported and left out of the table.
+    """
+    stays = sorted(f for f in os.listdir(root) if f != 'listfile.csv')
+    paths = [os.path.join(root, f) for f in stays]
+    stats, worst = summary_columns(score_names)
+
+    results = parallel_map(partial(summarize_file, list(score_names)), paths,
+                           workers=workers, chunksize=chunksize)
+    report_failures(paths, results)
+    rows = [row for row, error in results if error is None]
+    stays = [stay for stay, (_, error) in zip(stays, results)
+             if error is None]
+    table = np.stack(rows, axis=1) if rows \
+        else np.zeros((len(stats) + len(worst), 0), dtype=np.float32)
+
+    if not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+    np.save(os.path.join(out_dir, 'summary.npy'), table)
+    with open(os.path.join(out_dir, 'meta.json'), 'w') as f:
+        json.dump({
+            'columns': ['%s_%s' % pair for pair in stats]
+            + ['%s_%s_worst' % pair for pair in worst],
+            'stays': stays,
+            'scores': list(score_names),
+            'versions': {'%s_%s' % pair: output_version(*pair)
+                         for pair in worst}
+        }, f)
+
+
+class Summary(object):
+    """Summary table written by `summarize`.
+
+    Parameters
+    ----------
+    path: str
+        Summary directory.
+
+    Notes
+    -----
+    Outputs scored by a table whose points fall then rise with the value
+    (see `CompiledVariable.valley`) are rescored from their min and max, so
+    edits to those tables take effect without summarizing again. Other
+    outputs, and stays with an extreme outside the table's outermost edges,
+    use the stored worst points, which raise a ValueError once their table
+    has changed.
+    """
+    def __init__(self, path):
+        super(Summary, self).__init__()
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        self.columns = {col: i for i, col in enumerate(meta['columns'])}
+        self.stays = meta['stays']
+        self.score_names = meta['scores']
+        self.versions = meta['versions']
+        self.table = np.load(os.path.join(path, 'summary.npy'),
+                             mmap_mode='r')
+
+    def __len__(self):
+        return len(self.stays)
+
+    def __getitem__(self, column):
+        """Column of the table, e.g. `heart_rate_max` or
+        `oasis_temperature_worst`."""
+        return self.table[self.columns[column]]
+
+    def stored_worst(self, score_name, output, rows=slice(None)):
+        """Stored worst points, checked against the current tables."""
+        key = '%s_%s' % (score_name, output)
+        if self.versions[key] != output_version(score_name, output):
+            raise ValueError('The `%s` table has changed since the summary '
+                             'was written, summarize the cohort again.' % key)
+
+        return self[key + '_worst'][rows]
+
+    def var_scores(self, score_name):
+        """Worst points per stay and score output.
+
+        Returns
+        -------
+        numpy.ndarray
+            (stays x score outputs) points, in the order of
+            `SPECS[score_name].outputs`.
+        """
+        if score_name not in self.score_names:
+            raise KeyError('`%s` is not in this summary.' % score_name)
+        spec = SPECS[score_name]
+        points = np.zeros((len(self), len(spec.outputs)), dtype=int)
+
+        for j, output in enumerate(spec.outputs):
+            compiled = spec.variables.get(output)
+            if compiled is None or output in spec.coupled \
+                    or compiled.kind == 'categorical':
+                points[:, j] = self.stored_worst(score_name, output)
+                continue
+
+            count = np.asarray(self[output + '_count'])
+            if compiled.kind == 'sum':
+                pts = compiled.points(np.asarray(self[output + '_sum']))
+                points[:, j] = np.where((count > 0) & ~np.isnan(pts), pts, 0)
+            elif compiled.valley:
+                low = compiled.points(np.asarray(self[output + '_min']))
+                high = compiled.points(np.asarray(self[output + '_max']))
+                points[:, j] = np.where(count > 0,
+                                        np.nan_to_num(np.fmax(low, high)), 0)
+                # An out of range extreme hides the worst in range value.
+                rows = np.flatnonzero((count > 0) & np.isnan(low + high))
+                if rows.size:
+                    points[rows, j] = self.stored_worst(score_name, output,
+                                                        rows)
+            else:
+                points[:, j] = self.stored_worst(score_name, output)
+
+        return points
+
+    def score(self, score_name):
+        """Score of every stay, in the order of `stays`."""
+        score = self.var_scores(score_name).sum(axis=1)
+        if score_name == 'saps2':
+            score = score + self.stored_worst('saps2', 'icd9').astype(int)
+
+        return score
+
+    def risk(self, score_name, *coefficients):
+        """Risk of every stay from its score, with the published
+        coefficients unless others are given (see `score.tune_scores`)."""
+        return RISK_TABLES.risk(score_name, self.score(score_name),
+                                *coefficients)
+
+    def risks(self, score_name, coefficients):
+        """(sets x stays) risks under each row of `coefficients`, e.g. the
+        `b` columns of `score.tune_scores.recalibrate`."""
+        return RISK_TABLES.risks(score_name, self.score(score_name),
+                                 coefficients)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Summarize a directory of ICU patients.')
+    parser.add_argument('data', type=str,
+                        help='path to patient directory')
+    parser.add_argument('out', type=str,
+                        help='summary directory')
+    parser.add_argument('--scores', type=str, nargs='+', default=SCORES,
+                        help='ICU severity score names')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of worker processes, 0 for all cores')
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help='files per worker task')
+    args = parser.parse_args()
+
+    summarize(args.data, args.out, args.scores, args.workers, args.chunksize)
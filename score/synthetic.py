@@ -0,0 +1,158 @@
+"""
+Synthetic cohort module
+
+Deterministic PhysioNet 2019 shaped cohorts for scaling tests: same header
+as `tests/example-*.psv`, per-column missingness close to the challenge
+data and stay lengths from 8 hours to two weeks. A quarter of stays start
+with pre-admission rows (negative `ICULOS`), and a fifth of those have no
+rows in their first day, so that the admission window falls back to the
+last pre-admission row (see `score.batch.stay_window`).
+"""
+import argparse, io, numpy as np, os
+
+from functools import partial
+
+from score.parallel import parallel_map
+
+
+# Timeseries columns: (hourly observation rate, mean, standard deviation).
+PROFILE = {
+    'HR': (0.90, 84.6, 17.3),
+    'O2Sat': (0.87, 97.2, 2.9),
+    'Temp': (0.34, 36.98, 0.77),
+    'SBP': (0.85, 123.8, 23.2),
+    'MAP': (0.88, 82.4, 16.3),
+    'DBP': (0.53, 63.8, 13.9),
+    'Resp': (0.85, 18.7, 5.1),
+    'EtCO2': (0.04, 33.0, 8.0),
+    'BaseExcess': (0.05, -0.7, 4.3),
+    'HCO3': (0.04, 24.1, 4.4),
+    'FiO2': (0.08, 0.55, 0.22),
+    'pH': (0.07, 7.38, 0.07),
+    'PaCO2': (0.06, 41.0, 9.3),
+    'SaO2': (0.03, 92.6, 10.9),
+    'AST': (0.02, 260.0, 855.0),
+    'BUN': (0.07, 23.9, 19.9),
+    'Alkalinephos': (0.02, 102.0, 120.0),
+    'Calcium': (0.06, 7.6, 2.4),
+    'Chloride': (0.05, 105.8, 5.9),
+    'Creatinine': (0.06, 1.5, 1.8),
+    'Bilirubin_direct': (0.002, 1.8, 3.8),
+    'Glucose': (0.17, 136.9, 51.3),
+    'Lactate': (0.03, 2.6, 2.1),
+    'Magnesium': (0.06, 2.05, 0.4),
+    'Phosphate': (0.04, 3.5, 1.4),
+    'Potassium': (0.09, 4.1, 0.6),
+    'Bilirubin_total': (0.015, 2.1, 4.3),
+    'TroponinI': (0.01, 8.3, 24.8),
+    'Hct': (0.09, 30.8, 5.5),
+    'Hgb': (0.07, 10.4, 2.0),
+    'PTT': (0.03, 41.2, 26.2),
+    'WBC': (0.06, 11.4, 7.7),
+    'Fibrinogen': (0.007, 287.4, 153.0),
+    'Platelets': (0.06, 196.0, 103.0)
+}
+
+HEADER = list(PROFILE) + ['Age', 'Gender', 'Unit1', 'Unit2', 'HospAdmTime',
+                          'ICULOS', 'SepsisLabel']
+
+# Columns that may be negative.
+SIGNED = ['BaseExcess']
+
+
+def synthetic_stay(rng):
+    """One stay as a (hours x `HEADER`) float array.
+
+    Parameters
+    ----------
+    rng: numpy.random.Generator
+        Random generator of this stay.
+    """
+    hours = int(np.clip(rng.lognormal(np.log(38), 0.6), 8, 336))
+    stay = np.full((hours, len(HEADER)), np.nan)
+
+    for j, (rate, mean, sd) in enumerate(PROFILE.values()):
+        # Stay level offset plus hourly noise, observed at the column's rate.
+        values = mean + sd * (0.7 * rng.standard_normal()
+                              + 0.3 * rng.standard_normal(hours))
+        observed = rng.random(hours) < rate
+        stay[observed, j] = values[observed]
+    signed = [HEADER.index(col) for col in SIGNED]
+    unsigned = np.setdiff1d(np.arange(len(PROFILE)), signed)
+    stay[:, unsigned] = np.abs(stay[:, unsigned])
+
+    j = len(PROFILE)
+    stay[:, j] = np.round(rng.uniform(18, 90), 2)
+    stay[:, j + 1] = rng.integers(0, 2)
+    if rng.random() < 0.6:
+        unit = rng.integers(0, 2)
+        stay[:, j + 2], stay[:, j + 3] = unit, 1 - unit
+    stay[:, j + 4] = -np.round(rng.exponential(50) + 0.01, 2)
+    stay[:, j + 5] = np.arange(1, hours + 1)
+    stay[:, j + 6] = 0
+    if rng.random() < 0.07:
+        stay[rng.integers(0, hours):, j + 6] = 1
+
+    if rng.random() < 0.25:
+        iculos = stay[:, j + 5] - rng.integers(1, 7)
+        iculos[iculos <= 0] -= 1
+        if rng.random() < 0.2:
+            iculos[iculos > 0] += 24
+        stay[:, j + 5] = iculos
+
+    return np.round(stay, 2)
+
+
+def write_stay(out_dir, seed, index):
+    """Write stay `index` of the cohort, returning (partition, file, label)."""
+    rng = np.random.default_rng([seed, index])
+    stay = synthetic_stay(rng)
+    partition = 'test' if index % 5 == 0 else 'train'
+    file = f'p{index:07d}.psv'
+
+    buffer = io.StringIO()
+    np.savetxt(buffer, stay, fmt='%.10g', delimiter='|',
+               header='|'.join(HEADER), comments='')
+    with open(os.path.join(out_dir, partition, file), 'w') as f:
+        f.write(buffer.getvalue().replace('nan', 'NaN'))
+
+    return partition, file, int(stay[:, -1].max())
+
+
+def generate(out_dir, n_stays, seed=0, workers=1):
+    """Write a synthetic cohort of `n_stays`.
+
+    Stays are split 80/20 into `train` and `test` directories, each with a
+    `listfile.csv` of the sepsis label per stay. Stay `i` only depends on
+    (`seed`, `i`), so the cohort is identical for any number of workers.
+    """
+    for partition in ['train', 'test']:
+        os.makedirs(os.path.join(out_dir, partition), exist_ok=True)
+
+    results = parallel_map(partial(write_stay, out_dir, seed),
+                           range(n_stays), workers=workers)
+    for _, error in results:
+        if error is not None:
+            raise RuntimeError(error)
+    for partition in ['train', 'test']:
+        with open(os.path.join(out_dir, partition, 'listfile.csv'), 'w') as f:
+            f.write('stay,y_true\n')
+            for (part, file, label), _ in results:
+                if part == partition:
+                    f.write(f'{file},{label}\n')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Generate a synthetic PhysioNet cohort.')
+    parser.add_argument('out', type=str,
+                        help='output directory')
+    parser.add_argument('--stays', type=int, default=1000,
+                        help='number of stays, e.g. 1000 to 1000000')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='random seed')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of worker processes, 0 for all cores')
+    args = parser.parse_args()
+
+    generate(args.out, args.stays, args.seed, args.workers)
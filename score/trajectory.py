@@ -0,0 +1,219 @@
+"""
+Trajectory module
+
+Scores of every hour of a stay, each over the sliding window of the
+preceding `hours` hours, for deterioration and sepsis research on whole
+PhysioNet 2019 stays. Each row is binned once, and the worst points of all
+windows are read off a sparse table of running maxima (log2(window rows)
+levels of `np.fmax`), so a stay costs O(rows log window) instead of one
+full rescore per hour.
+
+Layout of a trajectory directory:
+    scores.npy  (total rows x scores) int16, one row per timeseries row
+    time.npy    (total rows,) float32 time of each row
+    offsets.npy (stays + 1,) int64, rows of stay i are offsets[i]:offsets[i+1]
+    meta.json   score names, stay ids and window hours
+"""
+import argparse, json, numpy as np, os
+
+from functools import partial
+
+from score.batch import time_column
+from score.compiled import SPECS
+from score.parallel import parallel_map, report_failures
+from score.profiling import stage
+from score.scores.saps2 import SAPS2_ICD9
+from score.utils import read_columns, rename_variables, score_columns
+
+
+def window_starts(t, hours=24):
+    """First row of the window (t - `hours`, t] ending at each row of a
+    time-ordered stay."""
+    t = np.asarray(t, dtype=float)
+
+    return np.searchsorted(t, t - hours, side='right')
+
+
+def sliding_max(values, starts):
+    """NaN-aware maximum of rows `starts[i]` to `i` of `values`.
+
+    Parameters
+    ----------
+    values: numpy.ndarray
+        (rows,) or (rows x columns) values.
+    starts: numpy.ndarray
+        Non-decreasing first row of each window, see `window_starts`.
+    """
+    values = np.asarray(values, dtype=float)
+    rows = np.arange(len(values))
+    if not len(values):
+        return values.copy()
+    level = np.log2(rows - starts + 1).astype(int)
+
+    # table[j][i] is the maximum of rows i to i + 2**j - 1, so any window
+    # is covered by two, possibly overlapping, entries of one level.
+    table = [values]
+    for j in range(1, level.max() + 1):
+        step = 1 << (j - 1)
+        table.append(np.fmax(table[-1][:-step], table[-1][step:]))
+
+    out = np.empty_like(values)
+    for j in np.unique(level):
+        at = level == j
+        ends = rows[at] - (1 << j) + 1
+        out[at] = np.fmax(table[j][starts[at]], table[j][ends])
+
+    return out
+
+
+def sliding_sum(values, starts):
+    """Sum of rows `starts[i]` to `i`, NaN where none of them is observed."""
+    values = np.asarray(values, dtype=float)
+    observed = np.concatenate(([0], np.cumsum(~np.isnan(values))))
+    total = np.concatenate(([0.], np.cumsum(np.nan_to_num(values))))
+    rows = np.arange(1, len(values) + 1)
+
+    return np.where(observed[rows] > observed[starts],
+                    total[rows] - total[starts], np.nan)
+
+
+def stay_trajectory(data, score_names, hours=24):
+    """Score per row of one stay, over the window ending at that row.
+
+    Parameters
+    ----------
+    data: pandas.DataFrame or dict
+        Whole time-ordered stay keyed by score variable name, with a
+        `Hours` or `ICULOS` time column.
+    score_names: list of str
+        Score names, `oasis`, `saps2` or `apache2`.
+
+    Returns
+    -------
+    numpy.ndarray
+        (rows x scores) int16 scores. Row i scores the rows with time in
+        (t[i] - `hours`, t[i]], so unlike the admission window of
+        `score.batch.admission_window` every row is scored.
+    """
+    t = np.asarray(data[time_column(data)], dtype=float)
+    starts = window_starts(t, hours)
+    scores = np.zeros((len(t), len(score_names)), dtype=np.int16)
+
+    for k, score_name in enumerate(score_names):
+        spec = SPECS[score_name]
+        with stage('bin'):
+            points = spec.row_points(data)
+            totals = spec.row_totals(data)
+
+        with stage('reduce'):
+            score = np.zeros(len(t))
+            if points:
+                worst = sliding_max(np.column_stack(list(points.values())),
+                                    starts)
+                score += np.nan_to_num(worst).sum(axis=1)
+            for var, values in totals.items():
+                pts = spec.variables[var].points(sliding_sum(values, starts))
+                score += np.nan_to_num(pts)
+            if score_name == 'saps2' and 'icd9' in data:
+                icd9 = SAPS2_ICD9.cell_points(np.asarray(data['icd9']))
+                score += np.nan_to_num(sliding_max(icd9, starts))
+        scores[:, k] = score
+
+    return scores
+
+
+def trajectory_file(score_names, path, hours=24):
+    """Times and `stay_trajectory` of one patient file."""
+    columns = set().union(*(score_columns(name) for name in score_names))
+    with stage('file', path):
+        data = rename_variables(read_columns(path, columns=columns))
+        t = data[time_column(data)]
+
+        return t.astype(np.float32), stay_trajectory(data, score_names, hours)
+
+
+def trajectories(root, out_dir, score_names=('oasis', 'saps2'), hours=24,
+                 workers=1, chunksize=None):
+    """Write the trajectories of a directory of patient files.
+
+    Files that fail to score are reported and left out.
+    """
+    score_names = list(score_names)
+    stays = sorted(f for f in os.listdir(root) if f != 'listfile.csv')
+    paths = [os.path.join(root, f) for f in stays]
+
+    results = parallel_map(partial(trajectory_file, score_names, hours=hours),
+                           paths, workers=workers, chunksize=chunksize)
+    report_failures(paths, results)
+    done = [(stay, result) for stay, (result, error) in zip(stays, results)
+            if error is None]
+    lengths = [len(t) for _, (t, _) in done]
+
+    with stage('write'):
+        if not os.path.exists(out_dir):
+            os.makedirs(out_dir)
+        np.save(os.path.join(out_dir, 'offsets.npy'),
+                np.concatenate(([0], np.cumsum(lengths, dtype=np.int64))))
+        np.save(os.path.join(out_dir, 'time.npy'), np.concatenate(
+            [t for _, (t, _) in done] or [np.zeros(0, dtype=np.float32)]))
+        np.save(os.path.join(out_dir, 'scores.npy'), np.concatenate(
+            [s for _, (_, s) in done]
+            or [np.zeros((0, len(score_names)), dtype=np.int16)]))
+        with open(os.path.join(out_dir, 'meta.json'), 'w') as f:
+            json.dump({'scores': score_names, 'hours': hours,
+                       'stays': [stay for stay, _ in done]}, f)
+
+
+class Trajectories(object):
+    """Trajectories written by `trajectories`, memory-mapped.
+
+    Parameters
+    ----------
+    path: str
+        Trajectory directory.
+    """
+    def __init__(self, path):
+        super(Trajectories, self).__init__()
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        self.score_names = meta['scores']
+        self.hours = meta['hours']
+        self.stays = meta['stays']
+
+        self.scores = np.load(os.path.join(path, 'scores.npy'), mmap_mode='r')
+        self.time = np.load(os.path.join(path, 'time.npy'), mmap_mode='r')
+        self.offsets = np.load(os.path.join(path, 'offsets.npy'))
+
+    def __len__(self):
+        return len(self.stays)
+
+    def stay(self, i, score_name=None):
+        """Times and scores of stay `i`, all scores unless `score_name`."""
+        rows = slice(self.offsets[i], self.offsets[i + 1])
+        scores = self.scores[rows]
+        if score_name is not None:
+            scores = scores[:, self.score_names.index(score_name)]
+
+        return self.time[rows], scores
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Score every hour of ICU stays over a sliding window.')
+    parser.add_argument('data', type=str,
+                        help='path to patient directory')
+    parser.add_argument('out', type=str,
+                        help='trajectory directory')
+    parser.add_argument('--scores', type=str, nargs='+',
+                        default=['oasis', 'saps2'],
+                        help='ICU severity score names')
+    parser.add_argument('--hours', type=float, default=24,
+                        help='length of the sliding window')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of worker processes, 0 for all cores')
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help='files per worker task')
+    args = parser.parse_args()
+
+    trajectories(args.data, args.out, args.scores, args.hours, args.workers,
+                 args.chunksize)
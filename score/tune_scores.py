@@ -1,13 +1,13 @@
-import argparse, numpy as np, os, pandas as pd
+import argparse, numpy as np, os, pandas as pd, warnings
 
-from scipy.optimize import curve_fit
-from sklearn.linear_model import LogisticRegression
-from sklearn.model_selection import train_test_split
-
-from saps2 import saps2_risk
+from score.risk import PUBLISHED
+from score.scores.saps2 import saps2_risk
 
 
 def tune_oasis(X, y):
+    # scipy and sklearn are only imported by the fits that use them.
+    from sklearn.linear_model import LogisticRegression
+
     logreg = LogisticRegression(solver='lbfgs')
     logreg.fit(X[:, None], y)
 
@@ -18,8 +18,10 @@ def tune_oasis(X, y):
 
 
 def tune_saps2(X, y):
+    from scipy.optimize import curve_fit
+
     popt, pcov = curve_fit(saps2_risk, X, y,
-        p0=np.array([-7.7631, 0.0737, 0.9971]))
+        p0=np.array(PUBLISHED['saps2']))
 
     return popt
 
@@ -27,6 +29,7 @@ def tune_saps2(X, y):
 def tune_score(score_name, data, listfile):
     if score_name not in ['oasis', 'saps2']:
         raise Exception('ICU score is not recognized.')
+    from sklearn.model_selection import train_test_split
 
     X_train = pd.read_csv(os.path.join(data, f'train_{score_name}_scores.csv'))
     X_train = X_train['score'].values
@@ -52,6 +55,185 @@ def tune_score(score_name, data, listfile):
     return B
 
 
+def risk_features(score_name, score):
+    """Design matrix of the risk model, columns matching `PUBLISHED`."""
+    score = np.asarray(score, dtype=float)
+    columns = [np.ones_like(score), score]
+    if score_name == 'saps2':
+        columns += [np.log(1 + score)]
+
+    return np.stack(columns, axis=-1)
+
+
+def log_likelihood(X, pos, tot, beta):
+    """Grouped log-likelihood of each fit."""
+    eta = beta @ X.T
+
+    return (pos * eta - tot * np.logaddexp(0, eta)).sum(axis=-1)
+
+
+def fit_logistic(X, pos, tot, beta0, max_iter=50, tol=1e-10, ridge=1e-9,
+                 max_halvings=30, eps=1e-10):
+    """Stacked Newton/IRLS fit of many grouped logistic regressions.
+
+    A Newton step that would lower a fit's log-likelihood is halved until it
+    does not, up to `max_halvings` times. A fit has converged once its step
+    is below `tol` with no fitted risk of a cell within `eps` of 0 or 1.
+    Fits without both outcomes or with separated outcomes have no maximum
+    likelihood estimate and do not converge.
+
+    Parameters
+    ----------
+    X: numpy.ndarray
+        (cells x coefficients) design matrix shared by all fits.
+    pos, tot: numpy.ndarray
+        (fits x cells) positive and total counts per cell.
+    beta0: numpy.ndarray
+        Starting coefficients, (coefficients,) or (fits x coefficients).
+
+    Returns
+    -------
+    tuple of numpy.ndarray
+        (fits x coefficients) maximum likelihood coefficients and (fits,)
+        whether each fit converged.
+    """
+    beta = np.array(np.broadcast_to(beta0, (pos.shape[0], X.shape[1])),
+                    dtype=float)
+    eye = ridge * np.eye(X.shape[1])
+    loglik = log_likelihood(X, pos, tot, beta)
+    done = np.zeros(len(beta), dtype=bool)
+
+    for _ in range(max_iter):
+        active = np.flatnonzero(~done)
+        if not len(active):
+            break
+        b, p, t = beta[active], pos[active], tot[active]
+        mu = np.exp(-np.logaddexp(0, -(b @ X.T)))
+        grad = (p - t * mu) @ X
+        hess = np.einsum('ku,ui,uj->kij', t * mu * (1 - mu), X, X) + eye
+        step = np.linalg.solve(hess, grad[..., None])[..., 0]
+
+        new = log_likelihood(X, p, t, b + step)
+        for _ in range(max_halvings):
+            worse = new < loglik[active]
+            if not worse.any():
+                break
+            step[worse] /= 2
+            new[worse] = log_likelihood(X, p[worse], t[worse],
+                                        b[worse] + step[worse])
+
+        beta[active] = b + step
+        loglik[active] = new
+        done[active] = ~(np.abs(step).max(axis=1) > tol)
+
+    mu = np.exp(-np.logaddexp(0, -(beta @ X.T)))
+    degenerate = ((tot > 0) & ((mu < eps) | (mu > 1 - eps))).any(axis=1)
+
+    return beta, done & ~degenerate
+
+
+def resample_cells(counts, n_resamples, method, test_size, rng):
+    """Resampled counts of (score, outcome) cells.
+
+    Parameters
+    ----------
+    counts: numpy.ndarray
+        (scores x 2) stays per score and outcome.
+    method: str
+        `bootstrap` draws n stays with replacement. `split` draws a training
+        split without replacement, stratified by outcome, as
+        `train_test_split(stratify=y)` does.
+
+    Returns
+    -------
+    numpy.ndarray
+        (n_resamples x scores x 2) resampled counts.
+    """
+    n = counts.sum()
+    if method == 'bootstrap':
+        flat = rng.multinomial(n, counts.ravel() / max(n, 1),
+                               size=n_resamples)
+        return flat.reshape(n_resamples, *counts.shape)
+    elif method == 'split':
+        out = np.zeros((n_resamples,) + counts.shape, dtype=np.int64)
+        for y in range(2):
+            n_train = counts[:, y].sum() - int(np.ceil(
+                test_size * counts[:, y].sum()))
+            out[:, :, y] = rng.multivariate_hypergeometric(
+                counts[:, y], n_train, size=n_resamples)
+        return out
+    raise ValueError('Resampling method is not recognized.')
+
+
+def recalibrate(score_name, X, y, n_resamples=1000, method='bootstrap',
+                strata=None, test_size=0.1, warm_start=True, random_state=0):
+    """Refit the risk model on many resamples and strata in one solve.
+
+    Stays are collapsed to counts per (stratum, score, outcome), resamples
+    are drawn directly as counts, and every (stratum, resample) model is
+    fitted by one stacked Newton solve over the distinct scores.
+
+    Parameters
+    ----------
+    score_name: str
+        Score name, `oasis` or `saps2`.
+    X: numpy.ndarray
+        Score per stay. Stays without a finite score are left out.
+    y: numpy.ndarray
+        Outcome per stay (`0`/`1`).
+    n_resamples: int
+        Bootstrap samples or training splits per stratum.
+    method: str
+        `bootstrap` or `split`, see `resample_cells`.
+    strata: numpy.ndarray, optional
+        Stratum per stay, e.g. unit or age band. One coefficient set per
+        stratum and resample is fitted.
+    warm_start: bool
+        Start from the published coefficients instead of zeros.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Columns `stratum`, `resample`, the coefficients `b0`, `b1` (and
+        `b2` for SAPS II) and whether their fit `converged`. A warning is
+        issued if any fit did not.
+    """
+    if score_name not in PUBLISHED:
+        raise Exception('ICU score is not recognized.')
+
+    X, y = np.asarray(X, dtype=float), np.asarray(y, dtype=int)
+    if strata is None:
+        strata = np.full(len(X), 'all', dtype=object)
+    finite = np.isfinite(X)
+    X, y, strata = X[finite], y[finite], np.asarray(strata)[finite]
+    stratum_names, stratum = np.unique(strata, return_inverse=True)
+    scores, score = np.unique(X, return_inverse=True)
+
+    counts = np.zeros((len(stratum_names), len(scores), 2), dtype=np.int64)
+    np.add.at(counts, (stratum, score, y), 1)
+
+    rng = np.random.default_rng(random_state)
+    cells = np.concatenate([
+        resample_cells(c, n_resamples, method, test_size, rng)
+        for c in counts])
+
+    beta0 = np.array(PUBLISHED[score_name]) if warm_start \
+        else np.zeros(len(PUBLISHED[score_name]))
+    B, converged = fit_logistic(risk_features(score_name, scores),
+                                cells[:, :, 1], cells.sum(axis=2), beta0)
+    if not converged.all():
+        warnings.warn(f'{(~converged).sum()} of {len(converged)} fits did '
+                      f'not converge, e.g. strata without deaths.')
+
+    B = pd.DataFrame(B, columns=[f'b{i}' for i in range(B.shape[1])])
+    B['converged'] = converged
+    B.insert(0, 'resample', np.tile(np.arange(n_resamples),
+                                    len(stratum_names)))
+    B.insert(0, 'stratum', np.repeat(stratum_names, n_resamples))
+
+    return B
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Tune ICU score.')
     parser.add_argument('score_name', type=str,
@@ -62,16 +244,34 @@ if __name__ == '__main__':
                         help='path to listfile')
     parser.add_argument('--coefs', type=str, default='coefs',
                         help='path to coefficients directory')
+    parser.add_argument('--resamples', type=int, default=None,
+                        help='number of resamples to recalibrate on')
+    parser.add_argument('--method', type=str, default='bootstrap',
+                        choices=['bootstrap', 'split'],
+                        help='resampling method')
+    parser.add_argument('--strata', type=str, default=None,
+                        help='listfile column to fit coefficients per value')
     args = parser.parse_args()
 
     if not os.path.exists(args.coefs):
         os.makedirs(args.coefs)
 
-    B = tune_score(args.score_name, args.data, args.listfile)
+    if args.resamples is not None:
+        X_train = pd.read_csv(
+            os.path.join(args.data, f'train_{args.score_name}_scores.csv'))
+        stay_df = pd.read_csv(args.listfile).sort_values(by=['stay'])
+        strata = None if args.strata is None else stay_df[args.strata].values
+        B = recalibrate(args.score_name, X_train['score'].values,
+                        stay_df['y_true'].values, args.resamples, args.method,
+                        strata)
+        B.to_csv(os.path.join(args.coefs, args.score_name)
+                 + f'_{args.method}.csv', index=None)
+    else:
+        B = tune_score(args.score_name, args.data, args.listfile)
 
-    if args.score_name == 'oasis':
-        B = pd.DataFrame(B, columns=['b0', 'b1'])
-    elif args.score_name == 'saps2':
-        B = pd.DataFrame(B, columns=['b0', 'b1', 'b2'])
-    B.to_csv(os.path.join(args.coefs, args.score_name)+'.csv', index=None)
+        if args.score_name == 'oasis':
+            B = pd.DataFrame(B, columns=['b0', 'b1'])
+        elif args.score_name == 'saps2':
+            B = pd.DataFrame(B, columns=['b0', 'b1', 'b2'])
+        B.to_csv(os.path.join(args.coefs, args.score_name)+'.csv', index=None)
     print(B)
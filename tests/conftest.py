@@ -0,0 +1,26 @@
+import os, sys
+
+import pytest
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.dirname(os.path.abspath(__file__))
+
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture
+def cohort(tmp_path):
+    """Directory of the PhysioNet fixture patients, each under a few names so
+    that every shard of a small split gets stays."""
+    root = tmp_path / 'cohort'
+    root.mkdir()
+    for name in sorted(os.listdir(FIXTURES)):
+        if not name.endswith('.psv'):
+            continue
+        with open(os.path.join(FIXTURES, name)) as f:
+            text = f.read()
+        for copy in range(4):
+            (root / ('%s-%d.psv' % (name[:-4], copy))).write_text(text)
+
+    return str(root)
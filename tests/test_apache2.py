@@ -0,0 +1,51 @@
+import numpy as np
+
+from score.abstract_score import score_picker
+from score.compiled import SPECS, CompiledApache2
+from score.scores.apache2 import apache2_score, apache2_window_score
+
+
+def patients(n=500, seed=0):
+    rng = np.random.default_rng(seed)
+    return dict(
+        temperature=rng.uniform(28, 43, n),
+        mean_blood_pressure=rng.uniform(40, 170, n),
+        heart_rate=rng.uniform(30, 190, n),
+        respiratory_rate=rng.uniform(4, 55, n),
+        fio2=rng.choice([0.21, 0.4, 0.5, 0.9, np.nan], n),
+        aado2=rng.uniform(100, 550, n), pao2=rng.uniform(50, 80, n),
+        ph=rng.uniform(7.1, 7.75, n), sodium=rng.uniform(105, 185, n),
+        potassium=rng.uniform(2.3, 7.5, n),
+        creatinine=rng.uniform(0.4, 4, n), hematocrit=rng.uniform(15, 65, n),
+        white_blood_cell_count=rng.uniform(0.5, 45, n),
+        glasgow_coma_scale_total=rng.integers(3, 16, n).astype(float),
+        age=rng.uniform(18, 90, n),
+        chronic_health=rng.choice(['RO NSCD', 'EO SCD', 'NO SCD'], n),
+        aki=rng.integers(0, 2, n))
+
+
+def test_apache2_is_registered():
+    assert isinstance(SPECS['apache2'], CompiledApache2)
+    assert score_picker('apache2').spec is SPECS['apache2']
+    assert 'oxygenation' in SPECS['apache2'].outputs
+    assert 'pao2' not in SPECS['apache2'].outputs
+
+
+def test_window_score_matches_patient_score():
+    data = patients()
+    expected = apache2_score(**data)
+    for i in range(len(expected)):
+        row = {var: values[i] for var, values in data.items()}
+        window = {var: np.array([value]) for var, value in row.items()}
+        assert apache2_window_score(row) == expected[i]
+        assert apache2_window_score(window) == expected[i]
+
+
+def test_oxygenation_is_scored_per_row():
+    # A-aDO2 counts only in rows with FiO2 >= 0.5 and PaO2 only in the
+    # others: 4 points for an A-aDO2 of 550, 3 for a PaO2 of 58.
+    window = {'fio2': np.array([0.6, 0.3]), 'aado2': np.array([550., 550.]),
+              'pao2': np.array([58., 58.])}
+    assert SPECS['apache2'].var_scores(window)['oxygenation'] == 4
+    window['fio2'] = np.array([0.3, 0.3])
+    assert SPECS['apache2'].var_scores(window)['oxygenation'] == 3
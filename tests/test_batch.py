@@ -0,0 +1,61 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from score.batch import score_cohort, score_window, stay_window
+from score.compiled import SPECS
+from score.score_patients import score_file
+from score.utils import read, rename_variables
+
+
+FIXTURES = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_scores_read_their_own_ventilation_columns():
+    # Ventilated, with a PaO2/FiO2 of 150: 9 OASIS and 9 SAPS II points.
+    window = {'Hours': np.array([1., 2.]), 'ventilated': np.array([1., 1.]),
+              'pao2_fio2': np.array([150., 250.])}
+    oasis, saps2 = score_window(window, ['oasis', 'saps2'])
+
+    assert SPECS['oasis'].var_scores(window)['ventilated'] == 9
+    assert SPECS['saps2'].var_scores(window)['pao2_fio2'] == 9
+    assert [oasis, saps2] == score_window(window, ['oasis']) \
+        + score_window(window, ['saps2'])
+    assert saps2 - score_window({'Hours': window['Hours']}, ['saps2'])[0] == 9
+
+
+def test_score_cohort_matches_score_file():
+    paths = [os.path.join(FIXTURES, name)
+             for name in ['example-a.psv', 'example-b.psv', 'example-c.psv']]
+    df = pd.concat([read(path, dtype=np.float32).assign(stay=stay)
+                    for stay, path in enumerate(paths)], ignore_index=True)
+    df = rename_variables(df)
+
+    for name in ['oasis', 'saps2', 'apache2']:
+        scores = score_cohort(df, name)
+        assert list(scores.index) == [0, 1, 2]
+        assert list(scores) == [score_file(name, path) for path in paths]
+
+
+def test_score_cohort_falls_back_to_pre_admission_rows():
+    # Stay 1 has only pre-admission rows, stay 2 only rows past 24 hours.
+    df = pd.DataFrame({
+        'stay': [2, 1, 1, 0, 0, 2],
+        'Hours': [30., -5., -1., 2., 3., 40.],
+        'heart_rate': [200., 200., 130., 90., 130., 200.],
+        'icd9': [None, '0420', '0420', None, '20000', None],
+    })
+    scores = score_cohort(df, 'saps2')
+
+    assert list(scores.index) == [0, 1, 2]
+    for stay in [0, 1]:
+        rows = df[df['stay'] == stay]
+        window = {col: rows[col].to_numpy()[stay_window(rows['Hours'])]
+                  for col in df if col != 'stay'}
+        assert scores[stay] == score_window(window, ['saps2'])[0]
+    # The last pre-admission row only: 130 bpm and AIDS (17 points).
+    assert scores[1] == score_window({'Hours': np.array([-1.]),
+                                      'heart_rate': np.array([130.])},
+                                     ['saps2'])[0] + 17
+    assert scores[2] == 0
@@ -0,0 +1,42 @@
+import os
+
+import numpy as np, pytest
+
+from score.bedside import BedsideScorer
+from score.risk import RISKS
+from score.score_patients import score_file
+from score.utils import read
+
+
+FIXTURES = os.path.dirname(os.path.abspath(__file__))
+
+
+@pytest.mark.parametrize('name', ['oasis', 'saps2'])
+@pytest.mark.parametrize('batch', [1, 5])
+def test_bedside_matches_score_file(name, batch):
+    for fixture in ['example-a.psv', 'example-b.psv', 'example-c.psv']:
+        path = os.path.join(FIXTURES, fixture)
+        ts = read(path, dtype=np.float32)
+        scorer = BedsideScorer(name)
+        for start in range(0, len(ts), batch):
+            score, risk = scorer.update(ts.iloc[start:start + batch])
+
+        assert score == score_file(name, path) > 0
+        assert risk == pytest.approx(float(RISKS[name](score)))
+        assert scorer.n_obs == len(ts)
+
+
+def test_bedside_falls_back_to_last_pre_admission_row():
+    scorer = BedsideScorer('saps2', time='Hours')
+    assert scorer.update({'Hours': -5, 'heart_rate': 200})[0] == 7
+    # Only the last pre-admission row is scored.
+    assert scorer.update({'Hours': -1, 'heart_rate': 130})[0] == 4
+    # The first row inside the window replaces the fallback.
+    assert scorer.update({'Hours': 2, 'heart_rate': 90})[0] == 0
+    assert scorer.update({'Hours': -0.5, 'heart_rate': 200})[0] == 0
+    # Rows past the window are ignored.
+    assert scorer.update({'Hours': 30, 'heart_rate': 200})[0] == 0
+    assert scorer.update({'Hours': 3, 'heart_rate': 130})[0] == 4
+
+    scorer.reset()
+    assert (scorer.score, scorer.n_obs) == (0, 0)
@@ -0,0 +1,29 @@
+import os
+
+import numpy as np, pandas as pd
+
+from score.benchmark import STAGES, time_stages
+from score.score_patients import score_patients
+from score.synthetic import generate
+
+
+def test_time_stages_times_production_scores(tmp_path):
+    generate(str(tmp_path / 'data'), 40)
+    root = str(tmp_path / 'data' / 'train')
+    stays = pd.read_csv(os.path.join(root, 'listfile.csv'))['stay']
+    times = [pd.read_csv(os.path.join(root, stay), sep='|')['ICULOS']
+             for stay in stays]
+    # Pre-admission rows, and a stay that falls back to one.
+    assert any((t < 0).any() for t in times)
+    assert any((t < 0).any() and not ((0 < t) & (t < 24)).any()
+               for t in times)
+
+    timings = time_stages(root, 'saps2', str(tmp_path))
+    assert list(timings) == STAGES
+    assert all(timings[stage] > 0 for stage in STAGES)
+    assert timings['bin'] + timings['reduce'] <= timings['score']
+
+    score_patients('saps2', root, 'train', str(tmp_path))
+    expected = pd.read_csv(tmp_path / 'train_saps2_scores.csv')
+    stages = pd.read_csv(tmp_path / 'stages_saps2_scores.csv')
+    np.testing.assert_array_equal(stages['score'], expected['score'])
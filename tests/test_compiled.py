@@ -0,0 +1,75 @@
+import numpy as np, pandas as pd, pytest
+
+from score.compiled import SPECS
+
+
+NAMES = ['oasis', 'saps2', 'apache2']
+
+
+def numeric_variables():
+    return [(name, var) for name in NAMES
+            for var, compiled in SPECS[name].variables.items()
+            if compiled.kind != 'categorical']
+
+
+def sample(compiled, rng, n=2000):
+    """Values over and around the table, including every edge."""
+    edges = compiled.edges[np.isfinite(compiled.edges)]
+    low, high = edges.min() - 10, edges.max() + 10
+    values = np.concatenate([rng.uniform(low, high, n), edges,
+                             np.round(rng.uniform(low, high, n)), [np.nan]])
+
+    return values
+
+
+@pytest.mark.parametrize('name, var', numeric_variables())
+def test_points_match_pd_cut(name, var):
+    compiled = SPECS[name].variables[var]
+    values = sample(compiled, np.random.default_rng(0))
+
+    index = pd.cut(values, compiled.edges, labels=False,
+                   right=compiled.side == 'left')
+    expected = np.where(np.isnan(index), np.nan,
+                        compiled.labels[np.nan_to_num(index).astype(int)])
+
+    np.testing.assert_array_equal(compiled.points(values), expected)
+
+
+@pytest.mark.parametrize('name', NAMES)
+def test_row_scores_match_array_scores(name):
+    spec = SPECS[name]
+    rng = np.random.default_rng(1)
+    for _ in range(200):
+        row = {}
+        for var, compiled in spec.variables.items():
+            if rng.random() < 0.2:
+                continue
+            if compiled.kind == 'categorical':
+                row[var] = compiled.categories[
+                    rng.integers(len(compiled.categories))]
+            else:
+                row[var] = float(rng.choice(sample(compiled, rng, 20)))
+        if name == 'apache2':
+            row['fio2'] = float(rng.choice([0.21, 0.5, 0.8, np.nan]))
+            row['aki'] = int(rng.integers(2))
+
+        columns = {var: np.array([value], dtype=object if
+                                 isinstance(value, str) else float)
+                   for var, value in row.items()}
+        assert spec.var_scores(row) == spec.var_scores(columns)
+
+
+def test_structured_records_are_scored():
+    from score.scores.oasis import oasis_score
+
+    rec = np.array([(130., 80., 39.5), (90., 80., 37.)],
+                   dtype=[('heart_rate', 'f8'), ('age', 'f8'),
+                          ('temperature', 'f8')])
+    row = {name: rec[name][0] for name in rec.dtype.names}
+
+    assert oasis_score(rec[0]) == oasis_score(row) == oasis_score(rec[:1])
+    assert oasis_score(rec[0]) > 0
+    assert oasis_score(rec) == SPECS['oasis'].score(
+        {name: rec[name] for name in rec.dtype.names})
+    with pytest.raises(TypeError):
+        oasis_score([130., 80., 39.5])
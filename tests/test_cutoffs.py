@@ -0,0 +1,90 @@
+import os
+
+import numpy as np, pytest
+
+from score.compiled import SPECS
+from score.cutoffs import (CutoffCohort, collect, compile_candidate,
+                           edge_grid, score_metrics, search)
+from score.evaluate import evaluate
+from score.score_patients import read_window, score_file
+
+
+metrics = pytest.importorskip('sklearn.metrics')
+
+CANDIDATE = {'heart_rate': {'bins': [-1, 32, 80, 100, 125, 300]},
+             'age': {'labels': [0, 5, 10, 12, 15]}}
+
+
+@pytest.mark.parametrize('name', ['oasis', 'saps2'])
+def test_candidates_match_rescoring_the_files(cohort, tmp_path, name):
+    out = str(tmp_path / 'cutoffs')
+    collect(cohort, out, name, workers=2)
+    data = CutoffCohort(out)
+    paths = [os.path.join(cohort, stay) for stay in data.stays]
+
+    assert data.stays == sorted(os.listdir(cohort))
+    assert list(data.score()) == [score_file(name, path) for path in paths]
+
+    candidate = {'heart_rate': CANDIDATE['heart_rate']}
+    compiled = compile_candidate(name, candidate)['heart_rate']
+    current = SPECS[name].variables['heart_rate']
+    for path, score in zip(paths, data.score(candidate)):
+        values = read_window(path, [name])['heart_rate']
+        assert score == score_file(name, path) - current.worst(values) \
+            + compiled.worst(values)
+
+
+def test_apache2_is_not_collected(cohort, tmp_path):
+    with pytest.raises(ValueError, match='does not support'):
+        collect(cohort, str(tmp_path / 'cutoffs'), 'apache2')
+
+
+def test_malformed_candidates_are_rejected():
+    with pytest.raises(ValueError, match='labels'):
+        compile_candidate('oasis', {'heart_rate': {'bins': [-1, 300]}})
+    with pytest.raises(ValueError, match='not increasing'):
+        compile_candidate('oasis', {'heart_rate': {
+            'bins': [-1, 90, 88, 106, 125, 300]}})
+    with pytest.raises(ValueError, match='negative'):
+        compile_candidate('oasis', {'heart_rate': {
+            'labels': [4, 0, -1, 3, 6]}})
+    with pytest.raises(KeyError):
+        compile_candidate('oasis', {'pulse': {}})
+
+
+def test_edge_grid_skips_unordered_edges():
+    candidates = edge_grid('oasis', [('heart_rate', 2, [80, 110]),
+                                     ('heart_rate', 3, [100, 120])])
+
+    assert [c['heart_rate']['bins'][2:4] for c in candidates] == \
+        [[80, 100], [80, 120], [110, 120]]
+
+
+def test_score_metrics_match_evaluate():
+    rng = np.random.default_rng(0)
+    score = rng.integers(0, 60, 2000)
+    y = (rng.random(2000) < 1 / (1 + np.exp(-(score - 30) / 8))).astype(int)
+    result = score_metrics('oasis', score, y)
+    expected = evaluate('oasis', score, y).iloc[0]
+
+    assert result['auroc'] == pytest.approx(metrics.roc_auc_score(y, score))
+    assert result['brier'] == pytest.approx(expected['brier'])
+    assert result['citl'] == pytest.approx(expected['citl'])
+    assert result['converged']
+    assert result['brier_refit'] <= result['brier']
+
+
+def test_search_reports_each_candidate(cohort, tmp_path):
+    out = str(tmp_path / 'cutoffs')
+    collect(cohort, out, 'oasis')
+    data = CutoffCohort(out)
+    y = np.arange(len(data)) % 2
+    candidates = [{}, CANDIDATE, {'heart_rate': {'bins': [-1, 300]}}]
+    result = search(out, y, candidates)
+
+    assert list(result['candidate'].iloc[:1]) == ['{}']
+    for k in range(2):
+        assert result['auroc'][k] == pytest.approx(
+            metrics.roc_auc_score(y, data.score(candidates[k])))
+    # The malformed candidate is reported and left as NaN.
+    assert result.iloc[2][['auroc', 'brier']].isna().all()
@@ -0,0 +1,10 @@
+import doctest, pytest
+
+from score.scores import apache2
+
+
+@pytest.mark.parametrize('module', [apache2])
+def test_doctests(module):
+    failures, _ = doctest.testmod(module)
+
+    assert failures == 0
@@ -0,0 +1,75 @@
+import numpy as np, pytest
+
+from score.evaluate import bootstrap, calibration_curve, evaluate
+from score.risk import PUBLISHED, RISK_TABLES
+
+
+metrics = pytest.importorskip('sklearn.metrics')
+
+
+def cohort(seed=0, n=3000):
+    rng = np.random.default_rng(seed)
+    score = rng.integers(0, 60, n)
+    y = (rng.random(n) < 1 / (1 + np.exp(-(score - 30) / 8))).astype(int)
+
+    return score, y
+
+
+def test_evaluate_matches_sklearn():
+    score, y = cohort()
+    rng = np.random.default_rng(1)
+    coefficients = np.column_stack([rng.normal(-6, 1, 50),
+                                    rng.normal(0, 0.2, 50)])
+    result = evaluate('oasis', score, y, coefficients)
+
+    risks = RISK_TABLES.risks('oasis', score, coefficients)
+    for k, risk in enumerate(risks):
+        assert result['auroc'][k] == pytest.approx(
+            metrics.roc_auc_score(y, risk), abs=1e-12)
+        assert result['brier'][k] == pytest.approx(
+            metrics.brier_score_loss(y, risk), abs=1e-12)
+        assert result['citl'][k] == pytest.approx(y.mean() - risk.mean(),
+                                                  abs=1e-12)
+
+
+def test_bootstrap_brackets_point_estimate():
+    score, y = cohort()
+    result = bootstrap('saps2', score, y, n_resamples=200)
+
+    for metric in ['auroc', 'brier', 'citl']:
+        assert (result[metric + '_low'] <= result[metric]).all()
+        assert (result[metric] <= result[metric + '_high']).all()
+
+
+def test_tied_risks_count_as_ties():
+    score, y = cohort()
+    # Flat, falling, and rising until the risk saturates at 1.
+    coefficients = [[-2, 0], [-2, -0.1], [20, 1]]
+    result = evaluate('oasis', score, y, coefficients)
+
+    assert result['auroc'][0] == 0.5
+    risks = RISK_TABLES.risks('oasis', score, coefficients)
+    assert (risks[2] == 1).sum() > 0
+    for k, risk in enumerate(risks):
+        assert result['auroc'][k] == pytest.approx(
+            metrics.roc_auc_score(y, risk), abs=1e-12)
+
+
+def test_calibration_curve_matches_per_stay_bins():
+    score, y = cohort()
+    predicted, observed, stays = calibration_curve('saps2', score, y,
+                                                   bins=5)
+
+    assert stays.sum() == len(score)
+    risk = RISK_TABLES.risks('saps2', score, PUBLISHED['saps2'])[0]
+    assert (predicted[0] * stays).sum() == pytest.approx(risk.sum())
+    assert (observed * stays).sum() == pytest.approx(y.sum())
+    # Bins follow the score, so both curves rise with it.
+    assert (np.diff(predicted[0]) > 0).all()
+    assert (np.diff(observed) > 0).all()
+
+
+def test_unknown_score_is_rejected():
+    score, y = cohort()
+    with pytest.raises(Exception, match='not recognized'):
+        evaluate('apache3', score, y)
@@ -0,0 +1,55 @@
+import csv, os, subprocess, sys
+
+import main
+from score.score_patients import score_patients
+
+
+SCORES = ['oasis', 'saps2', 'apache2']
+
+# MIMIC-style stay with a pre-admission row, an AIDS code (17 SAPS II
+# points) and a row past the first 24 hours that must not be scored.
+MIMIC_STAY = '''Hours,heart_rate,systolic_blood_pressure,temperature,\
+glasgow_coma_scale_total,age,admission_type,icd9
+-2,130,80,37,15,70,EMERGENCY,
+1,90,120,37,15,70,EMERGENCY,042
+5,80,110,36.5,14,70,EMERGENCY,
+30,200,50,42,3,70,EMERGENCY,
+'''
+
+
+def read_rows(path):
+    with open(path, newline='') as f:
+        return list(csv.reader(f))[1:]
+
+
+def test_main_matches_score_patients(cohort, tmp_path):
+    with open(os.path.join(cohort, 's000.csv'), 'w') as f:
+        f.write(MIMIC_STAY)
+    with open(os.path.join(cohort, 'listfile.csv'), 'w') as f:
+        f.write('stay,y_true\ns000.csv,1\n')
+
+    main.main(main.parse_arguments(
+        SCORES + [cohort, '-o', str(tmp_path / 'main'), '-v', '0']))
+    score_patients(SCORES, cohort, 'test', str(tmp_path / 'patients'))
+
+    expected = read_rows(tmp_path / 'patients' /
+                         'test_oasis_saps2_apache2_scores.csv')
+    rows = read_rows(tmp_path / 'main' / 'oasis_saps2_apache2_scores.csv')
+    assert [[os.path.basename(row[0])] + row[1:] for row in rows] \
+        == expected
+    assert ['s000.csv', '18', '35', '6'] in expected
+
+
+def test_main_does_not_import_pandas(tmp_path):
+    # A fresh interpreter, as the test session has imported pandas already.
+    code = (
+        'import sys, main\n'
+        'assert "pandas" not in sys.modules\n'
+        'main.main(main.parse_arguments(sys.argv[1:]))\n'
+        'assert "pandas" not in sys.modules\n')
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, '-c', code] + SCORES
+                   + [os.path.join(root, 'tests', 'example-a.psv'),
+                      '-o', str(tmp_path), '-v', '0'],
+                   cwd=root, check=True)
+    assert read_rows(tmp_path / 'oasis_saps2_apache2_scores.csv')
@@ -0,0 +1,45 @@
+import os
+
+import score.score_patients as score_patients_module
+from score.manifest import Manifest, spec_version
+from score.score_patients import score_patients
+from score.utils import variable_map
+
+
+def scored_files(monkeypatch, cohort, out_dir):
+    """Files `score_patients --incremental` scores again."""
+    scored = []
+    score_file = score_patients_module.score_file
+
+    def counting(score_names, path):
+        scored.append(os.path.basename(path))
+        return score_file(score_names, path)
+
+    monkeypatch.setattr(score_patients_module, 'score_file', counting)
+    score_patients('oasis', cohort, 'test', out_dir, incremental=True)
+
+    return scored
+
+
+def test_incremental_rescores_changed_files(monkeypatch, cohort, tmp_path):
+    out_dir = str(tmp_path / 'scores')
+    assert len(scored_files(monkeypatch, cohort, out_dir)) == 12
+    assert scored_files(monkeypatch, cohort, out_dir) == []
+
+    path = os.path.join(cohort, 'example-b-1.psv')
+    with open(path, 'a') as f:
+        f.write('\n')
+    assert scored_files(monkeypatch, cohort, out_dir) == ['example-b-1.psv']
+
+
+def test_variable_map_and_window_invalidate(monkeypatch, cohort, tmp_path):
+    out_dir = str(tmp_path / 'scores')
+    scored_files(monkeypatch, cohort, out_dir)
+    path = os.path.join(out_dir, 'test_oasis_manifest.json')
+    assert Manifest(path, 'oasis').files
+    assert not Manifest(path, 'oasis', hours=48).files
+    assert spec_version('oasis', 48) != spec_version('oasis')
+
+    monkeypatch.setitem(variable_map, 'heart_rate', 'HeartRate')
+    assert not Manifest(path, 'oasis').files
+    assert len(scored_files(monkeypatch, cohort, out_dir)) == 12
@@ -0,0 +1,97 @@
+import io, os, threading
+
+import pytest
+
+from score.parallel import chunk, parallel_map, prefetch_map, report_failures
+from score.profiling import PROFILER
+from score.score_patients import score_patients
+
+
+def reciprocal(item):
+    return 1 / item, os.getpid()
+
+
+@pytest.fixture
+def profiler():
+    PROFILER.reset()
+    PROFILER.enable(memory=False)
+    yield PROFILER
+    PROFILER.disable()
+    PROFILER.reset()
+
+
+def test_chunk():
+    assert chunk(list(range(7)), 3) == [[0, 1, 2], [3, 4, 5], [6]]
+    assert chunk([], 3) == []
+
+
+@pytest.mark.parametrize('workers,chunksize', [(1, None), (2, 1), (3, None)])
+def test_parallel_map_keeps_order_and_errors(workers, chunksize):
+    items = [4, 2, 0, 1, 0.5] * 4
+    results = parallel_map(reciprocal, items, workers, chunksize)
+
+    assert [pair[0] and pair[0][0] for pair in results] == \
+        [None if item == 0 else 1 / item for item in items]
+    assert results[2] == (None, 'ZeroDivisionError: division by zero')
+    pids = {pair[0][1] for pair in results if pair[0]}
+    assert (os.getpid() in pids) == (workers == 1)
+
+    out = io.StringIO()
+    assert report_failures(items, results, file=out) == 4
+    assert out.getvalue().splitlines()[0] == \
+        'Failed to score 0: ZeroDivisionError: division by zero'
+
+
+def test_prefetch_map_keeps_order_and_errors():
+    def load(item):
+        if item == 3:
+            raise ValueError('bad item')
+        return item, threading.get_ident()
+
+    results = prefetch_map(load, lambda loaded: loaded[0] * 10, range(8),
+                           depth=3, size=lambda item: 1)
+    assert [result for result, _ in results] == \
+        [0, 10, 20, None, 40, 50, 60, 70]
+    assert results[3][1] == 'ValueError: bad item'
+
+
+def test_prefetch_map_bounds_bytes_in_flight():
+    in_flight, peak = [], []
+    lock = threading.Lock()
+
+    def load(item):
+        with lock:
+            in_flight.append(item)
+            peak.append(sum(in_flight))
+        return item
+
+    def func(item):
+        with lock:
+            in_flight.remove(item)
+        return item
+
+    prefetch_map(load, func, [5] * 20, depth=8, max_bytes=12,
+                 size=lambda item: item)
+    assert max(peak) <= 12
+
+
+def test_prefetch_profiles_files_like_serial(cohort, tmp_path, profiler):
+    records = []
+    for prefetch in [0, 3]:
+        profiler.reset()
+        score_patients(['oasis', 'saps2'], cohort, 'test',
+                       str(tmp_path / str(prefetch)), prefetch=prefetch)
+        records.append(profiler.files)
+
+    with open(tmp_path / '0' / 'test_oasis_saps2_scores.csv') as f:
+        serial = f.read()
+    with open(tmp_path / '3' / 'test_oasis_saps2_scores.csv') as f:
+        assert f.read() == serial
+
+    assert sorted(records[0]) == sorted(records[1]) and records[0]
+    for file in records[0]:
+        assert {'file', 'read', 'window', 'score'} \
+            <= set(records[1][file]['stages'])
+        assert set(records[0][file]['stages']) \
+            == set(records[1][file]['stages'])
+        assert records[1][file]['seconds'] > 0
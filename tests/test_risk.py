@@ -0,0 +1,13 @@
+import numpy as np, pytest
+
+from score.risk import PUBLISHED, RISKS, RISK_TABLES, max_score
+
+
+@pytest.mark.parametrize('score_name', sorted(RISKS))
+def test_published_risk_matches_risk_function(score_name):
+    scores = np.arange(max_score(score_name) + 1)
+    assert np.allclose(RISK_TABLES.risk(score_name, scores),
+                       RISKS[score_name](scores), rtol=0, atol=1e-15)
+    assert np.allclose(RISK_TABLES.table(score_name),
+                       RISKS[score_name](scores, *PUBLISHED[score_name]),
+                       rtol=0, atol=1e-15)
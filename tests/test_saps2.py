@@ -0,0 +1,40 @@
+import numpy as np, pytest
+
+from score.mapping import saps2_icd9_dict
+from score.scores.saps2 import Icd9Index, SAPS2_ICD9, saps2_icd9
+
+
+def reference_points(code):
+    return max([group['points'] for group in saps2_icd9_dict.values()
+                for low, high in group['ranges'] if low <= code <= high],
+               default=0)
+
+
+def test_classify_compares_code_strings():
+    codes = ['042', '0449', '04490', '0410', '2386', '23860', '2385',
+             '20000', '20239', '20982', '1960', '1990', '1991', '19910',
+             '78951', '99999', '0']
+    points = SAPS2_ICD9.classify(codes)
+
+    assert list(points) == [reference_points(code) for code in codes]
+    assert list(points[:3]) == [17, 17, 0]
+    assert points[codes.index('2386')] == 10
+    assert points[codes.index('1990')] == 9
+
+
+def test_cell_points_skip_missing_entries():
+    cells = np.array(['4019 042', None, np.nan, '', '2386 1960', '4019',
+                      '4019 042'], dtype=object)
+    points = SAPS2_ICD9.cell_points(cells)
+
+    assert list(points) == [17, 0, 0, 0, 10, 0, 17]
+    assert [SAPS2_ICD9.cell_point(cell) for cell in cells] == list(points)
+    assert saps2_icd9(cells) == 17
+    assert saps2_icd9([None, np.nan]) == 0
+
+
+def test_overlapping_ranges_are_rejected():
+    groups = {'a': {'ranges': [('100', '200')], 'points': 1},
+              'b': {'ranges': [('150', '300')], 'points': 2}}
+    with pytest.raises(ValueError, match='overlap'):
+        Icd9Index(groups)
@@ -0,0 +1,61 @@
+import json, os, threading
+
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+import pytest
+
+from score.score_patients import score_file
+from score.service import MicroBatcher, ScoreServer
+
+
+FIXTURES = os.path.dirname(os.path.abspath(__file__))
+
+
+@pytest.fixture
+def server():
+    server = ScoreServer(('127.0.0.1', 0), MicroBatcher(max_wait=0.05))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:%d' % server.server_port
+    server.shutdown()
+    server.server_close()
+
+
+def post(url, body, content_type):
+    request = Request(url + '/score?scores=oasis,saps2,apache2', body,
+                      {'Content-Type': content_type})
+    try:
+        with urlopen(request) as response:
+            return response.status, json.load(response)
+    except HTTPError as e:
+        return e.code, json.load(e)
+
+
+def test_concurrent_requests_match_score_file(server):
+    paths = [os.path.join(FIXTURES, name)
+             for name in ['example-a.psv', 'example-b.psv', 'example-c.psv']]
+    bodies = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            bodies.append((f.read(), 'text/psv'))
+    # A bad payload in the same batch only fails its own request.
+    bodies.append((b'HR|ICULOS\nfast|1\n', 'text/psv'))
+    bodies.append((b'{"rows": [{"Hours": 1}], "scores": ["sofa"]}',
+                   'application/json'))
+
+    with ThreadPoolExecutor(len(bodies)) as pool:
+        results = list(pool.map(lambda body: post(server, *body), bodies))
+
+    for path, (status, result) in zip(paths, results):
+        assert status == 200
+        assert result['scores'] == {
+            name: score_file(name, path)
+            for name in ['oasis', 'saps2', 'apache2']}
+        assert set(result['risks']) == {'oasis', 'saps2'}
+    assert [status for status, _ in results[3:]] == [400, 400]
+    assert 'Unknown scores' in results[4][1]['error']
+
+    with urlopen(server + '/stats') as response:
+        assert json.load(response)['requests'] == 3
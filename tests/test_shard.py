@@ -0,0 +1,77 @@
+import filecmp, os, pytest
+
+from score.score_patients import merge_scores, score_patients
+
+
+SCORES = ['oasis', 'saps2']
+
+
+@pytest.mark.parametrize('format', ['csv', 'columns'])
+def test_merged_shards_match_unsharded_run(cohort, tmp_path, format):
+    whole, sharded = str(tmp_path / 'whole'), str(tmp_path / 'sharded')
+    score_patients(SCORES, cohort, 'test', whole, format=format)
+    for i in range(3):
+        score_patients(SCORES, cohort, 'test', sharded, format=format,
+                       shard=(i, 3))
+    merge_scores(SCORES, 'test', sharded)
+
+    name = 'test_oasis_saps2_scores'
+    if format == 'csv':
+        assert filecmp.cmp(os.path.join(whole, name + '.csv'),
+                           os.path.join(sharded, name + '.csv'),
+                           shallow=False)
+    else:
+        for f in ['stay.bin', 'stay.categories', 'oasis.bin', 'saps2.bin']:
+            assert filecmp.cmp(os.path.join(whole, name, f),
+                               os.path.join(sharded, name, f), shallow=False)
+
+
+def test_merge_rejects_missing_shard(cohort, tmp_path):
+    out = str(tmp_path / 'sharded')
+    for i in [0, 2]:
+        score_patients(SCORES, cohort, 'test', out, shard=(i, 3))
+
+    with pytest.raises(ValueError, match='missing'):
+        merge_scores(SCORES, 'test', out)
+
+
+def test_parse_shard():
+    from score.shard import parse_shard
+
+    assert parse_shard(' 2/5 ') == (2, 5)
+    for text in ['5/5', '1/0', '-1/3', '1-of-3']:
+        with pytest.raises(ValueError):
+            parse_shard(text)
+
+
+def test_shards_partition_names():
+    from score.shard import shard_files, shard_of
+
+    names = ['p%06d.psv' % i for i in range(300)]
+    shards = [shard_files(names, (i, 4)) for i in range(4)]
+    assert sorted(sum(shards, [])) == names
+    assert all(shards)
+    # Assignment depends on the file name only, not its directory.
+    assert shard_of('/a/p000001.psv', 4) == shard_of('p000001.psv', 4)
+
+
+def test_merge_rejects_stale_and_edited_shards(cohort, tmp_path):
+    out = str(tmp_path / 'sharded')
+    for i in range(2):
+        score_patients(SCORES, cohort, 'test', out, shard=(i, 2))
+    score_patients(SCORES, cohort, 'test', out, shard=(0, 3))
+    with pytest.raises(ValueError, match='split'):
+        merge_scores(SCORES, 'test', out)
+
+    shard_dir = os.path.join(out, 'test_oasis_saps2_shards')
+    os.remove(os.path.join(shard_dir, '0-of-3.json'))
+    merge_scores(SCORES, 'test', out)
+
+    # A shard table edited after its manifest was written.
+    table = os.path.join(shard_dir, '1-of-2_scores.csv')
+    with open(table) as f:
+        lines = f.read().splitlines()
+    with open(table, 'w') as f:
+        f.write('\n'.join(lines[:-1]) + '\n')
+    with pytest.raises(ValueError, match='does not match its manifest'):
+        merge_scores(SCORES, 'test', out)
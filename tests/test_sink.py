@@ -0,0 +1,73 @@
+import os
+
+import numpy as np, pytest
+
+from score.sink import MISSING, PartitionedSink, ResultSink, ResultTable
+
+
+SCHEMA = {'stay': 'category', 'oasis': 'int16', 'risk': 'float32'}
+
+
+def test_columns_append_and_resume(tmp_path):
+    path = str(tmp_path / 'table')
+    with ResultSink(path, SCHEMA) as sink:
+        sink.write({'stay': ['a', 'b'], 'oasis': [10, np.nan],
+                    'risk': [0.25, 0.5]})
+        sink.write({'stay': [], 'oasis': [], 'risk': []})
+
+    # A batch interrupted after writing one column is dropped on resume.
+    with open(os.path.join(path, 'oasis.bin'), 'ab') as f:
+        f.write(np.int16(99).tobytes())
+    with ResultSink(path, SCHEMA, append=True) as sink:
+        sink.write({'stay': ['b', 'c'], 'oasis': [30, 40],
+                    'risk': [0.75, 1.]})
+
+    table = ResultTable(path)
+    assert len(table) == 4
+    assert list(table['stay']) == ['a', 'b', 'b', 'c']
+    assert list(table.categories('stay')) == ['a', 'b', 'c']
+    assert list(table['oasis']) == [10, MISSING, 30, 40]
+    assert table['oasis'].dtype == np.int16
+    assert list(table['risk']) == [0.25, 0.5, 0.75, 1.]
+
+    # Without `append` the table is replaced.
+    with ResultSink(path, SCHEMA) as sink:
+        sink.write({'stay': ['d'], 'oasis': [5], 'risk': [0.1]})
+    assert list(ResultTable(path)['stay']) == ['d']
+
+
+def test_csv_append(tmp_path):
+    path = str(tmp_path / 'out' / 'table.csv')
+    for append in [False, True]:
+        with ResultSink(path, SCHEMA, 'csv', append) as sink:
+            sink.write({'stay': ['a'], 'oasis': [np.nan],
+                        'risk': np.float32([0.1])})
+    with open(path) as f:
+        assert f.read() == 'stay,oasis,risk\na,,0.1\na,,0.1\n'
+
+    with pytest.raises(ValueError, match='has columns'):
+        ResultSink(path, {'stay': 'category'}, 'csv', append=True)
+
+
+def test_sink_rejects_bad_input(tmp_path):
+    with pytest.raises(ValueError, match='Unknown format'):
+        ResultSink(str(tmp_path / 't'), SCHEMA, 'parquet')
+    with ResultSink(str(tmp_path / 't'), SCHEMA) as sink:
+        with pytest.raises(KeyError):
+            sink.write({'stay': ['a'], 'oasis': [1]})
+        with pytest.raises(ValueError, match='lengths'):
+            sink.write({'stay': ['a'], 'oasis': [1, 2], 'risk': [0.]})
+    with pytest.raises(ValueError, match='has schema'):
+        ResultSink(str(tmp_path / 't'), {'stay': 'category'}, append=True)
+
+
+def test_partitioned_layout(tmp_path):
+    root = str(tmp_path / 'scores')
+    with PartitionedSink(root, SCHEMA, 'csv') as sink:
+        for score in ['oasis', 'saps2']:
+            sink.write({'stay': ['a'], 'oasis': [1], 'risk': [0.5]},
+                       score=score, partition='test')
+
+    assert sorted(os.listdir(root)) == ['score=oasis', 'score=saps2']
+    assert os.listdir(os.path.join(root, 'score=oasis')) == \
+        ['partition=test.csv']
@@ -0,0 +1,32 @@
+import os
+
+import numpy as np
+
+from score.score_patients import score_file
+from score.store import CohortStore, ingest
+from score.utils import read
+
+
+def test_store_matches_files(cohort, tmp_path):
+    # Blank lines, including a trailing one, are not rows.
+    with open(os.path.join(cohort, 'example-a-0.psv')) as f:
+        lines = f.read().splitlines(keepends=True)
+    with open(os.path.join(cohort, 'example-a-0.psv'), 'w') as f:
+        f.write(''.join(lines[:5] + ['\n'] + lines[5:] + ['\n']))
+    ingest(cohort, str(tmp_path / 'store'))
+    store = CohortStore(str(tmp_path / 'store'))
+
+    start, stop = store.windows()
+    for i, stay in enumerate(store.stays):
+        path = os.path.join(cohort, stay)
+        df = read(path)
+        assert np.array_equal(store.stay(i), df[store.columns].to_numpy(
+            np.float32), equal_nan=True)
+        window = store.window(i)
+        assert np.array_equal(store.values[start[i]:stop[i]], window,
+                              equal_nan=True)
+
+    for name in ['oasis', 'saps2', 'apache2']:
+        assert store.score(name).tolist() == [
+            score_file(name, os.path.join(cohort, stay))
+            for stay in store.stays]
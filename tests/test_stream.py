@@ -0,0 +1,67 @@
+import pandas as pd
+
+from score.score_patients import score_file
+from score.stream import stream_scores
+
+
+def test_metavision_gcs_components_are_summed(tmp_path):
+    stays = pd.DataFrame({'ICUSTAY_ID': [1, 2, 3, 4],
+                          'INTIME': ['2100-01-01 00:00:00'] * 4,
+                          'AGE': [70] * 4})
+    stays.to_csv(tmp_path / 'stays.csv', index=False)
+
+    # CareVue total, MetaVision components, a lone component and no GCS.
+    gcs = {1: [(198, 7)], 2: [(220739, 2), (223900, 2), (223901, 3)],
+           3: [(220739, 2)], 4: []}
+    rows = []
+    for stay, items in gcs.items():
+        rows.append((stay, 220045, '2100-01-01 02:00:00', 90))
+        rows += [(stay, item, '2100-01-01 03:00:00', value)
+                 for item, value in items]
+    events = pd.DataFrame(rows, columns=['ICUSTAY_ID', 'ITEMID', 'CHARTTIME',
+                                         'VALUENUM'])
+    events.to_csv(tmp_path / 'chartevents.csv', index=False)
+
+    scores = pd.concat(stream_scores([str(tmp_path / 'chartevents.csv')],
+                                     str(tmp_path / 'stays.csv')))
+    assert scores.loc[1].tolist() == scores.loc[2].tolist()
+    assert scores.loc[3].tolist() == scores.loc[4].tolist()
+    assert scores.loc[1, 'oasis'] > scores.loc[4, 'oasis']
+
+
+def test_stream_matches_score_file(tmp_path):
+    stays = pd.DataFrame({'ICUSTAY_ID': [7], 'INTIME': ['2100-01-01 00:00:00'],
+                          'AGE': [70], 'ADMISSION_TYPE': ['EMERGENCY'],
+                          'ICD9': ['042'], 'VENTILATED': [1],
+                          'PAO2_FIO2': [150.]})
+    stays.to_csv(tmp_path / 'stays.csv', index=False)
+
+    # (hours, itemid, variable, value), one pre-admission event.
+    events = [(-1, 220045, 'heart_rate', 125), (1, 220045, 'heart_rate', 95),
+              (1, 220179, 'systolic_blood_pressure', 85),
+              (1, 220052, 'mean_blood_pressure', 60),
+              (2, 223762, 'temperature', 38.5),
+              (2, 198, 'glasgow_coma_scale_total', 12),
+              (3, 50882, 'bicarbonate', 17),
+              (3, 51006, 'blood_urea_nitrogen', 30),
+              (4, 226559, 'urine_output', 300),
+              (8, 226559, 'urine_output', 250),
+              (30, 220045, 'heart_rate', 200)]
+    pd.DataFrame({'ICUSTAY_ID': 7, 'ITEMID': [e[1] for e in events],
+                  'CHARTTIME': [str(pd.Timestamp('2100-01-01') +
+                                    pd.Timedelta(hours=e[0]))
+                                for e in events],
+                  'VALUENUM': [e[3] for e in events]}) \
+        .to_csv(tmp_path / 'chartevents.csv', index=False)
+
+    rows = pd.DataFrame([{'Hours': e[0], e[2]: e[3]} for e in events])
+    rows = rows.groupby('Hours', as_index=False).first()
+    rows = rows.assign(age=70, admission_type='EMERGENCY', icd9='042',
+                       ventilated=1, pao2_fio2=150.)
+    rows.to_csv(tmp_path / 's7.csv', index=False)
+
+    names = ['oasis', 'saps2']
+    scores = pd.concat(stream_scores([str(tmp_path / 'chartevents.csv')],
+                                     str(tmp_path / 'stays.csv'), names))
+    assert scores.loc[7].tolist() == score_file(names,
+                                                str(tmp_path / 's7.csv'))
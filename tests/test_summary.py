@@ -0,0 +1,43 @@
+import json, os
+
+import numpy as np, pytest
+
+from score.risk import RISKS
+from score.score_patients import score_file
+from score.summary import SCORES, Summary, summarize
+
+
+def test_summary_scores_match_score_file(cohort, tmp_path):
+    stays = sorted(os.listdir(cohort))
+    with open(os.path.join(cohort, 'broken.psv'), 'w') as f:
+        f.write('HR|ICULOS\nfast|1\n')
+    summarize(cohort, str(tmp_path / 'summary'), workers=2)
+    summary = Summary(str(tmp_path / 'summary'))
+
+    # The broken file is reported and left out.
+    assert summary.stays == stays
+    for name in SCORES:
+        expected = [score_file(name, os.path.join(cohort, stay))
+                    for stay in summary.stays]
+        assert list(summary.score(name)) == expected
+        if name in RISKS:
+            assert summary.risk(name) == pytest.approx(
+                RISKS[name](np.array(expected)))
+    assert summary['heart_rate_count'].min() > 0
+
+
+def test_changed_tables_are_rejected(cohort, tmp_path):
+    out = str(tmp_path / 'summary')
+    summarize(cohort, out, score_names=['saps2'])
+    with open(os.path.join(out, 'meta.json')) as f:
+        meta = json.load(f)
+    meta['versions']['saps2_icd9'] = 'stale'
+    with open(os.path.join(out, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+
+    summary = Summary(out)
+    summary.var_scores('saps2')
+    with pytest.raises(ValueError, match='saps2_icd9'):
+        summary.score('saps2')
+    with pytest.raises(KeyError):
+        summary.score('oasis')
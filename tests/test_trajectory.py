@@ -0,0 +1,62 @@
+import os
+
+import numpy as np, pytest
+
+from score.batch import score_window
+from score.trajectory import (Trajectories, sliding_max, sliding_sum,
+                              trajectories, trajectory_file, window_starts)
+from score.utils import read_columns, rename_variables, score_columns
+
+
+FIXTURES = os.path.dirname(os.path.abspath(__file__))
+SCORES = ['oasis', 'saps2', 'apache2']
+
+
+@pytest.mark.filterwarnings('ignore:All-NaN slice')
+def test_sliding_reductions_match_a_naive_scan():
+    rng = np.random.default_rng(0)
+    t = np.cumsum(rng.integers(0, 3, 200)).astype(float)
+    values = rng.normal(size=(200, 3))
+    values[rng.random(values.shape) < 0.6] = np.nan
+    starts = window_starts(t, hours=10)
+
+    maxima = sliding_max(values, starts)
+    sums = sliding_sum(values[:, 0], starts)
+    for i, start in enumerate(starts):
+        assert t[start] > t[i] - 10 and (start == 0
+                                         or t[start - 1] <= t[i] - 10)
+        window = values[start:i + 1]
+        np.testing.assert_array_equal(maxima[i], np.nanmax(window, axis=0))
+        observed = window[~np.isnan(window[:, 0]), 0]
+        if observed.size:
+            assert sums[i] == pytest.approx(observed.sum())
+        else:
+            assert np.isnan(sums[i])
+
+
+def test_trajectory_rows_match_rescoring_each_window():
+    for fixture in ['example-a.psv', 'example-b.psv', 'example-c.psv']:
+        path = os.path.join(FIXTURES, fixture)
+        t, scores = trajectory_file(SCORES, path, hours=6)
+        columns = set().union(*(score_columns(name) for name in SCORES))
+        data = rename_variables(read_columns(path, columns=columns))
+
+        assert scores.shape == (len(t), len(SCORES)) and scores.any()
+        for i in range(len(t)):
+            rows = (t[i] - 6 < t) & (t <= t[i])
+            window = {col: values[rows] for col, values in data.items()}
+            assert list(scores[i]) == score_window(window, SCORES)
+
+
+def test_trajectories_round_trip(cohort, tmp_path):
+    out = str(tmp_path / 'trajectories')
+    trajectories(cohort, out, SCORES, workers=2)
+    loaded = Trajectories(out)
+
+    assert loaded.stays == sorted(os.listdir(cohort))
+    for i, stay in enumerate(loaded.stays):
+        t, scores = trajectory_file(SCORES, os.path.join(cohort, stay))
+        np.testing.assert_array_equal(loaded.stay(i)[0], t)
+        np.testing.assert_array_equal(loaded.stay(i)[1], scores)
+        np.testing.assert_array_equal(loaded.stay(i, 'saps2')[1],
+                                      scores[:, 1])
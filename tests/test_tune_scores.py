@@ -0,0 +1,49 @@
+import numpy as np, pytest
+
+from score.tune_scores import fit_logistic, recalibrate, risk_features
+
+
+def test_fit_logistic_matches_sklearn():
+    linear_model = pytest.importorskip('sklearn.linear_model')
+    rng = np.random.default_rng(0)
+    score = rng.integers(0, 60, 2000)
+    y = rng.random(2000) < 1 / (1 + np.exp(-(score / 10 - 4)))
+
+    counts = np.zeros((60, 2))
+    np.add.at(counts, (score, y.astype(int)), 1)
+    beta, converged = fit_logistic(risk_features('oasis', np.arange(60)),
+                                   counts[None, :, 1],
+                                   counts.sum(axis=1)[None], [0, 0])
+    logreg = linear_model.LogisticRegression(C=np.inf).fit(score[:, None], y)
+
+    assert converged.all()
+    assert np.allclose(beta[0], [logreg.intercept_[0], logreg.coef_[0, 0]],
+                       atol=1e-4)
+
+
+def test_fit_logistic_flags_strata_without_deaths():
+    X = risk_features('saps2', np.arange(0, 100, 10))
+    tot = np.full((2, 10), 50)
+    pos = np.stack([np.zeros(10), np.arange(10) * 3])
+    beta, converged = fit_logistic(X, pos, tot, [-7.7631, 0.0737, 0.9971])
+
+    assert converged.tolist() == [False, True]
+    assert np.isfinite(beta).all()
+
+
+def test_recalibrate_skips_missing_scores():
+    rng = np.random.default_rng(1)
+    X = rng.integers(0, 60, 500).astype(float)
+    y = (rng.random(500) < X / 100).astype(int)
+    X[::7] = np.nan
+    finite = np.isfinite(X)
+
+    B = recalibrate('oasis', X[finite], y[finite], n_resamples=5)
+    B_nan = recalibrate('oasis', X, y, n_resamples=5)
+    assert B_nan.equals(B)
+    assert np.isfinite(B_nan[['b0', 'b1']].values).all()
+    assert B_nan['converged'].all()
+
+    with pytest.warns(UserWarning, match='did not converge'):
+        B = recalibrate('oasis', X, np.zeros(500, dtype=int), n_resamples=5)
+    assert not B['converged'].any()
@@ -0,0 +1,65 @@
+import os
+
+import numpy as np, pytest
+
+from score.batch import admission_window
+from score.compiled import SPECS
+from score.score_patients import score_file
+from score.utils import read, read_columns, rename_variables, score_columns
+
+
+FIXTURES = os.path.dirname(os.path.abspath(__file__))
+
+
+def write(tmp_path, text):
+    path = tmp_path / 'stay.psv'
+    path.write_text(text)
+
+    return str(path)
+
+
+def test_read_skips_blank_lines_in_window(tmp_path):
+    path = write(tmp_path, 'HR|ICULOS\n80|1\n\n90|2\n100|30\n')
+    df = read(path, hours=24)
+
+    assert df['HR'].tolist() == [80, 90]
+
+
+def test_read_columns_skips_blank_lines(tmp_path):
+    path = write(tmp_path, 'HR|ICULOS\n80|1\n\n90|2\n\n')
+
+    columns = read_columns(path)
+    assert columns['HR'].tolist() == [80, 90]
+    assert columns['ICULOS'].tolist() == [1, 2]
+
+    assert read_columns(path, hours=2)['HR'].tolist() == [80]
+
+
+def test_empty_time_cells_are_nan(tmp_path):
+    path = write(tmp_path, 'HR|ICULOS\n80|1\n85|\n90|NaN\n100|30\n')
+
+    df = read(path, hours=24)
+    assert df['HR'].tolist() == [80, 85, 90]
+    assert df['ICULOS'].isna().tolist() == [False, True, True]
+    assert read_columns(path, hours=24)['HR'].tolist() == [80, 85, 90]
+    assert read(path)['HR'].tolist() == [80, 85, 90, 100]
+
+
+@pytest.mark.parametrize('name', ['oasis', 'saps2', 'apache2'])
+def test_pruned_window_read_matches_full_read(name):
+    for fixture in ['example-a.psv', 'example-b.psv', 'example-c.psv']:
+        path = os.path.join(FIXTURES, fixture)
+        full = read(path, dtype=np.float32)
+        columns = [col for col in full if col in score_columns(name)
+                   or col == 'ICULOS']
+        head = full.loc[full['ICULOS'] < 24, columns].reset_index(drop=True)
+        pruned = read(path, columns=score_columns(name), hours=24,
+                      dtype=np.float32)
+        assert pruned.equals(head[list(pruned.columns)])
+        assert sorted(pruned.columns) == sorted(columns)
+
+        # PhysioNet columns are renamed to score variables before scoring.
+        full = rename_variables(full.assign(stay=0))
+        window = full.loc[admission_window(full, 'stay')]
+        assert score_file(name, path) == SPECS[name].score(window)
+        assert SPECS[name].score(window) > 0